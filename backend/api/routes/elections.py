@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from models import Group, Membership, User, Election, Proposal, Vote, ElectionStatus, ResolutionStrategyType
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from models import Group, Membership, User, Election, ElectionResults, Proposal, Vote, ElectionStatus, ResolutionStrategyType
 from db import db
 from core.security import get_current_user
 from typing import List, Dict, Any, Optional
@@ -7,32 +7,29 @@ import asyncio
 from datetime import datetime, timezone
 from pydantic import BaseModel, ValidationError
 from google.cloud import firestore
-from strategies.auction_resolution import (
-    AuctionResolutionStrategy,
-    MostVotesWinsStrategy,
-    FirstPriceCalculationStrategy,
-    SecondPriceCalculationStrategy,
-    AllPayPaymentStrategy,
-    WinnersPayPaymentStrategy,
-    LotteryWinsStrategy, # Import LotteryWinsStrategy
-)
-from core.election_state_manager import update_election_status_and_resolve
+from core.election_state_manager import update_election_status_and_resolve, close_and_resolve, is_transition_due
+from core.election_scheduler import election_scheduler
+from core.election_results import RESULTS_CACHE_CONTROL, get_results_snapshot, results_to_details
+from core.responses import fast_json_response
+from core.admission import admit
+from core.group_cache import fetch_member_role
+from core.http_cache import bump_group_version, has_etag_of_kind, is_not_modified, make_etag, not_modified, set_validators, version_bump, REVALIDATE_CACHE_CONTROL
+from core.decoding import decode, decode_many
+from core.firestore_compat import transactional
+from core.token_manager import load_token_settings, with_effective_balance
+from core.single_flight import SingleFlight, request_key
+from core.tracing import span
+from records import MembershipRecord, ProposalRecord, VoteRecord
 import logging
-import pdb
 
-# set up logging
-logging.basicConfig(level=logging.INFO)
+# Handlers and levels are configured centrally in core/logging_setup.py
 logger = logging.getLogger(__name__)
 
 
 # router = APIRouter()
 router = APIRouter()
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.ERROR)
-handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+group_elections_flight = SingleFlight("group_elections")
 
 
 class ProposalCreate(BaseModel):
@@ -67,6 +64,43 @@ class ElectionDetailsResponse(BaseModel):
     proposals: List[dict]
 
 
+def build_proposal_details(proposals: List[ProposalRecord], votes: List[VoteRecord], include_votes: bool) -> List[dict]:
+    """
+    Attaches each proposal's votes by grouping the already loaded election votes in one pass,
+    instead of querying votes per proposal.
+    """
+    votes_by_proposal: Dict[str, List[dict]] = {}
+    if include_votes:
+        for vote in votes:
+            votes_by_proposal.setdefault(vote.proposal_id, []).append(vote.to_response())
+    return [
+        {**proposal.to_doc(), "votes": votes_by_proposal.get(proposal.proposal_id, [])}
+        for proposal in proposals
+    ]
+
+
+def load_election_votes(election_id: str) -> List[VoteRecord]:
+    vote_docs = db.collection("votes").where("election_id", "==", election_id).stream()
+    return decode_many(VoteRecord, (vote_doc.to_dict() for vote_doc in vote_docs))
+
+
+def load_election_proposals(election_id: str) -> List[ProposalRecord]:
+    proposal_docs = db.collection("proposals").where("election_id", "==", election_id).stream()
+    return decode_many(ProposalRecord, (proposal_doc.to_dict() for proposal_doc in proposal_docs))
+
+
+def nudge_due_transitions(elections: List[Election]):
+    """
+    Read paths never transition elections themselves: that is the scheduler's job. Elections
+    whose transition is overdue are queued with it (a no-op if it already has them) and are
+    returned as stored until it fires.
+    """
+    now_utc = datetime.now(timezone.utc)
+    for election in elections:
+        if is_transition_due(election, now_utc):
+            election_scheduler.nudge(election)
+
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_election(
     group_id: str,
@@ -79,22 +113,15 @@ async def create_election(
     """
 
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(
-        current_user_membership_doc.to_dict()
-    )
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can create elections",
@@ -104,7 +131,7 @@ async def create_election(
     active_election_docs = (
         db.collection("elections")
         .where("group_id", "==", group_id)
-        .where("status", "in", ["open", "upcoming"])
+        .where("status", "in", ["open", "closing", "upcoming"])
         .stream()
     )
 
@@ -166,180 +193,170 @@ async def create_election(
             detail="Failed to create election document",
         )
 
-    return Election.model_validate(election_doc.to_dict())
+    created_election = decode(Election, election_doc.to_dict())
+    bump_group_version(db, group_id)
+    election_scheduler.schedule(created_election)
+    return created_election
 
 
 @router.get("/", response_model=List[Election])
 async def get_elections_by_group(
-    group_id: str, current_user: User = Depends(get_current_user)
+    group_id: str, response: Response, current_user: User = Depends(get_current_user)
 ):
     """
     Retrieves all elections for a group, sorted by end date (latest first).
-    Processes most I/O concurrently.
+    Proposals and votes are not loaded; due transitions are left to the scheduler.
     """
     # Check if the current user is a member of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = await asyncio.to_thread(
-        current_user_membership_ref.get
-    )
-    if not current_user_membership_doc.exists:
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    # Concurrently fetch elections and memberships for the group
-    elections_future = asyncio.to_thread(
-        lambda: list(
-            db.collection("elections")
-            .where("group_id", "==", group_id)
-            .stream()
-        )
-    )
-    memberships_future = asyncio.to_thread(
-        lambda: list(
-            db.collection("memberships")
-            .where("group_id", "==", group_id)
-            .stream()
-        )
-    )
-    election_docs, membership_docs = await asyncio.gather(
-        elections_future, memberships_future
+    # Every member sees the same list, so members loading it at the same time share one load
+    # (and one admission slot)
+    elections_list = await group_elections_flight.do(
+        request_key("GET /groups/{group_id}/elections/", "group-member", group_id=group_id),
+        lambda: list_group_elections(group_id),
     )
 
-    memberships = {
-        doc.to_dict().get("membership_id"): Membership.model_validate(doc.to_dict())
-        for doc in membership_docs
-    }
+    return fast_json_response(elections_list, response)
 
-    # Define an async function to process a single election concurrently
-    async def process_election(election_doc):
-        election_data = election_doc.to_dict()
-        if not election_data:
-            return None
-        election = Election.model_validate(election_data)
 
-        # Concurrently fetch votes and proposals for this election
-        vote_future = asyncio.to_thread(
-            lambda: list(
-                db.collection("votes")
-                .where("election_id", "==", election.election_id)
-                .stream()
-            )
-        )
-        proposal_future = asyncio.to_thread(
+async def list_group_elections(group_id: str) -> List[Election]:
+    """
+    Loads a group's elections, sorted by end date (latest first).
+    """
+    async with admit("group_elections"):
+        election_docs = await asyncio.to_thread(
             lambda: list(
-                db.collection("proposals")
-                .where("election_id", "==", election.election_id)
+                db.collection("elections")
+                .where("group_id", "==", group_id)
                 .stream()
             )
         )
-        vote_docs, proposal_docs = await asyncio.gather(vote_future, proposal_future)
 
-        votes = [Vote.model_validate(doc.to_dict()) for doc in vote_docs]
-        proposals = [Proposal.model_validate(doc.to_dict()) for doc in proposal_docs]
-
-        # Update the election status concurrently
-        updated_election = await update_election_status_and_resolve(
-            election, db, memberships, proposals, votes
+        elections_list = decode_many(
+            Election,
+            (election_data for election_data in (election_doc.to_dict() for election_doc in election_docs) if election_data),
         )
-        return updated_election
-
-    # Launch processing for all elections concurrently
-    tasks = [process_election(doc) for doc in election_docs]
-    results = await asyncio.gather(*tasks)
+        nudge_due_transitions(elections_list)
+    logger.debug("Listed %d elections for group %s", len(elections_list), group_id)
 
-    # Filter out any None results and sort by end_date descending
-    elections_list = [result for result in results if result is not None]
+    # Sort by end_date descending
     elections_list.sort(key=lambda e: e.end_date, reverse=True)
-
     return elections_list
 
 
 @router.get("/{election_id}", response_model=ElectionDetailsResponse)
 async def get_election_details(
-    group_id: str, election_id: str, current_user: User = Depends(get_current_user)
+    group_id: str, election_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)
 ):
     """
     Retrieves election details including all proposals, with their votes (if the election is closed)
+    Supports conditional requests via the election's version counter.
     """
 
     # Check if the current user is a member of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    # Get the election
-    election_ref = db.collection("elections").document(election_id)
+    def results_response(results: ElectionResults) -> Response:
+        etag = make_etag("election-results", election_id, results.schema_version, results.resolution_fingerprint)
+        if is_not_modified(request, etag, results.closed_at):
+            return not_modified(etag, results.closed_at, RESULTS_CACHE_CONTROL)
+        set_validators(response, etag, results.closed_at, RESULTS_CACHE_CONTROL)
+        return fast_json_response(ElectionDetailsResponse(**results_to_details(results)), response)
 
-    # Parallelize these Firestore reads using asyncio.gather
-    election_doc_future = asyncio.to_thread(election_ref.get) # Run get() in thread pool
-    membership_docs_future = asyncio.to_thread(lambda: list(db.collection("memberships").where("group_id", "==", group_id).stream()))
-    vote_docs_future = asyncio.to_thread(lambda: list(db.collection("votes").where("election_id", "==", election_id).stream()))
-    proposal_docs_future = asyncio.to_thread(lambda: list(db.collection("proposals").where("election_id", "==", election_id).stream()))
+    # Closed elections are served from their immutable results snapshot. Look for one up front
+    # only when the client revalidates a snapshot; otherwise the election says whether it is closed
+    if has_etag_of_kind(request, "election-results"):
+        results = await asyncio.to_thread(get_results_snapshot, db, election_id)
+        if results is not None and results.group_id == group_id:
+            return results_response(results)
 
-    (election_doc, membership_docs, vote_docs_list, proposal_docs_list) = await asyncio.gather(
-        election_doc_future, membership_docs_future, vote_docs_future, proposal_docs_future
-    )
+    # Get the election
+    election_ref = db.collection("elections").document(election_id)
+    election_doc = await asyncio.to_thread(election_ref.get)
 
     if not election_doc.exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Election not found"
         )
 
-    election = Election.model_validate(election_doc.to_dict())
+    election = decode(Election, election_doc.to_dict())
 
-    memberships = {
-        doc.to_dict().get("membership_id"): Membership.model_validate(doc.to_dict())
-        for doc in membership_docs
-    }
-    votes = [Vote.model_validate(vote_doc.to_dict()) for vote_doc in vote_docs_list]
-    proposals = [
-        Proposal.model_validate(proposal_doc.to_dict())
-        for proposal_doc in proposal_docs_list
-    ]
+    if election.status == ElectionStatus.CLOSED:
+        results = await asyncio.to_thread(get_results_snapshot, db, election_id)
+        if results is not None and results.group_id == group_id:
+            return results_response(results)
 
-    updated_election = await update_election_status_and_resolve(
-        election, db, memberships, proposals, votes
-    )  # Pass memberships, proposals, votes
+    # Check the validators before paying for the vote and proposal queries
+    etag = make_etag("election", election_id, election.version, election.status.value)
+    if is_not_modified(request, etag, election.updated_at):
+        return not_modified(etag, election.updated_at)
+
+    # Parallelize these Firestore reads using asyncio.gather
+    vote_docs_future = asyncio.to_thread(lambda: list(db.collection("votes").where("election_id", "==", election_id).stream()))
+    proposal_docs_future = asyncio.to_thread(lambda: list(db.collection("proposals").where("election_id", "==", election_id).stream()))
+
+    (vote_docs_list, proposal_docs_list) = await asyncio.gather(vote_docs_future, proposal_docs_future)
+
+    votes = decode_many(VoteRecord, (vote_doc.to_dict() for vote_doc in vote_docs_list))
+    proposals = decode_many(ProposalRecord, (proposal_doc.to_dict() for proposal_doc in proposal_docs_list))
 
-    # Get all proposals associated with the election (after status update)
-    proposal_docs = (  # Re-fetch proposals to ensure they are in sync with potentially updated election
-        db.collection("proposals").where("election_id", "==", election_id).stream()
+    nudge_due_transitions([election])
+
+    # Include vote information only if the election is closed
+    proposals = build_proposal_details(
+        proposals, votes, include_votes=election.status == ElectionStatus.CLOSED
     )
-    proposals = []  # Re-initialize proposals list
-    for proposal_doc in proposal_docs:
-        proposal = Proposal.model_validate(proposal_doc.to_dict())
-        # if the election is closed, get all of the votes for that proposal
-        if (
-            updated_election.status == ElectionStatus.CLOSED
-        ):  # Use updated_election status
-            vote_docs = (
-                db.collection("votes")
-                .where("proposal_id", "==", proposal.proposal_id)
-                .stream()
-            )
-            votes_for_proposal = [
-                Vote.model_validate(vote_doc.to_dict()).model_dump()
-                for vote_doc in vote_docs
-            ]
-            proposals.append({**proposal.model_dump(), "votes": votes_for_proposal})
-        else:
-            proposals.append({**proposal.model_dump(), "votes": []})
-
-    election_data = updated_election.model_dump()  # Use updated_election data
+
+    set_validators(
+        response,
+        etag,
+        election.updated_at,
+        RESULTS_CACHE_CONTROL if election.status == ElectionStatus.CLOSED else REVALIDATE_CACHE_CONTROL,
+    )
+
+    election_data = election.model_dump()
     election_data.pop("proposals", None)
     # Construct a response with all proposals (and vote information if election is closed)
-    return ElectionDetailsResponse(**election_data, proposals=proposals)
+    return fast_json_response(ElectionDetailsResponse(**election_data, proposals=proposals), response)
+
+@router.get("/{election_id}/results", response_model=ElectionResults)
+async def get_election_results(
+    group_id: str, election_id: str, response: Response, current_user: User = Depends(get_current_user)
+):
+    """
+    Exports the results snapshot of a closed election: per-proposal totals, the winner,
+    the price multiplier and every vote's payment and regeneration.
+    """
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
+
+    if current_user_role is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Current user is not a member of this group",
+        )
+
+    results = await asyncio.to_thread(get_results_snapshot, db, election_id)
+    if results is None or results.group_id != group_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Results are not available for this election",
+        )
+
+    response.headers["Cache-Control"] = RESULTS_CACHE_CONTROL
+    return fast_json_response(results, response)
+
 
 @router.post(
     "/{election_id}/proposals",
@@ -357,12 +374,9 @@ async def add_proposal_to_election(
     """
 
     # Check if the current user is a member of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
@@ -377,7 +391,7 @@ async def add_proposal_to_election(
             status_code=status.HTTP_404_NOT_FOUND, detail="Election not found"
         )
 
-    election = Election.model_validate(election_doc.to_dict())
+    election = decode(Election, election_doc.to_dict())
 
     # Validate that election is upcoming
     if election.status != "upcoming":
@@ -400,7 +414,8 @@ async def add_proposal_to_election(
     )
 
     new_proposal_ref.set(proposal.model_dump())
-    election_ref.update({"proposals": firestore.ArrayUnion([proposal_id])})
+    election_ref.update({"proposals": firestore.ArrayUnion([proposal_id]), **version_bump()})
+    bump_group_version(db, group_id)
 
     # fetch the newly created proposal
     proposal_doc = new_proposal_ref.get()
@@ -410,7 +425,7 @@ async def add_proposal_to_election(
             detail="Failed to create proposal document",
         )
 
-    return Proposal.model_validate(proposal_doc.to_dict())
+    return decode(Proposal, proposal_doc.to_dict())
 
 
 @router.delete(
@@ -428,22 +443,15 @@ async def delete_proposal_from_election(
     """
 
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(
-        current_user_membership_doc.to_dict()
-    )
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can delete proposals from elections",
@@ -458,7 +466,7 @@ async def delete_proposal_from_election(
             status_code=status.HTTP_404_NOT_FOUND, detail="Election not found"
         )
 
-    election = Election.model_validate(election_doc.to_dict())
+    election = decode(Election, election_doc.to_dict())
 
     if election.group_id != group_id:
         raise HTTPException(
@@ -475,7 +483,7 @@ async def delete_proposal_from_election(
             status_code=status.HTTP_404_NOT_FOUND, detail="Proposal not found"
         )
 
-    proposal = Proposal.model_validate(proposal_doc.to_dict())
+    proposal = decode(Proposal, proposal_doc.to_dict())
 
     if proposal.election_id != election_id:
         raise HTTPException(
@@ -488,7 +496,8 @@ async def delete_proposal_from_election(
 
     # Remove the proposal_id from the election's proposals array
     election_ref = db.collection("elections").document(election_id)
-    election_ref.update({"proposals": firestore.ArrayRemove([proposal_id])})
+    election_ref.update({"proposals": firestore.ArrayRemove([proposal_id]), **version_bump()})
+    bump_group_version(db, group_id)
 
     # Delete any votes associated with the proposal
     vote_docs = db.collection("votes").where("proposal_id", "==", proposal_id).stream()
@@ -525,7 +534,7 @@ async def cast_vote(
                 detail="Current user is not a member of this group",
             )
 
-        membership = Membership.model_validate(current_user_membership_doc.to_dict())
+        membership = decode(Membership, current_user_membership_doc.to_dict())
 
         # Get the election
         election_ref = db.collection("elections").document(election_id)
@@ -536,7 +545,7 @@ async def cast_vote(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Election not found"
             )
 
-        election = Election.model_validate(election_doc.to_dict())
+        election = decode(Election, election_doc.to_dict())
 
         # Validate that election is open
         if election.status != ElectionStatus.OPEN:
@@ -544,7 +553,8 @@ async def cast_vote(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Can only vote in open elections.",
             )
-        # Validate total tokens used
+        # Validate total tokens used against the balance including regeneration owed
+        membership = with_effective_balance(membership, load_token_settings(db, group_id))
         if vote_data.tokens_used > membership.token_balance:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -560,41 +570,40 @@ async def cast_vote(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Proposal {vote_data.proposal_id} not found",
             )
-            # Check if the user has already voted in this election
-            # Almost definitely a better way to do this query
-        existing_vote_docs = (
+        existing_vote_query = (
             db.collection("votes")
             .where("membership_id", "==", membership.membership_id)
             .where("election_id", "==", election_id)
-            .stream()
         )
-        existing_votes = list(existing_vote_docs)
-
-        updated_vote = None
-        if existing_votes:
-            # User has voted, update their vote
-            for existing_vote_doc in existing_votes:
-                existing_vote = Vote.model_validate(existing_vote_doc.to_dict())
-                vote_ref = db.collection("votes").document(existing_vote.vote_id)
-                updated_vote_data = {
-                    # ** FIX: Explicitly set proposal_id from vote_data **
+
+        @transactional
+        def write_vote(transaction) -> Vote:
+            # Closing moves the election to CLOSING in a transaction on the same document, so the
+            # vote either lands while the election is OPEN, before the close reads the votes, or not at all
+            election_snapshot = election_ref.get(transaction=transaction)
+            if not election_snapshot.exists or election_snapshot.to_dict().get("status") != ElectionStatus.OPEN:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Can only vote in open elections.",
+                )
+            existing_vote_docs = list(transaction.get(existing_vote_query))
+
+            if existing_vote_docs:
+                # User has voted, update their vote. Fields written at close (payment_applied,
+                # amount_paid, ...) are left as they are
+                vote_changes = {
                     "proposal_id": vote_data.proposal_id,
                     "tokens_used": vote_data.tokens_used,
                     "updated_at": datetime.now(),
-                    "vote_id": existing_vote.vote_id,  # Keep vote_id
-                    "election_id": existing_vote.election_id,  # Keep election_id
-                    "membership_id": existing_vote.membership_id,  # Keep membership_id
-                    "created_at": existing_vote.created_at,  # Keep created_at
                 }
-                vote_ref.set(updated_vote_data)
-                updated_vote = Vote.model_validate(updated_vote_data)
-        else:
+                for existing_vote_doc in existing_vote_docs:
+                    transaction.update(existing_vote_doc.reference, vote_changes)
+                return decode(Vote, {**existing_vote_docs[-1].to_dict(), **vote_changes})
+
             # Create a new vote document
             new_vote_ref = db.collection("votes").document()
-            vote_id = new_vote_ref.id
-
             vote = Vote(
-                vote_id=vote_id,
+                vote_id=new_vote_ref.id,
                 election_id=election_id,
                 membership_id=membership.membership_id,
                 proposal_id=vote_data.proposal_id,
@@ -602,17 +611,18 @@ async def cast_vote(
                 created_at=datetime.now(),
                 updated_at=datetime.now(),
             )
+            transaction.create(new_vote_ref, vote.model_dump())
+            return vote
 
-            new_vote_ref.set(vote.model_dump())
-            updated_vote = vote
+        updated_vote = write_vote(db.transaction())
 
-        logger.info(f"Updated vote: {updated_vote}")
+        logger.debug("Vote %s: %s tokens on proposal %s", updated_vote.vote_id, updated_vote.tokens_used, updated_vote.proposal_id)
 
         return updated_vote
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Unexpected error in cast_vote: {e}")
+        logger.exception("Unexpected error in cast_vote")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while processing your vote.",
@@ -630,22 +640,15 @@ async def close_election(
     Allows an admin to close an election and select the winning proposal
     """
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(
-        current_user_membership_doc.to_dict()
-    )
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can close elections",
@@ -660,7 +663,7 @@ async def close_election(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Election not found",
         )
-    election = Election.model_validate(election_doc.to_dict())
+    election = decode(Election, election_doc.to_dict())
 
     # Ensure that the election is open
     if election.status != ElectionStatus.OPEN:
@@ -670,94 +673,11 @@ async def close_election(
         )
 
     # Get all proposals associated with the election
-    proposal_docs = (
-        db.collection("proposals").where("election_id", "==", election_id).stream()
-    )
-    proposals = [
-        Proposal.model_validate(proposal_doc.to_dict())
-        for proposal_doc in proposal_docs
-    ]
-
-    # If a winning proposal is not explicitly set, determine the winner based on the votes
-    if not winning_proposal_id:
-        votes_by_proposal = {}
-        for proposal in proposals:
-            vote_docs = (
-                db.collection("votes")
-                .where("proposal_id", "==", proposal.proposal_id)
-                .stream()
-            )
-            total_votes = sum(
-                [
-                    Vote.model_validate(vote_doc.to_dict()).tokens_used
-                    for vote_doc in vote_docs
-                ]
-            )
-            votes_by_proposal[proposal.proposal_id] = total_votes
-
-        if not votes_by_proposal:
-            # If there are no votes for any proposal set winning proposal to None
-            winning_proposal_id = None
-        else:
-            # Find the proposal with the most votes
-            winning_proposal_id = max(votes_by_proposal, key=votes_by_proposal.get)
-
-    # Determine which strategy to use based on the payment, price, and resolution options
-    if election.resolution_strategy == "most_votes": 
-        if election.payment_options == "allpay" and election.price_options.startswith("1,"):
-            strategy = MostVotesWinsStrategy(
-                price_strategy=FirstPriceCalculationStrategy(),
-                payment_strategy=AllPayPaymentStrategy(),
-            )
-        elif election.payment_options == "allpay" and election.price_options.startswith("2,"):
-            strategy = MostVotesWinsStrategy(
-                price_strategy=SecondPriceCalculationStrategy(),
-                payment_strategy=AllPayPaymentStrategy(),
-            )
-        elif election.payment_options == "winnerspay" and election.price_options.startswith("1,"):
-            strategy = MostVotesWinsStrategy(
-                price_strategy=FirstPriceCalculationStrategy(),
-                payment_strategy=WinnersPayPaymentStrategy(),
-            )
-        elif election.payment_options == "winnerspay" and election.price_options.startswith("2,"):
-            strategy = MostVotesWinsStrategy(
-                price_strategy=SecondPriceCalculationStrategy(),
-                payment_strategy=WinnersPayPaymentStrategy(),
-        )
-        else: 
-            raise Exception("invalid payment or price options")
+    proposals = load_election_proposals(election_id)
 
-    elif election.resolution_strategy == "lottery": # Lottery strategy
-       strategy = LotteryWinsStrategy(payment_strategy=AllPayPaymentStrategy())
-    else:
-        raise Exception("invalid payment or price options")
-    # Get all memberships of the group so that the strategy can modify the token balance
-    membership_docs = (
-        db.collection("memberships").where("group_id", "==", group_id).stream()
-    )
-    memberships = {
-        doc.to_dict().get("membership_id"): Membership.model_validate(doc.to_dict())
-        for doc in membership_docs
-    }
-
-    vote_docs = db.collection("votes").where("election_id", "==", election_id).stream()
-    votes = [Vote.model_validate(vote_doc.to_dict()) for vote_doc in vote_docs]
-
-    # Resolve the auction using the selected strategy
-    winning_proposal_id = await strategy.resolve_auction(
-        election,
-        proposals,
-        votes,
-        memberships,
-    )
-
-    # Update the election document with status closed and set the winning proposal if it exists
-    updated_election_data = {
-        **election.model_dump(),
-        "status": ElectionStatus.CLOSED,
-        "winning_proposal_id": winning_proposal_id,
-    }
-    election_ref.set(updated_election_data)
+    # Resolve under the close lease so concurrent closes cannot apply payments twice
+    with span("close_and_resolve", {"election_id": election_id}):
+        await close_and_resolve(election, db, None, proposals)
 
     # Fetch the updated election
     updated_election_doc = election_ref.get()
@@ -768,7 +688,9 @@ async def close_election(
             detail="Failed to update election document",
         )
 
-    return Election.model_validate(updated_election_doc.to_dict())
+    closed_election = decode(Election, updated_election_doc.to_dict())
+    election_scheduler.schedule(closed_election)  # drops the pending close
+    return closed_election
 
 
 @router.get("/{election_id}/my-vote", response_model=Optional[Vote])
@@ -779,12 +701,9 @@ async def get_my_vote_for_election(
     Retrieves the current user's vote for a specific election, if one exists.
     """
     # Check if the current user is a member of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
@@ -799,7 +718,7 @@ async def get_my_vote_for_election(
         .limit(1)
         .stream()
     )
-    votes = [Vote.model_validate(doc.to_dict()) for doc in vote_doc]
+    votes = decode_many(Vote, (doc.to_dict() for doc in vote_doc))
 
     if votes:
         return votes[0]  # Return the vote if found
@@ -817,99 +736,63 @@ async def close_election_early(
     Allows an admin to close an election early, regardless of the end_date.
     Returns full election details including complete proposal data.
     """
-    logger.info(
-        f"CLOSE_EARLY: Endpoint hit for election_id: {election_id}, group_id: {group_id}, user_uid: {current_user.uid}"
-    )
+    logger.debug("CLOSE_EARLY: Endpoint hit for election_id: %s, group_id: %s, user_uid: %s", election_id, group_id, current_user.uid)
 
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
-        logger.warning(
-            f"CLOSE_EARLY: User {current_user.uid} is NOT a member of group {group_id}"
-        )
+    if current_user_role is None:
+        logger.warning("CLOSE_EARLY: User %s is NOT a member of group %s", current_user.uid, group_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(
-        current_user_membership_doc.to_dict()
-    )
-
-    if current_user_membership.role != "admin":
-        logger.warning(
-            f"CLOSE_EARLY: User {current_user.uid} is NOT an admin of group {group_id}, role: {current_user_membership.role}"
-        )
+    if current_user_role != "admin":
+        logger.warning("CLOSE_EARLY: User %s is NOT an admin of group %s, role: %s", current_user.uid, group_id, current_user_role)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can close elections early",
         )
 
-    logger.info(
-        f"CLOSE_EARLY: User {current_user.uid} IS an admin of group {group_id}"
-    )
+    logger.debug("CLOSE_EARLY: User %s IS an admin of group %s", current_user.uid, group_id)
 
     # Retrieve the existing election document
     election_ref = db.collection("elections").document(election_id)
     election_doc = election_ref.get()
 
     if not election_doc.exists:
-        logger.warning(f"CLOSE_EARLY: Election {election_id} NOT found")
+        logger.warning("CLOSE_EARLY: Election %s NOT found", election_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Election not found",
         )
-    election = Election.model_validate(election_doc.to_dict())
-    logger.info(
-        f"CLOSE_EARLY: Election {election_id} FOUND, status: {election.status.value}"
-    )
+    election = decode(Election, election_doc.to_dict())
+    logger.debug("CLOSE_EARLY: Election %s FOUND, status: %s", election_id, election.status.value)
 
     # Ensure that the election is open or upcoming (prevent closing already closed elections)
     if election.status not in [ElectionStatus.OPEN, ElectionStatus.UPCOMING]:
-        logger.warning(
-            f"CLOSE_EARLY: Election {election_id} is NOT open or upcoming, status is {election.status.value}, cannot close early"
-        )
+        logger.warning("CLOSE_EARLY: Election %s is NOT open or upcoming, status is %s, cannot close early", election_id, election.status.value)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"This election is already {election.status.value} and cannot be closed early.",
         )
-    logger.info(
-        f"CLOSE_EARLY: Election {election_id} IS open or upcoming, proceeding to close."
-    )
+    logger.debug("CLOSE_EARLY: Election %s IS open or upcoming, proceeding to close.", election_id)
 
     # --- WORKAROUND: Modify end_date to current time ---
     now_utc = datetime.now(timezone.utc)
-    updated_election_data = {"end_date": now_utc}
+    updated_election_data = {"end_date": now_utc, **version_bump()}
     election_ref.update(updated_election_data)
     election.end_date = now_utc
-    logger.info(
-        f"CLOSE_EARLY: Temporarily updated election {election_id} end_date to current time for early closure."
-    )
+    logger.debug("CLOSE_EARLY: Temporarily updated election %s end_date to current time for early closure.", election_id)
     # --- END WORKAROUND ---
 
     # Get all proposals and votes for resolution
-    proposal_docs = (
-        db.collection("proposals")
-        .where("election_id", "==", election_id)
-        .stream()
-    )
-    proposals_list = [
-        Proposal.model_validate(proposal_doc.to_dict())
-        for proposal_doc in proposal_docs
-    ]
-    logger.info(f"CLOSE_EARLY: Fetched {len(proposals_list)} proposals.")
+    proposals_list = load_election_proposals(election_id)
+    logger.debug("CLOSE_EARLY: Fetched %d proposals.", len(proposals_list))
 
-    vote_docs = (
-        db.collection("votes")
-        .where("election_id", "==", election_id)
-        .stream()
-    )
-    votes = [Vote.model_validate(vote_doc.to_dict()) for vote_doc in vote_docs]
-    logger.info(f"CLOSE_EARLY: Fetched {len(votes)} votes.")
+    votes = load_election_votes(election_id)
+    logger.debug("CLOSE_EARLY: Fetched %d votes.", len(votes))
 
     # Get all memberships for token balance updates
     membership_docs = (
@@ -918,18 +801,16 @@ async def close_election_early(
         .stream()
     )
     memberships = {
-        doc.to_dict().get("membership_id"): Membership.model_validate(doc.to_dict())
-        for doc in membership_docs
+        membership.membership_id: membership
+        for membership in decode_many(MembershipRecord, (doc.to_dict() for doc in membership_docs))
     }
-    logger.info(f"CLOSE_EARLY: Fetched {len(memberships)} memberships.")
+    logger.debug("CLOSE_EARLY: Fetched %d memberships.", len(memberships))
 
     # Resolve and close the election using the helper function
     updated_election = await update_election_status_and_resolve(
         election, db, memberships, proposals_list, votes
     )
-    logger.info(
-        f"CLOSE_EARLY: update_election_status_and_resolve returned, updated status: {updated_election.status}, winning_proposal_id: {updated_election.winning_proposal_id}"
-    )
+    logger.info("CLOSE_EARLY: Election %s closed, status: %s, winning_proposal_id: %s", election_id, updated_election.status.value, updated_election.winning_proposal_id)
 
     # Re-fetch the election document to get the absolute latest state
     updated_election_doc = election_ref.get()
@@ -938,25 +819,16 @@ async def close_election_early(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to re-fetch updated election document",
         )
-    updated_election = Election.model_validate(updated_election_doc.to_dict())
+    updated_election = decode(Election, updated_election_doc.to_dict())
+    election_scheduler.schedule(updated_election)
 
-    # Fetch proposals with full details (including vote info since election should be closed)
-    proposal_docs = db.collection("proposals").where("election_id", "==", election_id).stream()
-    proposals = []
-    for proposal_doc in proposal_docs:
-        proposal = Proposal.model_validate(proposal_doc.to_dict())
-        vote_docs = db.collection("votes").where("proposal_id", "==", proposal.proposal_id).stream()
-        votes_for_proposal = [
-            Vote.model_validate(vote_doc.to_dict()).model_dump()
-            for vote_doc in vote_docs
-        ]
-        proposals.append({**proposal.model_dump(), "votes": votes_for_proposal})
+    # Resolution wrote payments to the votes, so re-read them once and group by proposal
+    votes = load_election_votes(election_id)
+    proposals = build_proposal_details(proposals_list, votes, include_votes=True)
 
     election_data = updated_election.model_dump()
     election_data.pop("proposals", None)
-    logger.info(
-        f"CLOSE_EARLY: Returning updated election details with full proposals to client."
-    )
+    logger.debug("CLOSE_EARLY: Returning updated election details with full proposals to client.")
     return ElectionDetailsResponse(**election_data, proposals=proposals)
 
 
@@ -972,22 +844,15 @@ async def start_election_now(
     Returns full election details including complete proposal data.
     """
     # Check if the current user is a member and an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(
-        f"{current_user.uid}_{group_id}"
-    )
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(
-        current_user_membership_doc.to_dict()
-    )
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can start elections early",
@@ -1002,7 +867,7 @@ async def start_election_now(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Election not found",
         )
-    election = Election.model_validate(election_doc.to_dict())
+    election = decode(Election, election_doc.to_dict())
 
     # Ensure that the election is upcoming
     if election.status != ElectionStatus.UPCOMING:
@@ -1016,21 +881,20 @@ async def start_election_now(
     updated_election_data = {
         "start_date": now_utc,
         "status": ElectionStatus.OPEN,
+        **version_bump(),
     }
     election_ref.update(updated_election_data)
+    bump_group_version(db, group_id)
 
     # Get all memberships, votes, and proposals needed for the state update
     membership_docs = db.collection("memberships").where("group_id", "==", group_id).stream()
     memberships = {
-        doc.to_dict().get("membership_id"): Membership.model_validate(doc.to_dict())
-        for doc in membership_docs
+        membership.membership_id: membership
+        for membership in decode_many(MembershipRecord, (doc.to_dict() for doc in membership_docs))
     }
 
-    vote_docs = db.collection("votes").where("election_id", "==", election_id).stream()
-    votes = [Vote.model_validate(doc.to_dict()) for doc in vote_docs]
-
-    proposal_docs = db.collection("proposals").where("election_id", "==", election_id).stream()
-    proposals_list = [Proposal.model_validate(proposal_doc.to_dict()) for proposal_doc in proposal_docs]
+    votes = load_election_votes(election_id)
+    proposals_list = load_election_proposals(election_id)
 
     # Transition to OPEN (or handle immediate closing if end_date is also in the past)
     updated_election = await update_election_status_and_resolve(
@@ -1044,22 +908,15 @@ async def start_election_now(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to re-fetch updated election document",
         )
-    updated_election = Election.model_validate(updated_election_doc.to_dict())
+    updated_election = decode(Election, updated_election_doc.to_dict())
+    election_scheduler.schedule(updated_election)
 
-    # Fetch proposals with full details (including vote info if election is closed)
-    proposal_docs = db.collection("proposals").where("election_id", "==", election_id).stream()
-    proposals = []
-    for proposal_doc in proposal_docs:
-        proposal = Proposal.model_validate(proposal_doc.to_dict())
-        if updated_election.status == ElectionStatus.CLOSED:
-            vote_docs = db.collection("votes").where("proposal_id", "==", proposal.proposal_id).stream()
-            votes_for_proposal = [
-                Vote.model_validate(vote_doc.to_dict()).model_dump()
-                for vote_doc in vote_docs
-            ]
-            proposals.append({**proposal.model_dump(), "votes": votes_for_proposal})
-        else:
-            proposals.append({**proposal.model_dump(), "votes": []})
+    # Include vote information only if the election closed straight away
+    if updated_election.status == ElectionStatus.CLOSED:
+        votes = load_election_votes(election_id)
+    proposals = build_proposal_details(
+        proposals_list, votes, include_votes=updated_election.status == ElectionStatus.CLOSED
+    )
 
     election_data = updated_election.model_dump()
     election_data.pop("proposals", None)  # Remove any proposals key from the election data
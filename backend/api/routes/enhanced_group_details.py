@@ -1,11 +1,16 @@
 # backend/api/routes/enhanced_group_details.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 import asyncio
 from models import Group, Membership, User, Election, MemberWithDetails
 from db import db
 from core.security import get_current_user
+from core.decoding import decode, decode_many
+from core.token_manager import period_start, with_effective_balance
+from core.responses import fast_json_response
+from core.group_cache import fetch_group_data
+from core.http_cache import is_not_modified, make_etag, not_modified, set_validators
 from google.cloud import firestore
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel
 from typing import List
 
@@ -17,13 +22,31 @@ class EnhancedGroupDetailsResponse(BaseModel):
     elections: List[Election]
 
 @router.get("/enhanced-group/{group_id}", response_model=EnhancedGroupDetailsResponse)
-async def get_enhanced_group_details(group_id: str, current_user: User = Depends(get_current_user)):
+async def get_enhanced_group_details(group_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)):
     """
     Retrieve group details, members (with user info), and elections in one call.
     Uses concurrency and batching, and leverages a composite index on elections for fast queries.
+
+    The group's version counter covers its members and elections, so a conditional request
+    is answered from the group document alone. Balances also grow with time-based
+    regeneration, so the current regeneration period is part of the ETag.
     """
+    now_utc = datetime.now(timezone.utc)
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        # Check the validators before paying for the member and election queries
+        group_data = await fetch_group_data(db, group_id)
+        if group_data is not None:
+            token_settings = group_data.get("token_settings") or {}
+            regeneration_period = period_start(now_utc, token_settings.get("regeneration_interval", ""))
+            etag = make_etag("enhanced-group", group_id, group_data.get("version", 0), regeneration_period)
+            last_modified = group_data.get("updated_at")
+            if is_not_modified(request, etag, last_modified):
+                return not_modified(etag, last_modified)
+        group_future = asyncio.sleep(0, result=group_data)
+    else:
+        group_future = fetch_group_data(db, group_id)
+
     # Run queries concurrently.
-    group_future = asyncio.to_thread(db.collection("groups").document(group_id).get)
     memberships_future = asyncio.to_thread(
         lambda: list(db.collection("memberships").where("group_id", "==", group_id).stream())
     )
@@ -35,24 +58,30 @@ async def get_enhanced_group_details(group_id: str, current_user: User = Depends
             .stream()
         )
     )
-    group_doc, membership_docs, election_docs = await asyncio.gather(
+    stored_group, membership_docs, election_docs = await asyncio.gather(
         group_future, memberships_future, elections_future
     )
 
-    if not group_doc.exists:
+    if stored_group is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Group not found.")
 
     # Parse group document.
-    group_data = Group.model_validate(group_doc.to_dict())
+    group_data = decode(Group, stored_group)
+    regeneration_interval = group_data.token_settings.regeneration_interval if group_data.token_settings else ""
+    regeneration_period = period_start(now_utc, regeneration_interval)
+    set_validators(response, make_etag("enhanced-group", group_id, group_data.version, regeneration_period), group_data.updated_at)
 
-    # Process memberships.
-    memberships = [Membership.model_validate(doc.to_dict()) for doc in membership_docs]
+    # Process memberships, showing the balances members have with regeneration included.
+    memberships = [
+        with_effective_balance(membership, group_data.token_settings, now_utc)
+        for membership in decode_many(Membership, (doc.to_dict() for doc in membership_docs))
+    ]
 
     # Batch fetch user documents for memberships.
     user_ids = list({membership.user_id for membership in memberships})
     user_refs = [db.collection("users").document(user_id) for user_id in user_ids]
     user_docs = await asyncio.to_thread(db.get_all, user_refs)
-    users_dict = {doc.id: User.model_validate(doc.to_dict()) for doc in user_docs if doc.exists}
+    users_dict = {doc.id: decode(User, doc.to_dict()) for doc in user_docs if doc.exists}
 
     # Build list of MemberWithDetails objects.
     members_with_details = []
@@ -65,13 +94,13 @@ async def get_enhanced_group_details(group_id: str, current_user: User = Depends
             })
 
     # Process elections.
-    elections = [Election.model_validate(doc.to_dict()) for doc in election_docs]
+    elections = decode_many(Election, (doc.to_dict() for doc in election_docs))
 
-    return EnhancedGroupDetailsResponse(
+    return fast_json_response(EnhancedGroupDetailsResponse(
         group=group_data,
         members=members_with_details,
         elections=elections
-    )
+    ), response)
 
 def include_enhanced_group_details_routes(app):
     app.include_router(router, prefix="/groups", tags=["enhanced_group_details"])
@@ -3,6 +3,10 @@ from fastapi import APIRouter, Depends
 from models import Group, Membership, User, Election, ElectionStatus
 from db import db
 from core.security import get_current_user
+from core.admission import admit, gather_bounded
+from core.decoding import decode
+from core.group_cache import fetch_group_data
+from core.responses import fast_json_response
 from typing import List, Optional
 import asyncio
 from google.cloud import firestore
@@ -37,13 +41,13 @@ def fetch_elections_for_chunk_sync(group_ids_chunk: List[str]):
     last_elections = {}
     active_flags = {}
     for doc in elections_docs:
-        election = Election.model_validate(doc.to_dict())
+        election = decode(Election, doc.to_dict())
         group_id = election.group_id
         # Because of descending order, the first encountered election per group is the latest.
         if group_id not in last_elections:
             last_elections[group_id] = election.end_date
-        # Mark the group as having an active election if status is OPEN or UPCOMING.
-        if election.status in [ElectionStatus.OPEN, ElectionStatus.UPCOMING]:
+        # Mark the group as having an active election if status is OPEN, UPCOMING or CLOSING (mid-close).
+        if election.status in [ElectionStatus.OPEN, ElectionStatus.UPCOMING, ElectionStatus.CLOSING]:
             active_flags[group_id] = True
     return last_elections, active_flags
 
@@ -63,22 +67,22 @@ async def get_my_enhanced_groups(current_user: User = Depends(get_current_user))
     if not group_ids:
         return []
 
-    # 2. Batch fetch group documents concurrently.
-    group_refs = [db.collection("groups").document(group_id) for group_id in group_ids]
-    group_docs = await asyncio.gather(
-        *[asyncio.to_thread(ref.get) for ref in group_refs]
-    )
-    groups_dict = {
-        doc.id: Group.model_validate(doc.to_dict())
-        for doc in group_docs if doc.exists
-    }
+    async with admit("my_groups_enhanced"):
+        # 2. Fetch group documents concurrently, from the cache where possible.
+        group_datas = await gather_bounded(
+            [fetch_group_data(db, group_id) for group_id in group_ids]
+        )
+        groups_dict = {
+            group_id: decode(Group, group_data)
+            for group_id, group_data in zip(group_ids, group_datas) if group_data is not None
+        }
 
-    # 3. Batch fetch elections using "in" queries in chunks (Firestore allows max 10 elements per "in" query).
-    tasks = [
-        asyncio.to_thread(fetch_elections_for_chunk_sync, chunk)
-        for chunk in chunk_list(group_ids, 10)
-    ]
-    results = await asyncio.gather(*tasks)
+        # 3. Batch fetch elections using "in" queries in chunks (Firestore allows max 10 elements per "in" query).
+        tasks = [
+            asyncio.to_thread(fetch_elections_for_chunk_sync, chunk)
+            for chunk in chunk_list(group_ids, 10)
+        ]
+        results = await gather_bounded(tasks)
 
     # Merge results from all chunks.
     last_elections = {}
@@ -96,7 +100,7 @@ async def get_my_enhanced_groups(current_user: User = Depends(get_current_user))
                 last_election_date=last_elections.get(group_id),
                 has_active_elections=active_flags.get(group_id, False)
             ))
-    return enhanced_groups
+    return fast_json_response(enhanced_groups)
 
 def include_enhanced_groups_routes(app):
     app.include_router(router, prefix="/groups", tags=["enhanced_groups"])
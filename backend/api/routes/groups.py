@@ -1,11 +1,18 @@
 # backend/api/routes/groups.py
 import asyncio
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from models import Group, TokenSettings, Membership, User
 from db import db
 from core.security import get_current_user
+from core.decoding import decode, decode_many
+from core.token_manager import load_cached_token_settings, period_start, regenerate_group_tokens, with_effective_balance
+from core.token_ledger import opening_ledger_fields, replay_balance, set_token_balance
+from core.responses import fast_json_response
+from core.admission import admit, gather_bounded
+from core.group_cache import fetch_group_data, fetch_member_role, invalidate_group
+from core.http_cache import bump_group_version, version_bump, is_not_modified, make_etag, not_modified, set_validators
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -28,6 +35,20 @@ class GroupCreate(BaseModel):
     name: str
     description: str = ""
 
+class TokenLedgerEntry(BaseModel):
+    delta: int
+    reason: str  # "initial" | "opening" | "payment" | "regeneration" | "admin_set"
+    reference: Optional[str] = None
+    created_at: datetime
+
+class TokenLedgerResponse(BaseModel):
+    membership_id: str
+    stored_balance: int
+    replayed_balance: int  # checkpoint balance plus the entries below; differs from stored_balance only if the ledger is incomplete
+    checkpoint_balance: int = 0
+    checkpoint_through: Optional[datetime] = None
+    entries: List[TokenLedgerEntry]
+
 
 @router.get("/my-groups", response_model=List[Group])
 async def get_my_groups(current_user: User = Depends(get_current_user)):
@@ -55,9 +76,9 @@ async def get_my_groups(current_user: User = Depends(get_current_user)):
                 .where("group_id", "in", group_ids_chunk)
                 .stream()
             )
-            groups.extend([Group.model_validate(doc.to_dict()) for doc in group_docs_chunk])
+            groups.extend(decode_many(Group, (doc.to_dict() for doc in group_docs_chunk)))
 
-    return groups
+    return fast_json_response(groups)
 
 
 @router.post("/", response_model=Group, status_code=status.HTTP_201_CREATED)
@@ -95,16 +116,21 @@ async def create_group(
 
     new_group_ref.set(group.model_dump())
 
-    # Create a membership for the user who created the group
+    # Create a membership for the user who created the group, opening its token ledger
     membership_id = f"{current_user.uid}_{group_id}"
+    batch = db.batch()
     membership = Membership(
         membership_id=membership_id,
         user_id=current_user.uid,
         group_id=group_id,
-        token_balance=group.token_settings.initial_tokens if group.token_settings and group.token_settings.initial_tokens is not None else 0, # Use initial tokens from group settings
         role="admin",
+        **opening_ledger_fields(
+            batch, db, membership_id, group_id,
+            group.token_settings.initial_tokens if group.token_settings and group.token_settings.initial_tokens is not None else 0, # Use initial tokens from group settings
+        ),
     )
-    db.collection("memberships").document(membership_id).set(membership.model_dump())
+    batch.set(db.collection("memberships").document(membership_id), membership.model_dump())
+    batch.commit()
 
     return group
 
@@ -117,66 +143,67 @@ async def get_group_members_with_details(
     Retrieves a list of all members of a specific group with their membership details.
     """
     # Ensure that the user is a member of the group before fetching members
-    membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    membership_doc = membership_ref.get()
-
-    if not membership_doc.exists:
+    if await fetch_member_role(db, current_user.uid, group_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group"
         )
 
-    # Get all memberships for the group
-    membership_docs = (
-        db.collection("memberships")
-        .where("group_id", "==", group_id)
-        .stream()
-    )
+    # Get all memberships for the group, and the token settings their balances regenerate by
+    async with admit("group_members"):
+        membership_docs, token_settings = await asyncio.gather(
+            asyncio.to_thread(lambda: list(db.collection("memberships").where("group_id", "==", group_id).stream())),
+            asyncio.to_thread(load_cached_token_settings, db, group_id),
+        )
 
-    memberships = [Membership.model_validate(doc.to_dict()) for doc in membership_docs]
+        memberships = [
+            with_effective_balance(membership, token_settings)
+            for membership in decode_many(Membership, (doc.to_dict() for doc in membership_docs))
+        ]
 
-    user_ids = [membership.user_id for membership in memberships]
-    user_refs = [db.collection("users").document(user_id) for user_id in user_ids]
+        user_ids = [membership.user_id for membership in memberships]
+        user_refs = [db.collection("users").document(user_id) for user_id in user_ids]
 
-    # Fetch all user documents in parallel using asyncio.gather and batch get
-    user_docs_coroutines = [asyncio.to_thread(user_ref.get) for user_ref in user_refs] # Run get() in thread pool
-    user_docs = await asyncio.gather(*user_docs_coroutines)
+        # Fetch the user documents in parallel, a bounded number at a time
+        user_docs_coroutines = [asyncio.to_thread(user_ref.get) for user_ref in user_refs] # Run get() in thread pool
+        user_docs = await gather_bounded(user_docs_coroutines)
 
     members_with_details = []
     for membership, user_doc in zip(memberships, user_docs): # Iterate through memberships and fetched user docs
         if user_doc.exists:
-            user = User.model_validate(user_doc.to_dict())
+            user = decode(User, user_doc.to_dict())
             members_with_details.append(MemberWithDetails(user=user, membership=membership))
 
-    return members_with_details
+    return fast_json_response(members_with_details)
 
 @router.get("/{group_id}", response_model=Group)
-async def get_group_details(group_id: str, current_user: User = Depends(get_current_user)):
+async def get_group_details(group_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user)):
     """
     Retrieves the details of a specific group, given the group's ID.
+    Supports conditional requests via the group's version counter.
     """
 
     # Ensure that the user is a member of the group before fetching details
-    membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    membership_doc = membership_ref.get()
-
-    if not membership_doc.exists:
+    if await fetch_member_role(db, current_user.uid, group_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group"
         )
 
-    group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
+    group_data = await fetch_group_data(db, group_id)
 
-    if not group_doc.exists:
+    if group_data is None:
          raise HTTPException(
              status_code=status.HTTP_404_NOT_FOUND,
              detail="Group not found"
          )
 
-    group = Group.model_validate(group_doc.to_dict())
-    return group
+    group = decode(Group, group_data)
+    etag = make_etag("group", group.group_id, group.version)
+    if is_not_modified(request, etag, group.updated_at):
+        return not_modified(etag, group.updated_at)
+    set_validators(response, etag, group.updated_at)
+    return fast_json_response(group, response)
 
 @router.put("/{group_id}", response_model=Group)
 async def update_group(
@@ -190,18 +217,15 @@ async def update_group(
     Only admins of the group can update the group details.
     """
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(current_user_membership_doc.to_dict())
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
          raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can update group details",
@@ -217,20 +241,17 @@ async def update_group(
             detail="Group not found",
         )
 
-    existing_group = group_doc.to_dict()
-
-    # Update the group with new name and description and updated_at
-    updated_group_data = {
-        **existing_group,
-         "name": group_update.name,
+    # Update only the name and description, bumping the version (and updated_at) atomically
+    # so concurrent writers cannot end up sharing a version
+    group_ref.update({
+        "name": group_update.name,
         "description": group_update.description,
-        "updated_at": datetime.now()
-        }
-
-    group_ref.set(updated_group_data)
+        **version_bump(),
+    })
+    invalidate_group(group_id)
 
     # Return the updated group
-    return Group.model_validate(updated_group_data)
+    return decode(Group, group_ref.get().to_dict())
 
 
 @router.put("/{group_id}/token-settings", response_model=Group)
@@ -245,18 +266,15 @@ async def update_group_token_settings(
     Only admins of the group can update the token settings.
     """
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(current_user_membership_doc.to_dict())
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
          raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can update group token settings",
@@ -272,17 +290,26 @@ async def update_group_token_settings(
             detail="Group not found",
         )
 
-    # Update the group with new token settings and updated_at
-    updated_group_data = {
-        **group_doc.to_dict(), # start with existing data to preserve other fields
-        "token_settings": token_settings_update.token_settings.model_dump(),
-        "updated_at": datetime.now()
-    }
+    # Store the balances owed under the old settings, so the new rate or interval only
+    # applies from now on
+    existing_group = group_doc.to_dict()
+    if existing_group.get("token_settings"):
+        old_token_settings = TokenSettings.model_validate(existing_group["token_settings"])
+        current_period = period_start(datetime.now(timezone.utc), old_token_settings.regeneration_interval)
+        if current_period is not None:
+            await asyncio.to_thread(
+                regenerate_group_tokens, db, group_id, old_token_settings, f"settings:{current_period.isoformat()}"
+            )
 
-    group_ref.set(updated_group_data)
+    # Update the token settings, bumping the version (and updated_at) atomically
+    group_ref.update({
+        "token_settings": token_settings_update.token_settings.model_dump(),
+        **version_bump(),
+    })
+    invalidate_group(group_id)
 
     # Return the updated group
-    return Group.model_validate(updated_group_data)
+    return decode(Group, group_ref.get().to_dict())
 
 
 @router.patch("/{group_id}/members/{user_id}/token-balance", response_model=Membership)
@@ -299,18 +326,15 @@ async def update_member_token_balance(
     """
 
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(current_user_membership_doc.to_dict())
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
          raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can update member's token balances",
@@ -327,16 +351,56 @@ async def update_member_token_balance(
              detail="Membership not found",
          )
 
-    existing_membership = membership_doc.to_dict()
+    # Record the override in the token ledger. It replaces any regeneration owed so far.
+    await asyncio.to_thread(
+        set_token_balance, db, membership_ref, request.token_balance, "admin_set", current_user.uid,
+        {"last_token_regeneration": datetime.now(timezone.utc), "updated_at": datetime.now()},
+    )
+    bump_group_version(db, group_id)  # member balances are part of the group views
 
-    # Update the token balance
-    updated_membership_data = {
-         **existing_membership,
-        "token_balance": request.token_balance,
-        "updated_at": datetime.now()
-    }
+    # Return the updated membership
+    return decode(Membership, membership_ref.get().to_dict())
 
-    membership_ref.set(updated_membership_data)
+@router.get("/{group_id}/members/{user_id}/token-ledger", response_model=TokenLedgerResponse)
+async def get_member_token_ledger(
+    group_id: str,
+    user_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Replays a member's token balance from the ledger, for audits.
 
-    # Return the updated membership
-    return Membership.model_validate(updated_membership_data)
\ No newline at end of file
+    Only admins of a group can audit member's token balances.
+    """
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
+    if current_user_role is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Current user is not a member of this group",
+        )
+    if current_user_role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can audit member's token balances",
+        )
+
+    membership_id = f"{user_id}_{group_id}"
+    membership_doc, replay = await asyncio.gather(
+        asyncio.to_thread(db.collection("memberships").document(membership_id).get),
+        asyncio.to_thread(replay_balance, db, membership_id),
+    )
+    if not membership_doc.exists:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Membership not found",
+        )
+
+    checkpoint = replay["checkpoint"] or {}
+    return TokenLedgerResponse(
+        membership_id=membership_id,
+        stored_balance=membership_doc.to_dict().get("token_balance", 0),
+        replayed_balance=replay["balance"],
+        checkpoint_balance=checkpoint.get("balance", 0),
+        checkpoint_through=checkpoint.get("through"),
+        entries=[TokenLedgerEntry.model_validate(entry) for entry in replay["entries"]],
+    )
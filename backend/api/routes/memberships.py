@@ -3,7 +3,11 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from models import Group, Membership, User
 from db import db
 from core.security import get_current_user
-from core.token_manager import regenerate_tokens_for_membership # Import token regeneration function
+from core.decoding import decode
+from core.token_manager import with_effective_balance
+from core.token_ledger import opening_ledger_fields
+from core.group_cache import fetch_group_data, fetch_member_role, invalidate_group, invalidate_member_role
+from core.http_cache import version_bump
 from typing import List
 from pydantic import BaseModel
 from google.cloud import firestore
@@ -31,18 +35,15 @@ async def add_member_to_group(
     email_to_add = request.email_to_add
 
     # Check if the current user is an admin of the group
-    current_user_membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-    current_user_membership_doc = current_user_membership_ref.get()
+    current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-    if not current_user_membership_doc.exists:
+    if current_user_role is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Current user is not a member of this group",
         )
 
-    current_user_membership = Membership.model_validate(current_user_membership_doc.to_dict())
-
-    if current_user_membership.role != "admin":
+    if current_user_role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can add members to a group",
@@ -55,7 +56,7 @@ async def add_member_to_group(
 
     user_to_add = None
     for doc in user_to_add_docs:
-        user_to_add = User.model_validate(doc.to_dict())
+        user_to_add = decode(User, doc.to_dict())
         break  # Assuming email is unique, so we only take the first match
 
     if not user_to_add:
@@ -76,32 +77,35 @@ async def add_member_to_group(
         )
 
     # Fetch the group to get token settings
-    group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
+    group_data = await fetch_group_data(db, group_id)
 
-    if not group_doc.exists:
+    if group_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Group not found", # Should not happen, but safety check
         )
-    group = Group.model_validate(group_doc.to_dict())
+    group = decode(Group, group_data)
 
     initial_tokens = 0  # Default to 0 if token settings or initial_tokens is missing
     if group.token_settings and group.token_settings.initial_tokens is not None:
         initial_tokens = group.token_settings.initial_tokens
 
-    # Create the new membership
+    # Create the new membership, opening its token ledger
+    batch = db.batch()
     new_membership = Membership(
         membership_id=membership_id,
         user_id=user_to_add.uid,
         group_id=group_id,
-        token_balance=initial_tokens,  # Use initial tokens from group settings
         role="member",  # Or some default role
+        **opening_ledger_fields(batch, db, membership_id, group_id, initial_tokens),  # Use initial tokens from group settings
     )
-    membership_ref.set(new_membership.model_dump())
+    batch.set(membership_ref, new_membership.model_dump())
+    batch.commit()
 
     # Add the membership to the group's memberships array
-    group_ref.update({"memberships": firestore.ArrayUnion([membership_id])})
+    group_ref = db.collection("groups").document(group_id)
+    group_ref.update({"memberships": firestore.ArrayUnion([membership_id]), **version_bump()})
+    invalidate_group(group_id)
 
     return new_membership
 
@@ -125,7 +129,7 @@ async def remove_member_from_group(
 
     user_to_remove = None
     for doc in user_to_remove_docs:
-        user_to_remove = User.model_validate(doc.to_dict())
+        user_to_remove = decode(User, doc.to_dict())
         break
 
     if not user_to_remove:
@@ -138,18 +142,15 @@ async def remove_member_from_group(
     # Check if the current user is an admin or the user to be removed
     if current_user.uid != user_to_remove.uid:
         # If not the same user, check if the current user is an admin
-        current_user_membership_ref = db.collection("memberships").document(f"{current_user.uid}_{group_id}")
-        current_user_membership_doc = current_user_membership_ref.get()
+        current_user_role = await fetch_member_role(db, current_user.uid, group_id)
 
-        if not current_user_membership_doc.exists:
+        if current_user_role is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Current user is not a member of this group",
             )
 
-        current_user_membership = Membership.model_validate(current_user_membership_doc.to_dict())
-
-        if current_user_membership.role != "admin":
+        if current_user_role != "admin":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only admins can remove other members from a group",
@@ -168,10 +169,12 @@ async def remove_member_from_group(
 
     # Remove the membership
     membership_ref.delete()
+    invalidate_member_role(user_to_remove.uid, group_id)
 
     # Remove the membership from the group's memberships array
     group_ref = db.collection("groups").document(group_id)
-    group_ref.update({"memberships": firestore.ArrayRemove([membership_id])})
+    group_ref.update({"memberships": firestore.ArrayRemove([membership_id]), **version_bump()})
+    invalidate_group(group_id)
 
     return None
 
@@ -193,24 +196,16 @@ async def get_my_membership(
             detail="Membership not found"
         )
 
-    membership = Membership.model_validate(membership_doc.to_dict())
+    membership = decode(Membership, membership_doc.to_dict())
 
     # Fetch the associated group to get token settings
-    group_ref = db.collection("groups").document(group_id)
-    group_doc = group_ref.get()
-    if not group_doc.exists:
+    group_data = await fetch_group_data(db, group_id)
+    if group_data is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Group not found" # Should not happen if membership exists
         )
-    group = Group.model_validate(group_doc.to_dict())
-
-
-    # --- TOKEN REGENERATION ---
-    if group.token_settings and group.token_settings.regeneration_interval != "election":
-        updated_membership = await regenerate_tokens_for_membership(membership, group) # Regenerate tokens
-    # --- END TOKEN REGENERATION ---
-    else:
-        updated_membership = membership
+    group = decode(Group, group_data)
 
-    return updated_membership # Return the updated membership
\ No newline at end of file
+    # Regeneration is computed, not written; the balance is stored when tokens are spent
+    return with_effective_balance(membership, group.token_settings)
\ No newline at end of file
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from models import User
 from db import db  # Import Firestore client
 from core.security import get_current_user
+from core.decoding import decode
 
 router = APIRouter()
 
@@ -27,7 +28,7 @@ async def create_user_if_new(
 
     if user_doc.exists:
         # User already exists, return existing user data
-        return User.model_validate(user_doc.to_dict())
+        return decode(User, user_doc.to_dict())
 
     # Create the new user document
     new_user = User(uid=user_id, email=current_user.email, memberships=[])
@@ -48,7 +49,7 @@ async def get_current_user_profile(current_user: User = Depends(get_current_user
     user_doc = user_ref.get()
 
     if user_doc.exists:
-        return User.model_validate(user_doc.to_dict())
+        return decode(User, user_doc.to_dict())
     else:
         # This should ideally never happen if create_user_if_new is used correctly
         raise HTTPException(
@@ -0,0 +1,65 @@
+# backend/benchmarks/bench_models.py
+"""
+Compares the cost of loading and dumping votes as pydantic API models vs. slot records.
+
+Run from backend/:  python -m benchmarks.bench_models [count]
+See benchmarks/suite.py for the full suite with baselines.
+"""
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+
+from models import Vote
+from records import VoteRecord
+
+
+def make_vote_docs(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "vote_id": f"vote_{index}",
+            "election_id": "election_1",
+            "membership_id": f"user_{index}_group_1",
+            "proposal_id": f"proposal_{index % 5}",
+            "tokens_used": index % 50,
+            "created_at": now,
+            "updated_at": now,
+            "amount_paid": 0,
+            "tokens_regenerated": 0,
+            "payment_applied": False,
+        }
+        for index in range(count)
+    ]
+
+
+def peak_memory(build) -> int:
+    tracemalloc.start()
+    objects = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return peak
+
+
+def main(count: int = 10_000, repeat: int = 5):
+    docs = make_vote_docs(count)
+    models = [Vote.model_validate(doc) for doc in docs]
+    records = [VoteRecord.from_doc(doc) for doc in docs]
+
+    cases = {
+        "Vote.model_validate": lambda: [Vote.model_validate(doc) for doc in docs],
+        "VoteRecord.from_doc": lambda: [VoteRecord.from_doc(doc) for doc in docs],
+        "Vote.model_dump": lambda: [vote.model_dump() for vote in models],
+        "VoteRecord.to_doc": lambda: [vote.to_doc() for vote in records],
+    }
+    print(f"{count} votes, best of {repeat}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=repeat))
+        print(f"  {name:<22} {best * 1000:8.2f} ms")
+    print(f"  {'peak memory (models)':<22} {peak_memory(cases['Vote.model_validate']) / 1024:8.0f} KiB")
+    print(f"  {'peak memory (records)':<22} {peak_memory(cases['VoteRecord.from_doc']) / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,215 @@
+# backend/benchmarks/suite.py
+"""
+Micro-benchmarks for auction resolution and model validation, with a regression gate.
+
+Covers winner selection (MostVotesWinsStrategy, LotteryWinsStrategy), pricing
+(SecondPriceCalculationStrategy), both payment strategies with storage stubbed out (the
+per-vote transaction is replaced by an in-memory balance update, so what is measured is the
+strategy loop and its thread hops), and validating Vote/Membership lists.
+
+Run from backend/:
+    python -m benchmarks.suite                                  all cases, 10 to 1M votes
+    python -m benchmarks.suite --sizes 10,1000 --cases payment  a subset
+    python -m benchmarks.suite --save-baseline                  store results in benchmarks/baseline.json
+    python -m benchmarks.suite --threshold 0.25                 exit 1 if a case is >25% slower than the baseline
+
+Results are JSON ({"case@size": {"seconds": best, "per_item_us": ...}}) so CI can keep them.
+Only compare baselines recorded on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List
+
+# Strategies import the shared client; nothing here talks to it, so use the in-memory one
+os.environ.setdefault("DATASTORE", "memory")
+
+from pydantic import TypeAdapter
+
+from benchmarks.bench_models import make_vote_docs
+from models import Election, Membership, Proposal, TokenSettings, Vote
+from records import MembershipRecord, VoteRecord
+from strategies import auction_resolution
+from strategies.auction_resolution import (
+    AllPayPaymentStrategy,
+    FirstPriceCalculationStrategy,
+    LotteryWinsStrategy,
+    MostVotesWinsStrategy,
+    SecondPriceCalculationStrategy,
+    WinnersPayPaymentStrategy,
+)
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+PROPOSALS = 5
+
+# A case builds its inputs for a size and returns the function to time
+Case = Callable[[int], Callable[[], object]]
+
+
+def make_membership_docs(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "membership_id": f"user_{index}_group_1",
+            "user_id": f"user_{index}",
+            "group_id": "group_1",
+            "token_balance": 50,
+            "role": "member",
+            "created_at": now,
+            "updated_at": now,
+            "last_token_regeneration": now,
+            "ledger_opened": True,
+        }
+        for index in range(count)
+    ]
+
+
+def make_election() -> Election:
+    return Election.model_construct(election_id="election_1", group_id="group_1", price_options="2,1", payment_options="allpay")
+
+
+def make_proposals() -> List[Proposal]:
+    return [
+        Proposal.model_construct(proposal_id=f"proposal_{index}", election_id="election_1", title=f"Proposal {index}")
+        for index in range(PROPOSALS)
+    ]
+
+
+@contextmanager
+def stubbed_storage(balances: Dict[str, int]) -> Iterator[None]:
+    """Replaces the payment strategies' Firestore access with in-memory balances."""
+    def commit_vote_payment(vote, membership_id, token_settings, compute) -> bool:
+        balances[membership_id] = compute(balances[membership_id])[0]
+        return True
+
+    original = auction_resolution._commit_vote_payment, auction_resolution.load_token_settings
+    auction_resolution._commit_vote_payment = commit_vote_payment
+    auction_resolution.load_token_settings = lambda db, group_id: TokenSettings(regeneration_rate=1, regeneration_interval="election", max_tokens=50, initial_tokens=50)
+    try:
+        yield
+    finally:
+        auction_resolution._commit_vote_payment, auction_resolution.load_token_settings = original
+
+
+class Suite:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.cases: Dict[str, Case] = {
+            "most_votes.select_winner": self.strategy_case(
+                lambda election, proposals, votes: MostVotesWinsStrategy(FirstPriceCalculationStrategy(), AllPayPaymentStrategy()).select_winner(election, proposals, votes)
+            ),
+            "lottery.select_winner": self.strategy_case(
+                lambda election, proposals, votes: LotteryWinsStrategy(AllPayPaymentStrategy()).select_winner(election, proposals, votes)
+            ),
+            "second_price.calculate_price": self.strategy_case(
+                lambda election, proposals, votes: SecondPriceCalculationStrategy().calculate_price(election, proposals, votes)
+            ),
+            "payment.all_pay": self.payment_case(AllPayPaymentStrategy),
+            "payment.winners_pay": self.payment_case(WinnersPayPaymentStrategy),
+            "validate.votes": self.validation_case(make_vote_docs, Vote),
+            "validate.memberships": self.validation_case(make_membership_docs, Membership),
+        }
+
+    def strategy_case(self, call) -> Case:
+        def build(size: int):
+            election, proposals = make_election(), make_proposals()
+            votes = [VoteRecord.from_doc(doc) for doc in make_vote_docs(size)]
+            return lambda: self.loop.run_until_complete(call(election, proposals, votes))
+        return build
+
+    def payment_case(self, strategy_class) -> Case:
+        def build(size: int):
+            election, proposals = make_election(), make_proposals()
+            votes = [VoteRecord.from_doc(doc) for doc in make_vote_docs(size)]
+            memberships = {
+                membership.membership_id: membership
+                for membership in (MembershipRecord.from_doc(doc) for doc in make_membership_docs(size))
+            }
+            balances = {membership_id: membership.token_balance for membership_id, membership in memberships.items()}
+
+            def run():
+                with stubbed_storage(balances):
+                    self.loop.run_until_complete(strategy_class().apply_payment(
+                        election, proposals, votes, memberships, 0.5, "proposal_0"
+                    ))
+            return run
+        return build
+
+    def validation_case(self, make_docs, model) -> Case:
+        adapter = TypeAdapter(List[model])
+
+        def build(size: int):
+            docs = make_docs(size)
+            return lambda: adapter.validate_python(docs)
+        return build
+
+    def run(self, case_names: List[str], sizes: List[int]) -> Dict[str, Dict[str, float]]:
+        results = {}
+        for name in case_names:
+            for size in sizes:
+                function = self.cases[name](size)
+                repeat = 5 if size <= 10_000 else 1
+                best = float("inf")
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    function()
+                    best = min(best, time.perf_counter() - started)
+                results[f"{name}@{size}"] = {"seconds": best, "per_item_us": best / size * 1e6}
+                print(f"  {name + '@' + str(size):<40} {best * 1000:10.2f} ms  {best / size * 1e6:8.3f} us/item", flush=True)
+        return results
+
+
+def regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Cases slower than their baseline by more than `threshold` (a fraction)."""
+    found = []
+    for key, metrics in results.items():
+        base = baseline.get(key)
+        if base and base["seconds"] and metrics["seconds"] > base["seconds"] * (1 + threshold):
+            found.append(f"{key}: {base['seconds'] * 1000:.2f} ms -> {metrics['seconds'] * 1000:.2f} ms "
+                         f"({metrics['seconds'] / base['seconds'] - 1:+.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--cases", default="", help="comma-separated case name prefixes (default: all)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    parser.add_argument("--threshold", type=float, default=None, metavar="FRACTION",
+                        help="exit 1 if a case is slower than the baseline by more than FRACTION")
+    args = parser.parse_args()
+
+    suite = Suite()
+    prefixes = [prefix for prefix in args.cases.split(",") if prefix]
+    case_names = [name for name in suite.cases if not prefixes or any(name.startswith(prefix) for prefix in prefixes)]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = suite.run(case_names, sizes)
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.threshold is not None and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)["results"], args.threshold)
+        if found:
+            print("\nRegressions:\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# backend/core/admission.py
+"""
+Admission control for datastore-bound work.
+
+Firestore calls run on the default thread pool. Under a spike, requests that fan out into
+dozens of `asyncio.to_thread` calls each fill its queue, and latency collapses for every
+request in the worker. Two limits keep the pool busy but not swamped:
+
+- `admit(route)`: a request does its datastore work only while holding a slot of its route's
+  limiter and of the global one. Each limiter has a bounded queue. A request that finds the
+  queue full, or waits longer than ADMISSION_QUEUE_TIMEOUT_SECONDS, is shed at once with 503
+  and Retry-After, so clients back off instead of piling up.
+- `gather_bounded`: an admitted request runs at most DATASTORE_FANOUT_CONCURRENCY of its
+  fanned-out calls at a time.
+
+Queue depth, slots in use and shed requests are exported per limiter. Limits are per worker.
+"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Deque, Dict, Iterable, List, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+from core.config import settings
+from core.metrics import ADMISSION_IN_USE, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+
+T = TypeVar("T")
+
+GLOBAL = "global"
+
+
+class Limiter:
+    """
+    At most `concurrency` holders at once and at most `max_queue` waiting, served in order.
+    Only used from the event loop, so plain counters are enough.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.in_use = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _report(self):
+        ADMISSION_IN_USE.set(self.in_use, self.name)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters), self.name)
+
+    def _shed(self, reason: str):
+        ADMISSION_SHED.inc(self.name, reason)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+
+    async def acquire(self, timeout: Optional[float]):
+        if self.in_use < self.concurrency and not self._waiters:
+            self.in_use += 1
+            self._report()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._shed("timeout")
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self._report()
+
+    def release(self):
+        # Hand the slot straight to the next waiter, so it cannot be taken by a newcomer
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._report()
+                return
+        self.in_use -= 1
+        self._report()
+
+
+_limiters: Dict[str, Limiter] = {}
+
+
+def limiter(name: str) -> Limiter:
+    existing = _limiters.get(name)
+    if existing is None:
+        if name == GLOBAL:
+            existing = Limiter(GLOBAL, settings.ADMISSION_GLOBAL_CONCURRENCY, settings.ADMISSION_GLOBAL_QUEUE)
+        else:
+            existing = Limiter(name, settings.ADMISSION_ROUTE_CONCURRENCY, settings.ADMISSION_ROUTE_QUEUE)
+        _limiters[name] = existing
+    return existing
+
+
+@asynccontextmanager
+async def admit(route: str) -> AsyncIterator[None]:
+    """
+    Holds a slot of the route's limiter and of the global one for the duration of the block.
+    Raises a 503 HTTPException with Retry-After if either is saturated.
+    """
+    if not settings.ADMISSION_ENABLED:
+        yield
+        return
+    timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+    route_limiter, global_limiter = limiter(route), limiter(GLOBAL)
+    # Route first, so one saturated route queues on its own limiter rather than the global one
+    await route_limiter.acquire(timeout)
+    try:
+        await global_limiter.acquire(timeout)
+        try:
+            yield
+        finally:
+            global_limiter.release()
+    finally:
+        route_limiter.release()
+
+
+async def gather_bounded(awaitables: Iterable[Awaitable[T]], limit: Optional[int] = None) -> List[T]:
+    """
+    `asyncio.gather` running at most `limit` (DATASTORE_FANOUT_CONCURRENCY) at a time.
+    Coroutines such as `asyncio.to_thread(...)` only start when awaited, so the thread pool
+    sees at most `limit` calls from this request.
+    """
+    semaphore = asyncio.Semaphore(limit or settings.DATASTORE_FANOUT_CONCURRENCY)
+
+    async def bounded(awaitable: Awaitable[T]) -> T:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(bounded(awaitable) for awaitable in awaitables))
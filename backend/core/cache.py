@@ -0,0 +1,262 @@
+# backend/core/cache.py
+"""
+Two-tier cache shared by the uvicorn workers.
+
+Every worker keeps an L1 in process memory, an LRU whose entries expire after a TTL. The
+optional L2 lives on a Redis-protocol server (CACHE_REDIS_URL) shared by all workers, so a
+value one worker loaded costs the others a network round trip instead of a Firestore read.
+
+After changing the underlying document, writers call `invalidate`. That drops the key from
+this worker's L1, deletes it from the L2 and publishes it on the invalidation channel; a
+subscriber thread in every worker drops it from their L1s. Pub/sub delivery is at most once,
+so L1 entries also expire on their own, and a subscriber that (re)connects clears its L1s.
+A read racing a write can still put the old value back, until the entry's TTL runs out.
+
+Without CACHE_REDIS_URL there is only the L1 and no cross-worker invalidation: other workers
+see a change once their entry expires. CACHE_REDIS_URL=memory:// uses an in-process stand-in
+(core/memory_redis.py). Shared tier errors are logged and counted as misses; the cache never
+fails a request.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+import msgpack
+import redis
+from cachetools import LRUCache, TTLCache
+
+from core.config import settings
+from core.metrics import CACHE_ERRORS, CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:"
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# name -> the caches with that name in this process, for the invalidation subscriber
+_caches: Dict[str, "weakref.WeakSet[TieredCache]"] = {}
+
+
+def _pack(value: Any) -> bytes:
+    # Timestamps round-trip as timezone-aware datetimes
+    return msgpack.packb(value, datetime=True, use_bin_type=True)
+
+
+def _unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, timestamp=3, raw=False)
+
+
+def _drop_local(qualified_key: bytes):
+    name, _, key = qualified_key.decode().partition(":")
+    for cache in list(_caches.get(name, ())):
+        cache.drop_local(key)
+
+
+def clear_local_caches():
+    for caches in list(_caches.values()):
+        for cache in list(caches):
+            cache.clear_local()
+
+
+class SharedTier:
+    """
+    The L2: values on a Redis-protocol server, and the channel that tells every worker to
+    drop invalidated keys from its L1.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._stop = threading.Event()
+        self._subscriber = threading.Thread(target=self._listen, name="cache-invalidations", daemon=True)
+        self._subscriber.start()
+
+    def _call(self, operation: str, function: Callable, *args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception as error:
+            CACHE_ERRORS.inc(operation)
+            logger.warning("Shared cache %s failed: %s", operation, error)
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._call("get", self.client.get, KEY_PREFIX + key)
+
+    def set(self, key: str, data: bytes, ttl: float):
+        self._call("set", self.client.set, KEY_PREFIX + key, data, ex=max(1, int(ttl)))
+
+    def invalidate(self, key: str):
+        self._call("delete", self.client.delete, KEY_PREFIX + key)
+        self._call("publish", self.client.publish, INVALIDATION_CHANNEL, key)
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations published while this worker was not subscribed are lost
+                clear_local_caches()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        _drop_local(message["data"])
+            except Exception as error:
+                CACHE_ERRORS.inc("subscribe")
+                logger.warning("Cache invalidation subscriber disconnected, reconnecting: %s", error)
+                self._stop.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        self._stop.set()
+        self._subscriber.join(timeout=2.0)
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+def _connect(url: str) -> Optional[SharedTier]:
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        from core.memory_redis import MemoryRedis
+        return SharedTier(MemoryRedis.shared())
+    timeout = settings.CACHE_REDIS_TIMEOUT_SECONDS
+    return SharedTier(redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout))
+
+
+_shared: Optional[SharedTier] = None
+_shared_resolved = False
+_shared_lock = threading.Lock()
+
+
+def shared_tier() -> Optional[SharedTier]:
+    """The shared tier, connected on first use, or None if there is none."""
+    global _shared, _shared_resolved
+    if not _shared_resolved:
+        with _shared_lock:
+            if not _shared_resolved:
+                _shared = _connect(settings.CACHE_REDIS_URL)
+                _shared_resolved = True
+    return _shared
+
+
+def close_shared_tier():
+    global _shared, _shared_resolved
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+        _shared, _shared_resolved = None, False
+
+
+class TieredCache:
+    """
+    A named cache: this worker's L1 in front of the shared tier.
+
+    `dump` and `load` convert values to and from msgpack-able data for the shared tier. None
+    means "not found" and is never cached. Cached values are handed to every caller as they
+    are, so treat them as read-only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        l1_ttl: Optional[float],
+        l2_ttl: float,
+        dump: Optional[Callable[[Any], Any]] = None,
+        load: Optional[Callable[[Any], Any]] = None,
+    ):
+        if ":" in name:
+            raise ValueError(f"Cache names cannot contain ':': {name}")
+        self.name = name
+        self.l2_ttl = l2_ttl
+        self._dump = dump or (lambda value: value)
+        self._load = load or (lambda data: data)
+        # No L1 TTL for values that never change
+        self._local = TTLCache(maxsize, l1_ttl) if l1_ttl else LRUCache(maxsize)
+        self._lock = threading.Lock()
+        _caches.setdefault(name, weakref.WeakSet()).add(self)
+
+    def _shared_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def peek(self, key: str) -> Optional[Any]:
+        """The L1 entry, if any. Never blocks on the network."""
+        with self._lock:
+            value = self._local.get(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(self.name, "l1")
+        return value
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.peek(key)
+        if value is not None:
+            return value
+        shared = shared_tier()
+        if shared is not None:
+            data = shared.get(self._shared_key(key))
+            if data is not None:
+                try:
+                    value = self._load(_unpack(data))
+                except Exception as error:
+                    CACHE_ERRORS.inc("decode")
+                    logger.warning("Discarding undecodable %s cache entry %s: %s", self.name, key, error)
+                if value is not None:
+                    CACHE_REQUESTS.inc(self.name, "l2")
+                    with self._lock:
+                        self._local[key] = value
+                    return value
+        CACHE_REQUESTS.inc(self.name, "miss")
+        return None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._local[key] = value
+        shared = shared_tier()
+        if shared is not None:
+            try:
+                data = _pack(self._dump(value))
+            except Exception as error:
+                CACHE_ERRORS.inc("encode")
+                logger.warning("Not sharing %s cache entry %s: %s", self.name, key, error)
+                return
+            shared.set(self._shared_key(key), data, self.l2_ttl)
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Returns the cached value, or calls `loader` and caches what it returns (unless None)."""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """`get_or_load` for the event loop: an L1 hit is answered without a thread hop."""
+        value = self.peek(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get_or_load, key, loader)
+
+    def invalidate(self, key: str):
+        """Drops the key here, in the shared tier and, through the channel, in every other worker."""
+        self.drop_local(key)
+        shared = shared_tier()
+        if shared is not None:
+            shared.invalidate(self._shared_key(key))
+
+    def drop_local(self, key: str):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
@@ -7,6 +7,67 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "My FastAPI App"
     # Load the raw string from the environment (or .env) using an alias.
     allowed_origins: str = Field("", alias="ALLOWED_ORIGINS")
+    # "firestore", or "memory" for the in-process stand-in (offline development, load tests)
+    DATASTORE: str = "firestore"
+    # Startup warm-up before /readyz reports ready: elections that ended within the lookback
+    # (and their groups) are preloaded.
+    WARMUP_ENABLED: bool = True
+    WARMUP_LOOKBACK_SECONDS: float = 7 * 24 * 3600.0
+    WARMUP_MAX_ELECTIONS: int = 200
+    WARMUP_RETRY_SECONDS: float = 2.0
+    # Shared cache tier (core/cache.py): a Redis-protocol URL such as redis://cache:6379/0,
+    # "memory://" for the in-process stand-in, or empty to cache in each worker only. Without
+    # it, other workers see a change once their L1 entry expires.
+    CACHE_REDIS_URL: str = ""
+    CACHE_REDIS_TIMEOUT_SECONDS: float = 0.25
+    CACHE_L1_TTL_SECONDS: float = 5.0
+    CACHE_L2_TTL_SECONDS: float = 300.0
+    # Admission control for datastore-bound routes (core/admission.py): slots and queue sizes
+    # per worker, across routes and per route. Requests that cannot queue get 503 + Retry-After.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_GLOBAL_CONCURRENCY: int = 32
+    ADMISSION_GLOBAL_QUEUE: int = 128
+    ADMISSION_ROUTE_CONCURRENCY: int = 16
+    ADMISSION_ROUTE_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+    # Concurrent datastore calls one request may fan out into.
+    DATASTORE_FANOUT_CONCURRENCY: int = 8
+    # Background election transitions. Disable on workers that should not run the scheduler.
+    ELECTION_SCHEDULER_ENABLED: bool = True
+    ELECTION_SCHEDULER_REFRESH_SECONDS: float = 300.0
+    # How long a worker may hold an election's close lease before another worker can take over.
+    ELECTION_CLOSE_LEASE_SECONDS: float = 120.0
+    # Responses smaller than this are sent uncompressed.
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    # Decode stored documents without validation (we wrote them), validating this fraction as a check.
+    TRUSTED_DECODE: bool = True
+    TRUSTED_DECODE_SAMPLE_RATE: float = 0.0
+    # Background folding of old token ledger entries into per-membership checkpoints.
+    TOKEN_LEDGER_COMPACTION_ENABLED: bool = True
+    TOKEN_LEDGER_COMPACTION_INTERVAL_SECONDS: float = 3600.0
+    TOKEN_LEDGER_COMPACT_AFTER_SECONDS: float = 7 * 24 * 3600.0
+    # Bearer token required to scrape /metrics. Leave empty only if the endpoint is not publicly reachable.
+    METRICS_TOKEN: str = ""
+    # Firestore operation accounting: per-request counts in X-Firestore-* headers, and a warning
+    # for requests that read more documents than the budget.
+    FIRESTORE_DEBUG_HEADERS: bool = False
+    FIRESTORE_READ_BUDGET: int = 500
+    # Logging: JSON lines (or plain text for local development), and the fraction of
+    # per-request log lines to keep.
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_REQUEST_SAMPLE_RATE: float = 1.0
+    # On-demand profiling: requests sending this token in X-Profile (or ?profile=) are profiled.
+    # Empty disables profiling entirely. Profiles are kept in memory and, if set, written to PROFILING_DIR.
+    PROFILING_TOKEN: str = ""
+    PROFILING_INTERVAL_SECONDS: float = 0.005
+    PROFILING_DIR: str = ""
+    # Tracing: "console" (stdout), "file" (JSON lines in TRACING_FILE) or empty to disable.
+    # The sample rate applies to traces started here; incoming traceparent headers decide for themselves.
+    TRACING_EXPORTER: str = ""
+    TRACING_FILE: str = "spans.jsonl"
+    TRACING_SAMPLE_RATE: float = 1.0
     
     @property
     def ALLOWED_ORIGINS(self) -> list[str]:
@@ -0,0 +1,160 @@
+# backend/core/decoding.py
+"""
+Decoding of documents we wrote ourselves.
+
+In trusted mode stored documents are turned into models with `model_construct`, which skips
+validation. Enum and nested model fields are still converted so the result behaves like a
+validated model. A configurable fraction of decodes is validated as well, and any
+disagreement is logged, so drift in stored data is still noticed in production.
+
+Time spent decoding is added up per request (see `start_decode_stats`) and reported by the
+request middleware.
+"""
+import logging
+import random
+import threading
+import time
+import typing
+from contextvars import ContextVar
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DecodeStats:
+    """Decode work done while serving one request. Shared with worker threads, hence the lock."""
+
+    __slots__ = ("seconds", "documents", "_lock")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.documents = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, documents: int):
+        with self._lock:
+            self.seconds += seconds
+            self.documents += documents
+
+
+_decode_stats: ContextVar[Optional[DecodeStats]] = ContextVar("decode_stats", default=None)
+
+
+def start_decode_stats() -> DecodeStats:
+    """
+    Starts collecting decode stats for the current request. asyncio.to_thread copies the
+    context, so decodes in worker threads are counted too.
+    """
+    stats = DecodeStats()
+    _decode_stats.set(stats)
+    return stats
+
+
+def _record(started: float, documents: int):
+    stats = _decode_stats.get()
+    if stats is not None:
+        stats.add(time.perf_counter() - started, documents)
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+@lru_cache(maxsize=None)
+def _field_converters(model: Type[BaseModel]) -> Dict[str, Callable[[Any], Any]]:
+    """
+    Fields whose stored value is not already the attribute value: enums are stored as their
+    value and nested models as dicts. List relationship fields are never stored, so they are
+    left alone.
+    """
+    converters: Dict[str, Callable[[Any], Any]] = {}
+    for name, field in model.model_fields.items():
+        annotation = _unwrap_optional(field.annotation)
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            converters[name] = annotation
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            converters[name] = lambda value, nested=annotation: construct(nested, value)
+    return converters
+
+
+def construct(model: Type[T], data: Dict[str, Any]) -> T:
+    """
+    Builds a model from a stored document without validating it.
+    """
+    values = dict(data)
+    for name, convert in _field_converters(model).items():
+        value = values.get(name)
+        if value is not None and not isinstance(value, BaseModel):
+            values[name] = convert(value)
+    return model.model_construct(**values)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def _check_sample(model: Type[BaseModel], data: Dict[str, Any], constructed: BaseModel):
+    try:
+        validated = model.model_validate(data)
+    except ValidationError as error:
+        logger.warning("Stored %s failed validation: %s", model.__name__, error)
+        return
+    # Only compare stored fields; defaults such as datetime.now differ between the two
+    stored_fields = set(data) & set(model.model_fields)
+    if validated.model_dump(include=stored_fields) != constructed.model_dump(include=stored_fields):
+        logger.warning("Trusted decode of %s differs from validation", model.__name__)
+
+
+def _should_sample() -> bool:
+    sample_rate = settings.TRUSTED_DECODE_SAMPLE_RATE
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def decode(model: Type[T], data: Dict[str, Any]) -> T:
+    """
+    Decodes one stored document into `model`, a pydantic model or a record with `from_doc`.
+    """
+    started = time.perf_counter()
+    if not (isinstance(model, type) and issubclass(model, BaseModel)):
+        result = model.from_doc(data)
+    elif settings.TRUSTED_DECODE:
+        result = construct(model, data)
+        if _should_sample():
+            _check_sample(model, data, result)
+    else:
+        result = model.model_validate(data)
+    _record(started, 1)
+    return result
+
+
+def decode_many(model: Type[T], documents: Iterable[Dict[str, Any]]) -> List[T]:
+    """
+    Decodes stored documents into a list of `model`. Without trusted mode the whole list is
+    validated in one call through a cached TypeAdapter.
+    """
+    documents = list(documents)
+    started = time.perf_counter()
+    if not (isinstance(model, type) and issubclass(model, BaseModel)):
+        results = [model.from_doc(data) for data in documents]
+    elif settings.TRUSTED_DECODE:
+        results = [construct(model, data) for data in documents]
+        for data, result in zip(documents, results):
+            if _should_sample():
+                _check_sample(model, data, result)
+    else:
+        results = _list_adapter(model).validate_python(documents)
+    _record(started, len(documents))
+    return results
@@ -0,0 +1,144 @@
+# backend/core/election_results.py
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+
+from core.cache import TieredCache
+from models import (
+    Election,
+    ElectionResults,
+    ElectionStatus,
+    Proposal,
+    ProposalResult,
+    RESULTS_SCHEMA_VERSION,
+    Vote,
+    VoteResult,
+)
+
+logger = logging.getLogger(__name__)
+
+# Snapshots never change once written, so cached entries never need invalidating and are
+# shared between workers for as long as they are likely to be read. The schema version is
+# part of the name, so workers on different versions do not share entries.
+RESULTS_SHARED_TTL_SECONDS = 7 * 24 * 3600
+results_cache = TieredCache(
+    f"election_results_v{RESULTS_SCHEMA_VERSION}", maxsize=1024, l1_ttl=None, l2_ttl=RESULTS_SHARED_TTL_SECONDS,
+    dump=lambda results: results.model_dump(mode="json"), load=ElectionResults.model_validate,
+)
+
+# Closed results are immutable; let clients keep them for as long as they like.
+RESULTS_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def build_results_snapshot(election: Election, proposals: List[Proposal], votes: List[Vote], price_multiplier: Optional[float], tokens_regenerated: int = 0) -> ElectionResults:
+    """
+    Builds the compact results document for a closed election from its settled votes.
+
+    Args:
+        tokens_regenerated: Tokens the group regeneration job added when the election closed.
+    """
+    votes_by_proposal: Dict[str, List[VoteResult]] = {}
+    totals_by_proposal: Dict[str, int] = {}
+    for vote in votes:
+        votes_by_proposal.setdefault(vote.proposal_id, []).append(VoteResult(
+            vote_id=vote.vote_id,
+            membership_id=vote.membership_id,
+            tokens_used=vote.tokens_used,
+            amount_paid=vote.amount_paid,
+            tokens_regenerated=vote.tokens_regenerated,
+        ))
+        totals_by_proposal[vote.proposal_id] = totals_by_proposal.get(vote.proposal_id, 0) + vote.tokens_used
+
+    return ElectionResults(
+        election_id=election.election_id,
+        election_name=election.election_name,
+        group_id=election.group_id,
+        start_date=election.start_date,
+        end_date=election.end_date,
+        payment_options=election.payment_options,
+        price_options=election.price_options,
+        resolution_strategy=election.resolution_strategy,
+        winning_proposal_id=election.winning_proposal_id,
+        price_multiplier=price_multiplier,
+        resolution_fingerprint=election.resolution_fingerprint,
+        closed_at=datetime.now(timezone.utc),
+        tokens_cast=sum(vote.tokens_used for vote in votes),
+        tokens_paid=sum(vote.amount_paid for vote in votes),
+        # Votes settled before regeneration moved to the group job still carry their share
+        tokens_regenerated=tokens_regenerated + sum(vote.tokens_regenerated for vote in votes),
+        proposals=[
+            ProposalResult(
+                proposal_id=proposal.proposal_id,
+                title=proposal.title,
+                proposer_id=proposal.proposer_id,
+                created_at=proposal.created_at,
+                total_tokens=totals_by_proposal.get(proposal.proposal_id, 0),
+                votes=votes_by_proposal.get(proposal.proposal_id, []),
+            )
+            for proposal in proposals
+        ],
+    )
+
+
+def write_results_snapshot(db: firestore.Client, results: ElectionResults):
+    """
+    Stores the snapshot with create() so it is written at most once; a retried close keeps
+    the first snapshot.
+    """
+    try:
+        db.collection("election_results").document(results.election_id).create(results.model_dump())
+    except AlreadyExists:
+        logger.info("Results snapshot for election %s already exists", results.election_id)
+
+
+def get_results_snapshot(db: firestore.Client, election_id: str) -> Optional[ElectionResults]:
+    """
+    Returns the results snapshot for a closed election, or None if it has none (still open,
+    closed before snapshots existed, or written with an older schema version).
+    """
+    return results_cache.get_or_load(election_id, lambda: _load_results_snapshot(db, election_id))
+
+
+def _load_results_snapshot(db: firestore.Client, election_id: str) -> Optional[ElectionResults]:
+    results_doc = db.collection("election_results").document(election_id).get()
+    if not results_doc.exists:
+        return None
+    data = results_doc.to_dict()
+    if data.get("schema_version") != RESULTS_SCHEMA_VERSION:
+        return None
+    return ElectionResults.model_validate(data)
+
+
+def results_to_details(results: ElectionResults) -> dict:
+    """
+    Renders a snapshot in the shape of ElectionDetailsResponse.
+    """
+    return {
+        "election_id": results.election_id,
+        "group_id": results.group_id,
+        "start_date": results.start_date,
+        "end_date": results.end_date,
+        "status": ElectionStatus.CLOSED,
+        "payment_options": results.payment_options,
+        "price_options": results.price_options,
+        "resolution_strategy": results.resolution_strategy,
+        "winning_proposal_id": results.winning_proposal_id,
+        "proposals": [
+            {
+                "proposal_id": proposal.proposal_id,
+                "election_id": results.election_id,
+                "proposer_id": proposal.proposer_id,
+                "title": proposal.title,
+                "created_at": proposal.created_at,
+                "total_tokens": proposal.total_tokens,
+                "votes": [
+                    {**vote.model_dump(), "election_id": results.election_id, "proposal_id": proposal.proposal_id}
+                    for vote in proposal.votes
+                ],
+            }
+            for proposal in results.proposals
+        ],
+    }
@@ -0,0 +1,190 @@
+# backend/core/election_scheduler.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from db import db
+from core.config import settings
+from core.decoding import decode, decode_many
+from models import Election, ElectionStatus
+from records import ProposalRecord
+from core.election_state_manager import update_election_status_and_resolve, next_transition_time, is_transition_due
+
+logger = logging.getLogger(__name__)
+
+
+class ElectionScheduler:
+    """
+    Fires election status transitions (UPCOMING -> OPEN -> CLOSED) in the background.
+
+    Pending transitions are kept in a min-heap keyed by the time they are due. The heap is
+    loaded from two indexed queries (status + start_date, status + end_date) when the
+    scheduler starts and is refreshed periodically so elections created by other workers
+    are picked up. Routes that create or reschedule an election call `schedule` so the
+    change takes effect immediately in this worker.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, retry_delay: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self._heap: List[Tuple[datetime, str]] = []
+        self._due_at: Dict[str, datetime] = {}  # election_id -> currently valid heap entry
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Public API ---
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Loads pending transitions and starts the background loop."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        await self.refresh()
+        self._task = asyncio.create_task(self._run(), name="election-scheduler")
+        logger.info("Election scheduler started with %d pending transitions", len(self._due_at))
+
+    async def stop(self):
+        """Stops the background loop."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wakeup = None
+
+    def schedule(self, election: Election):
+        """
+        (Re)schedules the next transition of an election. Elections without a pending
+        transition are removed from the schedule.
+        """
+        due_at = next_transition_time(election)
+        if due_at is None:
+            self._due_at.pop(election.election_id, None)
+            return
+        if self._due_at.get(election.election_id) == due_at:
+            return
+        self._due_at[election.election_id] = due_at
+        heapq.heappush(self._heap, (due_at, election.election_id))
+        if self._wakeup is not None:
+            self._wakeup.set()  # the new entry may be the earliest one, re-arm the sleep
+
+    def nudge(self, election: Election):
+        """
+        Called by read paths that notice an election whose transition is overdue.
+        Makes sure it is queued without doing any work on the caller's request.
+        """
+        if is_transition_due(election):
+            self.schedule(election)
+
+    async def refresh(self):
+        """Reloads every pending transition from Firestore."""
+        upcoming_docs, open_docs, closing_docs = await asyncio.gather(
+            asyncio.to_thread(
+                lambda: list(
+                    db.collection("elections")
+                    .where("status", "==", ElectionStatus.UPCOMING.value)
+                    .order_by("start_date")
+                    .stream()
+                )
+            ),
+            asyncio.to_thread(
+                lambda: list(
+                    db.collection("elections")
+                    .where("status", "==", ElectionStatus.OPEN.value)
+                    .order_by("end_date")
+                    .stream()
+                )
+            ),
+            asyncio.to_thread(
+                lambda: list(
+                    db.collection("elections")
+                    .where("status", "==", ElectionStatus.CLOSING.value)
+                    .stream()
+                )
+            ),
+        )
+        for doc in [*upcoming_docs, *open_docs, *closing_docs]:
+            self.schedule(decode(Election, doc.to_dict()))
+
+    # --- Background loop ---
+
+    def _seconds_until_next(self) -> Optional[float]:
+        while self._heap:
+            due_at, election_id = self._heap[0]
+            if self._due_at.get(election_id) != due_at:
+                heapq.heappop(self._heap)  # stale entry, superseded by a later schedule()
+                continue
+            return max(0.0, (due_at - datetime.now(timezone.utc)).total_seconds())
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_refresh = loop.time() + self.refresh_interval
+        while True:
+            timeout = self._seconds_until_next()
+            until_refresh = max(0.0, next_refresh - loop.time())
+            timeout = until_refresh if timeout is None else min(timeout, until_refresh)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            await self._fire_due()
+
+            if loop.time() >= next_refresh:
+                try:
+                    await self.refresh()
+                except Exception:
+                    logger.exception("Election scheduler refresh failed")
+                next_refresh = loop.time() + self.refresh_interval
+
+    async def _fire_due(self):
+        now_utc = datetime.now(timezone.utc)
+        while self._heap and self._heap[0][0] <= now_utc:
+            due_at, election_id = heapq.heappop(self._heap)
+            if self._due_at.get(election_id) != due_at:
+                continue
+            del self._due_at[election_id]
+            try:
+                election = await self.fire(election_id)
+            except Exception:
+                logger.exception("Transition for election %s failed, retrying in %ss", election_id, self.retry_delay)
+                retry_at = datetime.fromtimestamp(now_utc.timestamp() + self.retry_delay, timezone.utc)
+                self._due_at[election_id] = retry_at
+                heapq.heappush(self._heap, (retry_at, election_id))
+                continue
+            if election is not None:
+                self.schedule(election)
+
+    async def fire(self, election_id: str) -> Optional[Election]:
+        """
+        Applies whatever transition is due for one election, resolving it if it closes.
+        Returns the updated election, or None if it no longer exists.
+        """
+        election_doc = await asyncio.to_thread(db.collection("elections").document(election_id).get)
+        if not election_doc.exists:
+            return None
+        election = decode(Election, election_doc.to_dict())
+
+        proposals: List[ProposalRecord] = []
+        if election.status in (ElectionStatus.OPEN, ElectionStatus.CLOSING):
+            # Only closing needs proposals; votes and memberships are read under the close lease.
+            proposal_docs = await asyncio.to_thread(
+                lambda: list(db.collection("proposals").where("election_id", "==", election_id).stream())
+            )
+            proposals = decode_many(ProposalRecord, (doc.to_dict() for doc in proposal_docs))
+
+        return await update_election_status_and_resolve(election, db, None, proposals, [])
+
+
+election_scheduler = ElectionScheduler(refresh_interval=settings.ELECTION_SCHEDULER_REFRESH_SECONDS)
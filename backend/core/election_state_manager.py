@@ -1,8 +1,26 @@
 # backend/core/election_state_manager.py
-import pdb
-from datetime import datetime, timezone
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 from google.cloud import firestore
-from models import Election, ElectionStatus, Group
+from core.config import settings
+from core.election_results import build_results_snapshot, write_results_snapshot
+from core.decoding import decode, decode_many
+from core.firestore_compat import transactional
+from core.group_cache import invalidate_group
+from core.http_cache import version_bump, bump_group_version
+from core.metrics import RESOLUTION_LATENCY
+from core.tracing import span
+from core.token_manager import election_period_key, load_token_settings, regenerate_group_tokens
+from models import Election, ElectionStatus, Membership, Proposal, Vote
+from records import MembershipRecord, VoteRecord
 from strategies.auction_resolution import ( # Import strategies if needed for closing
     AuctionResolutionStrategy,
     MostVotesWinsStrategy,
@@ -13,6 +31,244 @@ from strategies.auction_resolution import ( # Import strategies if needed for cl
     WinnersPayPaymentStrategy
 )
 
+logger = logging.getLogger(__name__)
+
+# Identifies this process as the holder of a close lease
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Firestore hands back aware datetimes, request bodies may not; treat naive values as UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def next_transition_time(election: Election) -> Optional[datetime]:
+    """
+    Returns the moment the election's next status transition is due, or None if it has none left.
+    """
+    if election.status == ElectionStatus.UPCOMING:
+        return _as_utc(election.start_date)
+    if election.status == ElectionStatus.OPEN:
+        return _as_utc(election.end_date)
+    if election.status == ElectionStatus.CLOSING:
+        # Retry once the lease runs out in case the worker holding it died
+        expires_at = election.close_lease_expires_at or election.end_date
+        return _as_utc(expires_at)
+    return None
+
+
+def is_transition_due(election: Election, now_utc: Optional[datetime] = None) -> bool:
+    """
+    Cheap status-and-time check that needs nothing beyond the election document itself.
+    """
+    due_at = next_transition_time(election)
+    return due_at is not None and due_at <= (now_utc or datetime.now(timezone.utc))
+
+
+def build_strategy(election: Election) -> AuctionResolutionStrategy:
+    """
+    Determines which strategy to use based on the resolution, payment and price options.
+    """
+    if election.resolution_strategy == 'lottery':
+        # For lottery, price options don't affect the strategy
+        if election.payment_options == "allpay":
+            return LotteryWinsStrategy(payment_strategy=AllPayPaymentStrategy())
+        elif election.payment_options == "winnerspay":
+            return LotteryWinsStrategy(payment_strategy=WinnersPayPaymentStrategy())
+        else:
+            raise Exception("Invalid payment option for lottery resolution")
+    elif election.resolution_strategy == 'most_votes':
+        if election.payment_options == "allpay" and election.price_options.startswith("1,"):
+            return MostVotesWinsStrategy(price_strategy=FirstPriceCalculationStrategy(),
+                                         payment_strategy=AllPayPaymentStrategy())
+        elif election.payment_options == "allpay" and election.price_options.startswith("2,"):
+            return MostVotesWinsStrategy(price_strategy=SecondPriceCalculationStrategy(),
+                                         payment_strategy=AllPayPaymentStrategy())
+        elif election.payment_options == "winnerspay" and election.price_options.startswith("1,"):
+            return MostVotesWinsStrategy(price_strategy=FirstPriceCalculationStrategy(),
+                                         payment_strategy=WinnersPayPaymentStrategy())
+        elif election.payment_options == "winnerspay" and election.price_options.startswith("2,"):
+            return MostVotesWinsStrategy(price_strategy=SecondPriceCalculationStrategy(),
+                                         payment_strategy=WinnersPayPaymentStrategy())
+        else:
+            raise Exception("Invalid payment or price options for most votes resolution")
+    else:
+        raise Exception("Invalid resolution strategy")
+
+
+def resolution_fingerprint(election: Election, proposals: List[Proposal], votes: List[Vote]) -> str:
+    """
+    Hashes everything the outcome of an election depends on. A worker that takes over an
+    abandoned close reuses the recorded winner only if the fingerprint still matches, which
+    keeps lottery draws stable across retries.
+    """
+    payload = {
+        "resolution_strategy": str(getattr(election.resolution_strategy, "value", election.resolution_strategy)),
+        "payment_options": election.payment_options,
+        "price_options": election.price_options,
+        "proposals": sorted(proposal.proposal_id for proposal in proposals),
+        "votes": sorted(
+            (vote.vote_id, vote.membership_id, vote.proposal_id, vote.tokens_used)
+            for vote in votes
+        ),
+    }
+    return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode()).hexdigest()
+
+
+def _acquire_close_lease(db: firestore.Client, election_id: str) -> Optional[dict]:
+    """
+    Compare-and-set OPEN -> CLOSING in a transaction, recording this worker as the lease owner.
+    A CLOSING election whose lease has expired (its worker died mid-close) can be taken over.
+
+    Returns:
+        The election data as it was before the lease was taken, or None if another worker
+        holds the lease or the election is not closable.
+    """
+    election_ref = db.collection("elections").document(election_id)
+
+    @transactional
+    def acquire(transaction):
+        snapshot = election_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        now_utc = datetime.now(timezone.utc)
+        if data.get("status") == ElectionStatus.CLOSING:
+            expires_at = data.get("close_lease_expires_at")
+            if expires_at is not None and expires_at > now_utc:
+                return None  # someone else is closing it
+        elif data.get("status") != ElectionStatus.OPEN:
+            return None
+        transaction.update(election_ref, {
+            "status": ElectionStatus.CLOSING,
+            "close_lease_owner": WORKER_ID,
+            "close_lease_expires_at": now_utc + timedelta(seconds=settings.ELECTION_CLOSE_LEASE_SECONDS),
+            **version_bump(),
+        })
+        transaction.update(db.collection("groups").document(data["group_id"]), version_bump())
+        return data
+
+    previous = acquire(db.transaction())
+    if previous is not None:
+        invalidate_group(previous["group_id"])
+    return previous
+
+
+def _release_close_lease(db: firestore.Client, election_id: str, winning_proposal_id: Optional[str]) -> bool:
+    """
+    Marks the election CLOSED, but only if this worker still owns the lease.
+    """
+    election_ref = db.collection("elections").document(election_id)
+
+    @transactional
+    def release(transaction):
+        snapshot = election_ref.get(transaction=transaction)
+        if not snapshot.exists or snapshot.to_dict().get("close_lease_owner") != WORKER_ID:
+            return None
+        transaction.update(election_ref, {
+            "status": ElectionStatus.CLOSED,
+            "winning_proposal_id": winning_proposal_id,
+            "close_lease_owner": firestore.DELETE_FIELD,
+            "close_lease_expires_at": firestore.DELETE_FIELD,
+            **version_bump(),
+        })
+        # Payments changed member balances, which the group views show
+        group_id = snapshot.to_dict()["group_id"]
+        transaction.update(db.collection("groups").document(group_id), version_bump())
+        return group_id
+
+    group_id = release(db.transaction())
+    if group_id is None:
+        return False
+    invalidate_group(group_id)
+    return True
+
+
+async def close_and_resolve(election: Election, db: firestore.Client, memberships: Optional[Dict[str, Membership]], proposals: List[Proposal]) -> Election:
+    """
+    Closes an election under a lease so that exactly one worker resolves it and applies payments.
+
+    Votes are re-read once the lease is held, so votes that landed after the caller loaded its
+    data are included and payments already applied by an abandoned close are visible.
+
+    Args:
+        election: The Election object.
+        db: Firestore client.
+        memberships: Dictionary of group memberships, loaded here if not provided.
+        proposals: List of proposals for the election
+
+    Returns:
+        The election as this worker last saw it. If another worker holds the lease the
+        returned election is in the CLOSING state.
+    """
+    election_id = election.election_id
+    previous = await asyncio.to_thread(_acquire_close_lease, db, election_id)
+    if previous is None:
+        election_doc = await asyncio.to_thread(db.collection("elections").document(election_id).get)
+        logger.info("Election %s is already being closed by another worker", election_id)
+        return decode(Election, election_doc.to_dict()) if election_doc.exists else election
+
+    close_started = time.perf_counter()
+    vote_docs = await asyncio.to_thread(lambda: list(db.collection("votes").where("election_id", "==", election_id).stream()))
+    votes = decode_many(VoteRecord, (doc.to_dict() for doc in vote_docs))
+    if not memberships:
+        membership_docs = await asyncio.to_thread(lambda: list(db.collection("memberships").where("group_id", "==", election.group_id).stream()))
+        memberships = {
+            membership.membership_id: membership
+            for membership in decode_many(MembershipRecord, (doc.to_dict() for doc in membership_docs))
+        }
+
+    strategy = build_strategy(election)
+    fingerprint = resolution_fingerprint(election, proposals, votes)
+    if previous.get("resolution_fingerprint") == fingerprint:
+        # Taking over an abandoned close: keep the winner it already drew
+        winning_proposal_id = previous.get("winning_proposal_id")
+    else:
+        with RESOLUTION_LATENCY.time(type(strategy).__name__, "select_winner"), \
+                span("strategy.tally", {"strategy": type(strategy).__name__, "proposals": len(proposals), "votes": len(votes)}):
+            winning_proposal_id = await strategy.select_winner(election, proposals, votes)
+        election_ref = db.collection("elections").document(election_id)
+        await asyncio.to_thread(election_ref.update, {
+            "resolution_fingerprint": fingerprint,
+            "winning_proposal_id": winning_proposal_id,
+        })
+
+    price_multiplier = None
+    tokens_regenerated = 0
+    if winning_proposal_id is not None:
+        # Payments are applied per vote at most once, so a retried settle only pays what is left
+        with RESOLUTION_LATENCY.time(type(strategy.payment_strategy).__name__, "settle"):
+            price_multiplier = await strategy.settle(election, proposals, votes, memberships, winning_proposal_id)
+        token_settings = await asyncio.to_thread(load_token_settings, db, election.group_id)
+        if token_settings and token_settings.regeneration_interval == "election":
+            # Idempotent per election, so a retried close does not regenerate twice
+            with RESOLUTION_LATENCY.time("group", "regenerate"), span("tokens.regenerate", {"group_id": election.group_id}):
+                tokens_regenerated = await asyncio.to_thread(
+                    regenerate_group_tokens, db, election.group_id, token_settings, election_period_key(election_id)
+                )
+        # Pick up amount_paid / tokens_regenerated for the results snapshot
+        vote_docs = await asyncio.to_thread(lambda: list(db.collection("votes").where("election_id", "==", election_id).stream()))
+        votes = decode_many(VoteRecord, (doc.to_dict() for doc in vote_docs))
+
+    election.winning_proposal_id = winning_proposal_id # Update the object
+    election.resolution_fingerprint = fingerprint
+    # Written before the status flips so every CLOSED election has its snapshot
+    results = build_results_snapshot(election, proposals, votes, price_multiplier, tokens_regenerated)
+    await asyncio.to_thread(write_results_snapshot, db, results)
+
+    if not await asyncio.to_thread(_release_close_lease, db, election_id, winning_proposal_id):
+        logger.warning("Lost the close lease for election %s before finishing", election_id)
+
+    RESOLUTION_LATENCY.observe(time.perf_counter() - close_started, type(strategy).__name__, "close")
+    election.status = ElectionStatus.CLOSED # Update the object
+    election.close_lease_owner = None
+    election.close_lease_expires_at = None
+    logger.info("Election %s transitioned to CLOSED and resolved. Winning proposal: %s", election_id, winning_proposal_id)
+    return election
+
+
 async def update_election_status_and_resolve(election: Election, db: firestore.Client, memberships, proposals, votes) -> Election:
     """
     Checks the election's start and end times and updates its status accordingly.
@@ -23,66 +279,28 @@ async def update_election_status_and_resolve(election: Election, db: firestore.C
         db: Firestore client.
         memberships: Dictionary of group memberships.
         proposals: List of proposals for the election
-        votes: List of votes for the election
+        votes: List of votes for the election. Closing re-reads them under the close lease.
 
     Returns:
         The updated Election object.
     """
+    with span("update_election_status_and_resolve", {"election_id": election.election_id, "status": str(election.status)}):
+        return await _update_election_status_and_resolve(election, db, memberships, proposals)
+
+
+async def _update_election_status_and_resolve(election: Election, db: firestore.Client, memberships, proposals) -> Election:
     now_utc = datetime.now(timezone.utc)
 
     if election.status == ElectionStatus.UPCOMING and now_utc >= election.start_date:
         # Transition to OPEN
-        election.status = ElectionStatus.OPEN
         election_ref = db.collection("elections").document(election.election_id)
-        election_ref.update({"status": ElectionStatus.OPEN})
+        election_ref.update({"status": ElectionStatus.OPEN, **version_bump()})
+        bump_group_version(db, election.group_id)
         election.status = ElectionStatus.OPEN # Update the object as well for immediate use
-        print(f"Election {election.election_id} transitioned to OPEN.")  # Optional log
-
-    elif election.status == ElectionStatus.OPEN and now_utc >= election.end_date:
-        # Transition to CLOSED and Resolve
-        election.status = ElectionStatus.CLOSED
-        election_ref = db.collection("elections").document(election.election_id)
-        updated_election_data = {
-            "status": ElectionStatus.CLOSED,
-        }
-
-        # --- Resolve and Close Election Logic (Reusing from your close_election route) ---
-        # Determine which strategy to use based on the payment and price options
-        if election.resolution_strategy == 'lottery':
-            # For lottery, price options don't affect the strategy
-            if election.payment_options == "allpay":
-                strategy = LotteryWinsStrategy(payment_strategy=AllPayPaymentStrategy())
-            elif election.payment_options == "winnerspay":
-                strategy = LotteryWinsStrategy(payment_strategy=WinnersPayPaymentStrategy())
-            else:
-                raise Exception("Invalid payment option for lottery resolution")
-        elif election.resolution_strategy == 'most_votes':
-            if election.payment_options == "allpay" and election.price_options.startswith("1,"):
-                strategy = MostVotesWinsStrategy(price_strategy=FirstPriceCalculationStrategy(),
-                                                payment_strategy=AllPayPaymentStrategy())
-            elif election.payment_options == "allpay" and election.price_options.startswith("2,"):
-                strategy = MostVotesWinsStrategy(price_strategy=SecondPriceCalculationStrategy(),
-                                                payment_strategy=AllPayPaymentStrategy())
-            elif election.payment_options == "winnerspay" and election.price_options.startswith("1,"):
-                strategy = MostVotesWinsStrategy(price_strategy=FirstPriceCalculationStrategy(),
-                                                payment_strategy=WinnersPayPaymentStrategy())
-            elif election.payment_options == "winnerspay" and election.price_options.startswith("2,"):
-                strategy = MostVotesWinsStrategy(price_strategy=SecondPriceCalculationStrategy(),
-                                                payment_strategy=WinnersPayPaymentStrategy())
-            else:
-                raise Exception("Invalid payment or price options for most votes resolution")
-        else:
-            raise Exception("Invalid resolution strategy")
-
-
-        # Resolve the auction using the selected strategy
-        winning_proposal_id = await strategy.resolve_auction(election, proposals, votes, memberships, )
-        updated_election_data["winning_proposal_id"] = winning_proposal_id # Add winning proposal to update data
-
-        election_ref.update(updated_election_data) # Update status and winning proposal
-        election.status = ElectionStatus.CLOSED # Update the object
-        election.winning_proposal_id = winning_proposal_id # Update the object
+        logger.info("Election %s transitioned to OPEN.", election.election_id)
 
-        print(f"Election {election.election_id} transitioned to CLOSED and resolved. Winning proposal: {winning_proposal_id}")  # Optional log
+    elif (election.status == ElectionStatus.OPEN and now_utc >= election.end_date) or election.status == ElectionStatus.CLOSING:
+        # Transition to CLOSED and Resolve. A CLOSING election is only picked up if its lease expired.
+        election = await close_and_resolve(election, db, memberships, proposals)
 
-    return election
\ No newline at end of file
+    return election
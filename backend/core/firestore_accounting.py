@@ -0,0 +1,153 @@
+# backend/core/firestore_accounting.py
+"""
+Counts the Firestore operations each request causes.
+
+`InstrumentedClient` wraps the client's RPC layer, so every document get, query, transaction
+and batch commit is counted no matter which reference or helper issued it. Counts are added to
+the `FirestoreStats` of the current request (see `start_firestore_stats`), which the request
+middleware reports in metrics, in the log line and, in debug mode, in response headers.
+
+Reads are counted the way Firestore bills them: one per document returned or looked up, and
+at least one per query even if it returns nothing. Each RPC is also traced as a span.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from google.cloud import firestore
+
+from core.tracing import start_span
+
+
+class FirestoreStats:
+    """Firestore work done while serving one request. Shared with worker threads, hence the lock."""
+
+    __slots__ = ("reads", "writes", "queries", "documents", "seconds", "_lock")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.documents = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, reads: int = 0, writes: int = 0, queries: int = 0, documents: int = 0, seconds: float = 0.0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+            self.queries += queries
+            self.documents += documents
+            self.seconds += seconds
+
+
+_firestore_stats: ContextVar[Optional[FirestoreStats]] = ContextVar("firestore_stats", default=None)
+
+
+def start_firestore_stats() -> FirestoreStats:
+    """
+    Starts counting Firestore operations for the current request. asyncio.to_thread copies
+    the context, so operations in worker threads are counted too.
+    """
+    stats = FirestoreStats()
+    _firestore_stats.set(stats)
+    return stats
+
+
+def record_operations(**counts):
+    """Adds to the current request's counts; also used by the in-memory client."""
+    stats = _firestore_stats.get()
+    if stats is not None:
+        stats.add(**counts)
+
+
+def _has_field(message: Any, field: str) -> bool:
+    return getattr(message, "_pb", message).HasField(field)
+
+
+def _request_field(request: Any, field: str) -> Any:
+    if isinstance(request, dict):
+        return request.get(field)
+    return getattr(request, field, None)
+
+
+class _InstrumentedFirestoreAPI:
+    """
+    Delegates to the generated Firestore API client, counting the RPCs that read or write.
+    """
+
+    def __init__(self, api: Any):
+        self._api = api
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._api, name)
+
+    def batch_get_documents(self, *args, **kwargs) -> Iterator[Any]:
+        started = time.perf_counter()
+        span = start_span("firestore.BatchGetDocuments", {"db.system": "firestore", "db.operation": "BatchGetDocuments"})
+        responses = self._api.batch_get_documents(*args, **kwargs)
+
+        def counted() -> Iterator[Any]:
+            reads = documents = 0
+            try:
+                for response in responses:
+                    if _has_field(response, "found"):
+                        reads += 1
+                        documents += 1
+                    elif _has_field(response, "missing"):
+                        reads += 1
+                    yield response
+            finally:
+                record_operations(reads=reads, documents=documents, seconds=time.perf_counter() - started)
+                span.set_attribute("db.firestore.documents", documents)
+                span.end()
+
+        return counted()
+
+    def run_query(self, *args, **kwargs) -> Iterator[Any]:
+        started = time.perf_counter()
+        span = start_span("firestore.RunQuery", {"db.system": "firestore", "db.operation": "RunQuery"})
+        responses = self._api.run_query(*args, **kwargs)
+
+        def counted() -> Iterator[Any]:
+            documents = 0
+            try:
+                for response in responses:
+                    if _has_field(response, "document"):
+                        documents += 1
+                    yield response
+            finally:
+                record_operations(queries=1, reads=max(documents, 1), documents=documents, seconds=time.perf_counter() - started)
+                span.set_attribute("db.firestore.documents", documents)
+                span.end()
+
+        return counted()
+
+    def commit(self, *args, **kwargs) -> Any:
+        started = time.perf_counter()
+        span = start_span("firestore.Commit", {"db.system": "firestore", "db.operation": "Commit"})
+        try:
+            return self._api.commit(*args, **kwargs)
+        except Exception as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            writes = _request_field(kwargs.get("request") or (args[0] if args else None), "writes") or []
+            record_operations(writes=len(writes), seconds=time.perf_counter() - started)
+            span.set_attribute("db.firestore.writes", len(writes))
+            span.end()
+
+
+class InstrumentedClient(firestore.Client):
+    """
+    A Firestore client whose RPCs are counted per request.
+    """
+
+    @property
+    def _firestore_api(self):
+        api = super()._firestore_api
+        wrapper = self.__dict__.get("_instrumented_api")
+        if wrapper is None or wrapper._api is not api:
+            wrapper = self.__dict__["_instrumented_api"] = _InstrumentedFirestoreAPI(api)
+        return wrapper
@@ -0,0 +1,23 @@
+# backend/core/firestore_compat.py
+"""
+Helpers that work with both the Firestore client and the in-memory one (core/memory_firestore.py).
+"""
+import functools
+
+from google.cloud import firestore
+
+
+def transactional(to_wrap):
+    """
+    Drop-in for `firestore.transactional`: runs the function in the transaction passed as its
+    first argument and retries it on contention, whichever client created the transaction.
+    """
+    wrapped = firestore.transactional(to_wrap)
+
+    @functools.wraps(to_wrap)
+    def run(transaction, *args, **kwargs):
+        if isinstance(transaction, firestore.Transaction):
+            return wrapped(transaction, *args, **kwargs)
+        return transaction.run(to_wrap, *args, **kwargs)
+
+    return run
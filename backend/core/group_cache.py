@@ -0,0 +1,65 @@
+# backend/core/group_cache.py
+"""
+Cached group documents and membership roles (see core/cache.py).
+
+Almost every route checks the caller's membership before anything else, and many read the
+group document, so both are cached. Writers invalidate them:
+- the group document after any write to it, including version bumps (`bump_group_version`
+  does this itself)
+- a member's role when their membership is deleted. Roles never change otherwise, and
+  non-members are not cached, so a new membership needs no invalidation.
+
+Writes that read the group to update it (read-modify-write) read Firestore, not the cache.
+"""
+from functools import partial
+from typing import Optional
+
+from google.cloud import firestore
+
+from core.cache import TieredCache
+from core.config import settings
+
+group_cache = TieredCache("group", maxsize=4096, l1_ttl=settings.CACHE_L1_TTL_SECONDS, l2_ttl=settings.CACHE_L2_TTL_SECONDS)
+role_cache = TieredCache("member_role", maxsize=65536, l1_ttl=settings.CACHE_L1_TTL_SECONDS, l2_ttl=settings.CACHE_L2_TTL_SECONDS)
+
+
+def _membership_id(user_id: str, group_id: str) -> str:
+    return f"{user_id}_{group_id}"
+
+
+def _load_group(db: firestore.Client, group_id: str) -> Optional[dict]:
+    group_doc = db.collection("groups").document(group_id).get()
+    return group_doc.to_dict() if group_doc.exists else None
+
+
+def _load_role(db: firestore.Client, membership_id: str) -> Optional[str]:
+    membership_doc = db.collection("memberships").document(membership_id).get()
+    return membership_doc.to_dict().get("role") if membership_doc.exists else None
+
+
+def get_group_data(db: firestore.Client, group_id: str) -> Optional[dict]:
+    """The stored group document, or None if there is none. Do not modify it."""
+    return group_cache.get_or_load(group_id, partial(_load_group, db, group_id))
+
+
+async def fetch_group_data(db: firestore.Client, group_id: str) -> Optional[dict]:
+    return await group_cache.get_or_load_async(group_id, partial(_load_group, db, group_id))
+
+
+def get_member_role(db: firestore.Client, user_id: str, group_id: str) -> Optional[str]:
+    """The user's role in the group ("admin" or "member"), or None if they are not a member."""
+    membership_id = _membership_id(user_id, group_id)
+    return role_cache.get_or_load(membership_id, partial(_load_role, db, membership_id))
+
+
+async def fetch_member_role(db: firestore.Client, user_id: str, group_id: str) -> Optional[str]:
+    membership_id = _membership_id(user_id, group_id)
+    return await role_cache.get_or_load_async(membership_id, partial(_load_role, db, membership_id))
+
+
+def invalidate_group(group_id: str):
+    group_cache.invalidate(group_id)
+
+
+def invalidate_member_role(user_id: str, group_id: str):
+    role_cache.invalidate(_membership_id(user_id, group_id))
@@ -0,0 +1,84 @@
+# backend/core/http_cache.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+from google.cloud import firestore
+
+from core.group_cache import invalidate_group
+
+# Open/upcoming resources change; let clients keep them but revalidate every time.
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def version_bump() -> dict:
+    """
+    Fields to merge into any write that changes what a read of the document returns.
+    Groups are bumped for changes to their members and elections as well, so one group
+    read is enough to validate the enhanced group view.
+    """
+    return {"version": firestore.Increment(1), "updated_at": datetime.now(timezone.utc)}
+
+
+def bump_group_version(db: firestore.Client, group_id: str):
+    db.collection("groups").document(group_id).update(version_bump())
+    invalidate_group(group_id)
+
+
+def make_etag(kind: str, *parts) -> str:
+    """A weak ETag over `parts`. The kind stays readable, so a route can tell which of its representations a client holds."""
+    digest = hashlib.sha1(":".join(str(part) for part in (kind, *parts)).encode()).hexdigest()[:20]
+    return f'W/"{kind}-{digest}"'
+
+
+def has_etag_of_kind(request: Request, kind: str) -> bool:
+    """Whether If-None-Match carries an ETag made with `make_etag(kind, ...)`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    prefix = f'"{kind}-'
+    return any(candidate.strip().removeprefix("W/").startswith(prefix) for candidate in if_none_match.split(","))
+
+
+def _as_http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluates If-None-Match, falling back to If-Modified-Since only when no ETag was sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        # Weak comparison: W/"x" matches "x"
+        bare = etag.removeprefix("W/")
+        return "*" in candidates or any(candidate.removeprefix("W/") == bare for candidate in candidates)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None, cache_control: str = REVALIDATE_CACHE_CONTROL):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    if last_modified is not None:
+        response.headers["Last-Modified"] = _as_http_date(last_modified)
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified, cache_control)
+    return response
@@ -0,0 +1,705 @@
+# backend/core/memory_firestore.py
+"""
+In-memory stand-in for the Firestore client, for running the API offline (local development,
+load tests, benchmarks). Select it with DATASTORE=memory; see db.py.
+
+It covers the parts of the client this codebase uses, with the same semantics:
+- references: `collection().document().get/set/create/update/delete`, auto IDs
+- queries: `where` (==, !=, <, <=, >, >=, in, not-in, array_contains, array_contains_any),
+  `order_by`, `limit`, `offset`, `select`, `stream`, `get`
+- `get_all`, `batch()`, `transaction()` with `core.firestore_compat.transactional`,
+  `write_option(last_update_time=..., exists=...)` preconditions
+- transforms: `Increment`, `ArrayUnion`, `ArrayRemove`, `DELETE_FIELD`, `SERVER_TIMESTAMP`
+- the same exceptions: NotFound, AlreadyExists, FailedPrecondition, Aborted
+
+Values are stored as Firestore returns them: naive datetimes become UTC, enums become their
+values, and reads hand out copies. Batches and transactions commit atomically. Transactions are
+optimistic: a commit aborts and the function is retried if a document it read has changed since.
+
+Equality and `in` filters use secondary indexes, built for a field the first time a query
+filters on it and kept up to date on every write after that.
+
+Operations are counted in the request's FirestoreStats like the real client's RPCs.
+"""
+import random
+import string
+import threading
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from google.api_core.exceptions import Aborted, AlreadyExists, FailedPrecondition, InvalidArgument, NotFound
+from google.cloud import firestore
+
+from core.firestore_accounting import record_operations
+
+MAX_WRITES_PER_COMMIT = 500
+_AUTO_ID_ALPHABET = string.ascii_letters + string.digits
+_MISSING = object()
+
+
+def _auto_id() -> str:
+    return "".join(random.choices(_AUTO_ID_ALPHABET, k=20))
+
+
+def _encode(value: Any) -> Any:
+    """Normalizes a value the way a round trip through Firestore would."""
+    if isinstance(value, Enum):
+        return _encode(value.value)
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {str(key): _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _copy(value: Any) -> Any:
+    """Copies the mutable containers of a stored value; leaves are immutable."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _get_path(data: Optional[dict], path: str) -> Any:
+    value: Any = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+# Firestore's ordering of values of different types
+def _type_rank(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    rank = _type_rank(value)
+    if rank == 8:
+        return rank, [_sort_key(item) for item in value]
+    if rank in (0, 9):
+        return rank, 0
+    return rank, value
+
+
+def _comparable(left: Any, right: Any) -> bool:
+    return _type_rank(left) == _type_rank(right) and _type_rank(left) not in (0, 9)
+
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    if op == "==":
+        return value is not _MISSING and value == expected
+    if op == "!=":
+        return value is not _MISSING and value is not None and value != expected
+    if op == "in":
+        return value is not _MISSING and value in expected
+    if op == "not-in":
+        return value is not _MISSING and value is not None and value not in expected
+    if op == "array_contains":
+        return isinstance(value, list) and expected in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(item in value for item in expected)
+    if value is _MISSING or not _comparable(value, expected):
+        return False
+    if op == "<":
+        return value < expected
+    if op == "<=":
+        return value <= expected
+    if op == ">":
+        return value > expected
+    if op == ">=":
+        return value >= expected
+    raise InvalidArgument(f"Unsupported filter operator: {op}")
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Document:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data: dict, create_time: datetime, update_time: datetime):
+        self.data = data  # replaced on every write, never mutated in place
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class _FieldIndex:
+    """Maps each hashable value of one field to the IDs of the documents holding it."""
+
+    def __init__(self, field: str, documents: Dict[str, _Document]):
+        self.field = field
+        self.by_value: Dict[Any, Set[str]] = {}
+        self.unhashable: Set[str] = set()
+        for doc_id, document in documents.items():
+            self.add(doc_id, document.data)
+
+    def add(self, doc_id: str, data: dict):
+        value = _get_path(data, self.field)
+        if value is _MISSING:
+            return
+        if _hashable(value):
+            self.by_value.setdefault(value, set()).add(doc_id)
+        else:
+            self.unhashable.add(doc_id)
+
+    def remove(self, doc_id: str, data: dict):
+        value = _get_path(data, self.field)
+        if value is _MISSING:
+            return
+        if _hashable(value):
+            ids = self.by_value.get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.by_value[value]
+        else:
+            self.unhashable.discard(doc_id)
+
+    def candidates(self, values: Iterable[Any]) -> Set[str]:
+        ids = set(self.unhashable)
+        for value in values:
+            ids |= self.by_value.get(value, set())
+        return ids
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections: Dict[str, Dict[str, _Document]] = {}
+        self.indexes: Dict[str, Dict[str, _FieldIndex]] = {}
+        self._last_time = datetime.now(timezone.utc)
+
+    def now(self) -> datetime:
+        """A commit timestamp, strictly increasing so update_time preconditions are exact."""
+        now = datetime.now(timezone.utc)
+        if now <= self._last_time:
+            now = self._last_time + timedelta(microseconds=1)
+        self._last_time = now
+        return now
+
+    def documents(self, collection: str) -> Dict[str, _Document]:
+        return self.collections.setdefault(collection, {})
+
+    def index(self, collection: str, field: str) -> _FieldIndex:
+        indexes = self.indexes.setdefault(collection, {})
+        index = indexes.get(field)
+        if index is None:
+            index = indexes[field] = _FieldIndex(field, self.documents(collection))
+        return index
+
+    def put(self, collection: str, doc_id: str, data: Optional[dict], commit_time: datetime):
+        documents = self.documents(collection)
+        previous = documents.get(doc_id)
+        for index in self.indexes.get(collection, {}).values():
+            if previous is not None:
+                index.remove(doc_id, previous.data)
+            if data is not None:
+                index.add(doc_id, data)
+        if data is None:
+            documents.pop(doc_id, None)
+        else:
+            documents[doc_id] = _Document(data, previous.create_time if previous else commit_time, commit_time)
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[dict], create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = _get_path(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return _copy(value)
+
+
+def _project(data: Optional[dict], field_paths: Optional[Iterable[str]]) -> Optional[dict]:
+    if data is None or field_paths is None:
+        return data
+    projected: dict = {}
+    for path in field_paths:
+        value = _get_path(data, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+
+class _WriteOption:
+    def __init__(self, last_update_time: Optional[datetime] = None, exists: Optional[bool] = None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", collection: str, doc_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._collection)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def _snapshot(self, field_paths: Optional[Iterable[str]] = None) -> MemoryDocumentSnapshot:
+        """Reads the document; the caller holds the store lock."""
+        store = self._client._store
+        document = store.documents(self._collection).get(self.id)
+        read_time = datetime.now(timezone.utc)
+        if document is None:
+            return MemoryDocumentSnapshot(self, None, read_time=read_time)
+        return MemoryDocumentSnapshot(self, _project(document.data, field_paths), document.create_time, document.update_time, read_time)
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> MemoryDocumentSnapshot:
+        if transaction is not None:
+            return transaction._read([self], field_paths)[0]
+        with self._client._store.lock:
+            snapshot = self._snapshot(field_paths)
+        record_operations(reads=1, documents=1 if snapshot.exists else 0)
+        return snapshot
+
+    def _commit_one(self, kind: str, data: Optional[dict] = None, option: Optional[_WriteOption] = None, merge: bool = False):
+        batch = self._client.batch()
+        batch._add(kind, self, data, option, merge)
+        return batch.commit()[0]
+
+    def set(self, document_data: dict, merge: bool = False):
+        return self._commit_one("set", document_data, merge=merge)
+
+    def create(self, document_data: dict):
+        return self._commit_one("create", document_data)
+
+    def update(self, field_updates: dict, option: Optional[_WriteOption] = None):
+        return self._commit_one("update", field_updates, option)
+
+    def delete(self, option: Optional[_WriteOption] = None):
+        return self._commit_one("delete", None, option)
+
+    def collection(self, name: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{name}")
+
+
+class MemoryQuery:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client: "MemoryClient", collection: str, filters: Tuple = (), orders: Tuple = (), limit: Optional[int] = None, offset: int = 0, projection: Optional[Tuple[str, ...]] = None):
+        self._client = client
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._offset = offset
+        self._projection = projection
+
+    def _copy_with(self, **changes) -> "MemoryQuery":
+        state = {
+            "filters": self._filters, "orders": self._orders, "limit": self._limit,
+            "offset": self._offset, "projection": self._projection,
+        }
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection, **state)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:  # a FieldFilter
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy_with(filters=self._filters + ((field_path, op_string, _encode(value)),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        return self._copy_with(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy_with(limit=count)
+
+    def offset(self, num_to_skip: int) -> "MemoryQuery":
+        return self._copy_with(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy_with(projection=tuple(field_paths))
+
+    def _candidates(self) -> Iterable[str]:
+        """Document IDs that may match, narrowed with the first equality or `in` filter."""
+        store = self._client._store
+        for field, op, value in self._filters:
+            if op == "==" and _hashable(value):
+                return store.index(self._collection, field).candidates([value])
+            if op == "in" and all(_hashable(item) for item in value):
+                return store.index(self._collection, field).candidates(value)
+        return list(store.documents(self._collection))
+
+    def _run(self) -> List[MemoryDocumentSnapshot]:
+        """Evaluates the query; the caller holds the store lock."""
+        documents = self._client._store.documents(self._collection)
+        matched = []
+        for doc_id in self._candidates():
+            document = documents.get(doc_id)
+            if document is not None and all(_matches(_get_path(document.data, field), op, value) for field, op, value in self._filters):
+                matched.append((doc_id, document))
+
+        # Like Firestore, ordering on a field excludes documents that lack it
+        for field, _ in self._orders:
+            matched = [(doc_id, document) for doc_id, document in matched if _get_path(document.data, field) is not _MISSING]
+        matched.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            matched.sort(key=lambda item: _sort_key(_get_path(item[1].data, field)), reverse=direction == self.DESCENDING)
+
+        matched = matched[self._offset:]
+        if self._limit is not None:
+            matched = matched[:self._limit]
+        read_time = datetime.now(timezone.utc)
+        return [
+            MemoryDocumentSnapshot(
+                MemoryDocumentReference(self._client, self._collection, doc_id),
+                _project(document.data, self._projection), document.create_time, document.update_time, read_time,
+            )
+            for doc_id, document in matched
+        ]
+
+    def stream(self, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        if transaction is not None:
+            return iter(transaction._query(self))
+        with self._client._store.lock:
+            snapshots = self._run()
+        record_operations(queries=1, reads=max(len(snapshots), 1), documents=len(snapshots))
+        return iter(snapshots)
+
+    def get(self, transaction: Optional["MemoryTransaction"] = None, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: str):
+        super().__init__(client, path)
+
+    @property
+    def id(self) -> str:
+        return self._collection.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection, document_id or _auto_id())
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        write_result = reference.create(document_data)
+        return write_result.update_time, reference
+
+    def list_documents(self) -> List[MemoryDocumentReference]:
+        with self._client._store.lock:
+            return [self.document(doc_id) for doc_id in self._client._store.documents(self._collection)]
+
+
+class _WriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+
+def _apply_transforms(current: Any, value: Any, commit_time: datetime) -> Any:
+    """The stored value after writing `value` (possibly a transform) over `current`."""
+    if value is firestore.SERVER_TIMESTAMP:
+        return commit_time
+    if isinstance(value, firestore.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, firestore.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in _encode(list(value.values)):
+            if item not in result:
+                result.append(item)
+        return result
+    if isinstance(value, firestore.ArrayRemove):
+        removed = _encode(list(value.values))
+        return [item for item in current if item not in removed] if isinstance(current, list) else []
+    return _encode(value)
+
+
+def _set_path(data: dict, parts: List[str], value: Any, commit_time: datetime):
+    target = data
+    for part in parts[:-1]:
+        child = target.get(part)
+        target[part] = child = dict(child) if isinstance(child, dict) else {}
+        target = child
+    if value is firestore.DELETE_FIELD:
+        target.pop(parts[-1], None)
+    else:
+        target[parts[-1]] = _apply_transforms(target.get(parts[-1], _MISSING), value, commit_time)
+
+
+def _merge(existing: dict, updates: dict, commit_time: datetime) -> dict:
+    merged = dict(existing)
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value, commit_time)
+        else:
+            _set_path(merged, [key], value, commit_time)
+    return merged
+
+
+def _strip_transforms(data: dict, commit_time: datetime) -> dict:
+    """A document body for set(): transforms apply to an empty document."""
+    result = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            result[key] = _strip_transforms(value, commit_time)
+        elif value is not firestore.DELETE_FIELD:
+            result[key] = _apply_transforms(_MISSING, value, commit_time)
+    return result
+
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[Tuple[str, MemoryDocumentReference, Optional[dict], Optional[_WriteOption], bool]] = []
+
+    def _add(self, kind: str, reference: MemoryDocumentReference, data: Optional[dict], option: Optional[_WriteOption] = None, merge: bool = False):
+        if len(self._writes) >= MAX_WRITES_PER_COMMIT:
+            raise InvalidArgument(f"A commit can contain at most {MAX_WRITES_PER_COMMIT} writes")
+        self._writes.append((kind, reference, dict(data) if data is not None else None, option, merge))
+
+    def set(self, reference: MemoryDocumentReference, document_data: dict, merge: bool = False):
+        self._add("set", reference, document_data, merge=merge)
+
+    def create(self, reference: MemoryDocumentReference, document_data: dict):
+        self._add("create", reference, document_data)
+
+    def update(self, reference: MemoryDocumentReference, field_updates: dict, option: Optional[_WriteOption] = None):
+        self._add("update", reference, field_updates, option)
+
+    def delete(self, reference: MemoryDocumentReference, option: Optional[_WriteOption] = None):
+        self._add("delete", reference, None, option)
+
+    def _check_preconditions(self, data: Dict[Tuple[str, str], Optional[dict]], update_times: Dict[Tuple[str, str], Optional[datetime]], kind: str, key: Tuple[str, str], option: Optional[_WriteOption]):
+        exists = data.get(key) is not None
+        if kind == "create" and exists:
+            raise AlreadyExists(f"Document already exists: {key[0]}/{key[1]}")
+        if kind == "update" and not exists:
+            raise NotFound(f"No document to update: {key[0]}/{key[1]}")
+        if option is not None:
+            if option.exists is not None and option.exists != exists:
+                raise FailedPrecondition(f"Document {key[0]}/{key[1]} existence precondition failed")
+            if option.last_update_time is not None and update_times.get(key) != option.last_update_time:
+                raise FailedPrecondition(f"Document {key[0]}/{key[1]} was modified since it was read")
+
+    def _commit_locked(self) -> List[_WriteResult]:
+        """Validates every write, then applies them all; the caller holds the store lock."""
+        store = self._client._store
+        commit_time = store.now()
+        # Evolving view of the touched documents, so later writes in the batch see earlier ones
+        data: Dict[Tuple[str, str], Optional[dict]] = {}
+        update_times: Dict[Tuple[str, str], Optional[datetime]] = {}
+        for kind, reference, body, option, merge in self._writes:
+            key = (reference._collection, reference.id)
+            if key not in data:
+                document = store.documents(key[0]).get(key[1])
+                data[key] = document.data if document else None
+                update_times[key] = document.update_time if document else None
+            self._check_preconditions(data, update_times, kind, key, option)
+            if kind == "delete":
+                data[key] = None
+            elif kind == "update":
+                updated = dict(data[key])
+                for field_path, value in body.items():
+                    _set_path(updated, field_path.split("."), value, commit_time)
+                data[key] = updated
+            elif merge and data[key] is not None:
+                data[key] = _merge(data[key], body, commit_time)
+            else:
+                data[key] = _strip_transforms(body, commit_time)
+            update_times[key] = commit_time
+
+        for (collection, doc_id), body in data.items():
+            store.put(collection, doc_id, body, commit_time)
+        return [_WriteResult(commit_time) for _ in self._writes]
+
+    def commit(self) -> List[_WriteResult]:
+        with self._client._store.lock:
+            results = self._commit_locked()
+        record_operations(writes=len(self._writes))
+        self._writes = []
+        return results
+
+    def __enter__(self) -> "MemoryWriteBatch":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Buffers writes and records the version of every document it reads. The commit fails with
+    Aborted if any of them changed in the meantime; `transactional` then retries the function.
+    """
+
+    def __init__(self, client: "MemoryClient", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._read_versions: Dict[Tuple[str, str], Optional[datetime]] = {}
+        self._queries: List[Tuple[MemoryQuery, List[Tuple[str, Optional[datetime]]]]] = []
+
+    def _reset(self):
+        self._writes = []
+        self._read_versions = {}
+        self._queries = []
+
+    def _check_reads_allowed(self):
+        if self._writes:
+            raise ValueError("Attempted read after write in a transaction.")
+
+    def _read(self, references: List[MemoryDocumentReference], field_paths: Optional[Iterable[str]] = None) -> List[MemoryDocumentSnapshot]:
+        self._check_reads_allowed()
+        with self._client._store.lock:
+            snapshots = [reference._snapshot(field_paths) for reference in references]
+        for reference, snapshot in zip(references, snapshots):
+            self._read_versions.setdefault((reference._collection, reference.id), snapshot.update_time)
+        record_operations(reads=len(snapshots), documents=sum(1 for snapshot in snapshots if snapshot.exists))
+        return snapshots
+
+    def _query(self, query: MemoryQuery) -> List[MemoryDocumentSnapshot]:
+        self._check_reads_allowed()
+        with self._client._store.lock:
+            snapshots = query._run()
+        self._queries.append((query, [(snapshot.id, snapshot.update_time) for snapshot in snapshots]))
+        record_operations(queries=1, reads=max(len(snapshots), 1), documents=len(snapshots))
+        return snapshots
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter(self._read([ref_or_query]))
+        return iter(self._query(ref_or_query))
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        return iter(self._read(list(references), kwargs.get("field_paths")))
+
+    def _add(self, kind, reference, data, option=None, merge=False):
+        if self._read_only:
+            raise ValueError("Cannot perform write operation in read-only transaction.")
+        super()._add(kind, reference, data, option, merge)
+
+    def _validate_reads_locked(self):
+        store = self._client._store
+        for (collection, doc_id), update_time in self._read_versions.items():
+            document = store.documents(collection).get(doc_id)
+            if (document.update_time if document else None) != update_time:
+                raise Aborted(f"Document {collection}/{doc_id} changed during the transaction")
+        for query, seen in self._queries:
+            if [(snapshot.id, snapshot.update_time) for snapshot in query._run()] != seen:
+                raise Aborted("Query results changed during the transaction")
+
+    def commit(self) -> List[_WriteResult]:
+        with self._client._store.lock:
+            self._validate_reads_locked()
+            results = self._commit_locked()
+        if results:
+            record_operations(writes=len(results))
+        return results
+
+    def run(self, function, *args, **kwargs):
+        """Runs `function(self, *args, **kwargs)` and commits, retrying on conflicts."""
+        for _ in range(self._max_attempts):
+            self._reset()
+            try:
+                result = function(self, *args, **kwargs)
+            except BaseException:
+                self._reset()
+                raise
+            try:
+                self.commit()
+            except Aborted:
+                continue
+            finally:
+                self._reset()
+            return result
+        raise ValueError(f"Failed to commit transaction in {self._max_attempts} attempts.")
+
+
+class MemoryClient:
+    def __init__(self, project: str = "memory"):
+        self.project = project
+        self._store = _Store()
+
+    def collection(self, *path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, "/".join(path))
+
+    def document(self, *path: str) -> MemoryDocumentReference:
+        collection, doc_id = "/".join(path).rsplit("/", 1)
+        return MemoryDocumentReference(self, collection, doc_id)
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], field_paths: Optional[Iterable[str]] = None, transaction: Optional[MemoryTransaction] = None, **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        references = list(references)
+        if transaction is not None:
+            return iter(transaction._read(references, field_paths))
+        with self._store.lock:
+            snapshots = [reference._snapshot(field_paths) for reference in references]
+        record_operations(reads=len(snapshots), documents=sum(1 for snapshot in snapshots if snapshot.exists))
+        return iter(snapshots)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts, read_only)
+
+    @staticmethod
+    def write_option(last_update_time: Optional[datetime] = None, exists: Optional[bool] = None) -> _WriteOption:
+        if last_update_time is None and exists is None:
+            raise TypeError("write_option() requires last_update_time or exists")
+        return _WriteOption(last_update_time, exists)
+
+    def collections(self) -> List[MemoryCollectionReference]:
+        with self._store.lock:
+            return [self.collection(name) for name in self._store.collections if "/" not in name]
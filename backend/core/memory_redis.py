@@ -0,0 +1,121 @@
+# backend/core/memory_redis.py
+"""
+In-process stand-in for a Redis server, for running the shared cache tier without one (local
+development, load tests). Select it with CACHE_REDIS_URL=memory://; see core/cache.py.
+
+It implements the part of redis-py's client the cache uses, with the same return values:
+`get`, `set(..., ex=...)`, `delete`, `publish`, and `pubsub()` with `subscribe`,
+`get_message(timeout=...)` and `close`. Keys expire lazily when read. Several TieredCache
+instances sharing one MemoryRedis behave like workers sharing one server.
+"""
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+Value = Union[bytes, str]
+
+
+def _as_bytes(value: Value) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+class MemoryPubSub:
+    def __init__(self, server: "MemoryRedis", ignore_subscribe_messages: bool = False):
+        self._server = server
+        self._ignore_subscribe_messages = ignore_subscribe_messages
+        self._messages: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+        self.channels: Set[bytes] = set()
+
+    def subscribe(self, *channels: Value):
+        for channel in channels:
+            channel = _as_bytes(channel)
+            self.channels.add(channel)
+            self._messages.put({"type": "subscribe", "pattern": None, "channel": channel, "data": len(self.channels)})
+        self._server._add_subscriber(self)
+
+    def _deliver(self, channel: bytes, data: bytes):
+        self._messages.put({"type": "message", "pattern": None, "channel": channel, "data": data})
+
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                message = self._messages.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if message["type"] == "message" or not (ignore_subscribe_messages or self._ignore_subscribe_messages):
+                return message
+
+    def close(self):
+        self._server._remove_subscriber(self)
+        self.channels.clear()
+
+
+class MemoryRedis:
+    _shared: Optional["MemoryRedis"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (value, monotonic expiry or None)
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._subscribers: List[MemoryPubSub] = []
+
+    @classmethod
+    def shared(cls) -> "MemoryRedis":
+        """The process-wide server, as if every client connected to the same URL."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._values.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._values[name]
+                return None
+            return value
+
+    def set(self, name: str, value: Value, ex: Optional[float] = None) -> bool:
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._values[name] = (_as_bytes(value), expires_at)
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for name in names if self._values.pop(name, None) is not None)
+
+    def publish(self, channel: Value, message: Value) -> int:
+        channel, message = _as_bytes(channel), _as_bytes(message)
+        with self._lock:
+            receivers = [subscriber for subscriber in self._subscribers if channel in subscriber.channels]
+        for subscriber in receivers:
+            subscriber._deliver(channel, message)
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> MemoryPubSub:
+        return MemoryPubSub(self, ignore_subscribe_messages)
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._values.clear()
+        return True
+
+    def close(self):
+        pass
+
+    def _add_subscriber(self, subscriber: MemoryPubSub):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                self._subscribers.append(subscriber)
+
+    def _remove_subscriber(self, subscriber: MemoryPubSub):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
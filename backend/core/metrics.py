@@ -0,0 +1,230 @@
+# backend/core/metrics.py
+"""
+In-process metrics registry rendered in the Prometheus text format on `/metrics`.
+
+Kept deliberately small: counters, gauges and fixed-bucket histograms keyed by label values,
+each guarded by one lock. Recording is a dict lookup, a bisect and a few additions, cheap
+enough to run on every request.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from core.firestore_accounting import FirestoreStats
+
+# Seconds; roughly the buckets prometheus_client uses by default, plus 30s and 60s for closes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (non-cumulative, last is +Inf), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = self._header()
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Application metrics ---
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route")
+)
+REQUESTS = registry.counter(
+    "http_requests_total", "Requests by route template and status code.", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Requests currently being served."
+)
+DECODE_LATENCY = registry.histogram(
+    "document_decode_duration_seconds", "Time spent decoding stored documents per request.", ("route",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+RESOLUTION_LATENCY = registry.histogram(
+    "election_resolution_duration_seconds", "Time spent resolving elections by strategy and phase.", ("strategy", "phase")
+)
+STARTUP_SECONDS = registry.gauge(
+    "app_startup_seconds", "Time taken by each startup phase: import, lifespan, sdk_init, warmup, services.", ("phase",)
+)
+FIRESTORE_OPERATIONS = registry.counter(
+    "firestore_operations_total", "Firestore reads, writes, queries and documents returned by route.", ("route", "operation")
+)
+FIRESTORE_LATENCY = registry.histogram(
+    "firestore_duration_seconds", "Time spent in Firestore calls per request.", ("route",)
+)
+FIRESTORE_READS_PER_REQUEST = registry.histogram(
+    "firestore_reads_per_request", "Billed Firestore reads per request.", ("route",),
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "admission_queue_depth", "Requests waiting for a datastore slot, by limiter (a route or global).", ("limiter",)
+)
+ADMISSION_IN_USE = registry.gauge(
+    "admission_slots_in_use", "Datastore slots held, by limiter.", ("limiter",)
+)
+ADMISSION_SHED = registry.counter(
+    "admission_shed_total", "Requests rejected with 503 by limiter and reason: queue_full or timeout.", ("limiter", "reason")
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and the tier that answered: l1, l2 or miss.", ("cache", "result")
+)
+SINGLE_FLIGHT_REQUESTS = registry.counter(
+    "single_flight_requests_total",
+    "Coalesced reads by flight: leader ran the computation, shared joined one in flight. Hit rate is shared / total.",
+    ("flight", "result"),
+)
+CACHE_ERRORS = registry.counter(
+    "cache_shared_tier_errors_total", "Failed calls to the shared cache tier, which are treated as misses.", ("operation",)
+)
+
+
+def record_firestore_metrics(stats: FirestoreStats, route: str):
+    for operation in ("reads", "writes", "queries", "documents"):
+        count = getattr(stats, operation)
+        if count:
+            FIRESTORE_OPERATIONS.inc(route, operation, amount=count)
+    FIRESTORE_LATENCY.observe(stats.seconds, route)
+    FIRESTORE_READS_PER_REQUEST.observe(stats.reads, route)
@@ -0,0 +1,174 @@
+# backend/core/profiling.py
+"""
+On-demand request profiling.
+
+A request sent with `X-Profile: <PROFILING_TOKEN>` (or `?profile=<PROFILING_TOKEN>`) runs with a
+sampling profiler. While the request is in flight, a background thread samples the Python
+stacks of the process's threads. That includes the event loop and the worker threads running
+Firestore calls for it. The stacks are kept in the collapsed format flamegraph.pl and
+speedscope read. Samples are also bucketed into Firestore, pydantic, strategy and other code.
+
+The profile ID is returned in `X-Profile-ID`, and the profile is fetched from
+`/debug/profiles/{id}`. Other requests served at the same time show up in the samples as
+well, so profile on a quiet instance.
+
+The middleware is only installed when PROFILING_TOKEN is set, so there is no cost otherwise.
+"""
+import asyncio
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from cachetools import LRUCache
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_FUNCTIONS = {"select", "wait", "_worker", "dequeue", "_monitor", "_wait_once", "poll"}
+
+# Checked from the innermost frame outwards; the first match wins
+_CATEGORIES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("firestore", ("google/cloud/firestore", "google/api_core", "grpc")),
+    ("pydantic", ("pydantic",)),
+    ("strategy", ("strategies" + os.sep, "election_state_manager")),
+)
+
+_profiles: LRUCache = LRUCache(maxsize=50)
+_profiles_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _category(filenames: List[str]) -> str:
+    for filename in reversed(filenames):
+        for category, markers in _CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+    return "other"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_name in _IDLE_FUNCTIONS:
+                    continue
+                labels, filenames = [], []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    filenames.append(frame.f_code.co_filename)
+                    frame = frame.f_back
+                labels.reverse()
+                filenames.reverse()
+                self.stacks[";".join(labels)] += 1
+                self.categories[_category(filenames)] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, object]]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def _store_profile(profile: Dict[str, object], directory: str):
+    with _profiles_lock:
+        _profiles[profile["profile_id"]] = profile
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, str(profile["profile_id"]))
+        with open(base + ".collapsed", "w") as f:
+            f.write(str(profile["collapsed"]))
+        with open(base + ".json", "w") as f:
+            json.dump({key: value for key, value in profile.items() if key != "collapsed"}, f)
+
+
+def is_profiling_authorized(token: Optional[str], expected: str) -> bool:
+    return bool(expected) and token is not None and hmac.compare_digest(token, expected)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry the profiling token. Install only when a token is configured.
+    """
+
+    def __init__(self, app: ASGIApp, token: str, interval: float = 0.005, directory: str = ""):
+        self.app = app
+        self.token = token
+        self.interval = interval
+        self.directory = directory
+
+    def _requested_token(self, scope: Scope) -> Optional[str]:
+        token = Headers(scope=scope).get("x-profile")
+        if token is None and scope.get("query_string"):
+            token = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [None])[0]
+        return token
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not is_profiling_authorized(self._requested_token(scope), self.token):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        profiler = SamplingProfiler(self.interval)
+
+        async def send_with_profile_id(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message["headers"]))
+                headers["X-Profile-ID"] = profile_id
+                message["headers"] = headers.raw
+            await send(message)
+
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration = time.perf_counter() - started
+            # Joining the sampler and writing the profile block, so keep them off the event loop
+            await asyncio.to_thread(self._finish, profiler, profile_id, scope, duration)
+
+    def _finish(self, profiler: SamplingProfiler, profile_id: str, scope: Scope, duration: float):
+        profiler.stop()
+        _store_profile({
+            "profile_id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": profiler.samples,
+            # Approximate time per category: samples x interval (summed over threads)
+            "category_ms": {
+                category: round(count * self.interval * 1000, 1)
+                for category, count in profiler.categories.items()
+            },
+            "collapsed": profiler.collapsed(),
+        }, self.directory)
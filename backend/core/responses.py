@@ -0,0 +1,118 @@
+# backend/core/responses.py
+import gzip
+from typing import Any, Optional
+
+import pydantic_core
+from fastapi import Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # orjson is optional; pydantic-core covers everything it does, just a little slower on plain dicts
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:  # brotli is optional; without it responses are only gzip-compressed
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Headers of the injected `response` parameter that must not leak into the real response
+_BODY_HEADERS = {"content-length", "content-type"}
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes already-validated data straight to JSON bytes.
+    Models (and lists of them) go through pydantic-core's serializer without building dicts first.
+    """
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if isinstance(content, (list, tuple)) or orjson is None:
+        return pydantic_core.to_json(content)
+    return orjson.dumps(content, default=pydantic_core.to_jsonable_python)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> FastJSONResponse:
+    """
+    Returns a response FastAPI passes through as-is, so `response_model` is only used for the
+    OpenAPI schema and the content is not validated and serialized a second time. Only use it
+    for content built from validated models.
+
+    Args:
+        response: The injected `Response` parameter, whose headers (ETag, Cache-Control, ...) are carried over.
+    """
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key not in _BODY_HEADERS}
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+class CompressionMiddleware:
+    """
+    Compresses large single-message responses with brotli (if installed and accepted) or gzip.
+    Streaming responses are passed through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope: Scope) -> Optional[str]:
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and "br" in accept_encoding:
+            return "br"
+        if "gzip" in accept_encoding:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+
+        async def send_compressed(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message  # held back until we know the body
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=list(start["headers"]))
+            start["headers"] = headers.raw
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size or "content-encoding" in headers:
+                await send(start)
+                await send(message)
+                return
+
+            if encoding == "br":
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
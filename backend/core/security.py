@@ -2,21 +2,45 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth, credentials, initialize_app, get_app
 from models import User
+import logging
 import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_firebase_app = None
+_firebase_lock = threading.Lock()
+
+
+def init_firebase():
+    """
+    Initializes the Firebase Admin SDK once, on first use or from the startup background task.
+    Safe to call from any thread.
+    """
+    global _firebase_app
+    if _firebase_app is not None:
+        return _firebase_app
+    with _firebase_lock:
+        if _firebase_app is not None:
+            return _firebase_app
+        # Use environment variable for service account key (recommended for security)
+        # Make sure to define FIREBASE_SERVICE_ACCOUNT_KEY in your environment variables
+        service_account_key = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
+        if not os.path.exists("firebase_service_account.json") and service_account_key:
+            with open("firebase_service_account.json", "w") as f:
+                f.write(service_account_key)
+        try:
+            if os.path.exists("firebase_service_account.json"):
+                cred = credentials.Certificate("firebase_service_account.json")
+                _firebase_app = initialize_app(cred)
+            else:
+                # No service account (emulator and load-test runs): credentials resolve from the environment when first used
+                _firebase_app = initialize_app()
+            logger.info("Firebase Admin SDK initialized")
+        except ValueError:
+            _firebase_app = get_app()
+        return _firebase_app
 
-# --- Initialize Firebase Admin SDK ---
-# Use environment variable for service account key (recommended for security)
-# Make sure to define FIREBASE_SERVICE_ACCOUNT_KEY in your environment variables
-FIREBASE_SERVICE_ACCOUNT_KEY = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY")
-if not os.path.exists("firebase_service_account.json"):
-    with open("firebase_service_account.json", "w") as f:
-        f.write(FIREBASE_SERVICE_ACCOUNT_KEY)
-try:
-    cred = credentials.Certificate("firebase_service_account.json")
-    firebase_admin = initialize_app(cred)
-    print("the fuck??")
-except ValueError:
-    firebase_admin = get_app()
 
 # HTTPBearer scheme for token extraction
 token_bearer = HTTPBearer()
@@ -26,7 +50,7 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(token_b
     Middleware to verify the Firebase ID token and extract user information.
     """
     try:
-        decoded_token = auth.verify_id_token(token.credentials)
+        decoded_token = auth.verify_id_token(token.credentials, app=init_firebase())
         user_data = {
             "uid": decoded_token["uid"],
             "email": decoded_token.get("email"),  # Use .get() to handle cases where email might not be present
@@ -40,7 +64,7 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(token_b
             headers={"WWW-Authenticate": "Bearer"},
         )
     except Exception as e:
-        print(e)  # Log the error for debugging purposes
+        logger.warning("Token verification failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed",
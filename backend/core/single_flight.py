@@ -0,0 +1,60 @@
+# backend/core/single_flight.py
+"""
+Request coalescing: concurrent identical reads share one in-flight computation.
+
+When an election is announced, dozens of members load the same list at the same moment.
+Instead of each request running the same queries, the first one runs them and the others
+await its result.
+
+Keys are built with `request_key(route, scope, **params)`: the route template, the
+authorization scope the result is valid for (e.g. "group-member" when every member sees the
+same thing), and the parameters. Authorization checks specific to the caller still run per
+request, before joining a flight.
+
+The computation runs as its own task, so a leader whose client disconnects does not cancel
+it for the others. It runs in the leader's context: its Firestore reads and spans are
+attributed to the leader's request. Results are shared between callers, treat them as
+read-only. Flights are per worker (per event loop); nothing is cached after a flight lands.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from core.metrics import SINGLE_FLIGHT_REQUESTS
+
+T = TypeVar("T")
+
+
+def request_key(route: str, scope: str, **params: Any) -> Tuple[Hashable, ...]:
+    return (route, scope, tuple(sorted(params.items())))
+
+
+def _consume_exception(task: asyncio.Task):
+    # Nobody may be left to await a failed flight; retrieve the exception so it is not logged as lost
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> T:
+        """Returns `await function()`, sharing the call with concurrent callers using the same key."""
+        task = self._flights.get(key)
+        if task is None:
+            SINGLE_FLIGHT_REQUESTS.inc(self.name, "leader")
+            task = asyncio.ensure_future(function())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            task.add_done_callback(_consume_exception)
+        else:
+            SINGLE_FLIGHT_REQUESTS.inc(self.name, "shared")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def in_flight(self) -> int:
+        return len(self._flights)
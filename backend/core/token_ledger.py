@@ -0,0 +1,241 @@
+# backend/core/token_ledger.py
+"""
+Append-only ledger of token balance changes.
+
+Every change to `memberships.token_balance` is written as an entry in `token_ledger` and applied
+to the balance with `firestore.Increment` in the same transaction or batch, so concurrent
+changes add up instead of overwriting each other. The balance field stays the O(1) read path.
+
+The compactor periodically folds old entries into a per-membership checkpoint in
+`token_balance_snapshots`. Entries are kept (marked compacted) for audits; replaying a balance
+only needs the checkpoint plus the entries written since.
+
+Memberships that existed before the ledger get an "opening" entry holding their balance the
+first time it changes.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+from google.cloud import firestore
+
+from core.config import settings
+from core.firestore_compat import transactional
+
+logger = logging.getLogger(__name__)
+
+LEDGER_COLLECTION = "token_ledger"
+SNAPSHOT_COLLECTION = "token_balance_snapshots"
+
+# Stays under Firestore's 500 writes per transaction with the checkpoint write
+COMPACTION_CHUNK_SIZE = 400
+
+# A balance change: (delta, reason, reference). reference ties the entry to what caused it
+# (a vote id, a regeneration period key, the admin's user id, ...).
+TokenChange = Tuple[int, str, Optional[str]]
+
+
+def record_token_changes(
+    writer: Union[firestore.Transaction, firestore.WriteBatch],
+    db: firestore.Client,
+    membership_ref: firestore.DocumentReference,
+    membership_data: dict,
+    changes: List[TokenChange],
+    fields: Optional[dict] = None,
+    option=None,
+):
+    """
+    Adds ledger entries for `changes` and one membership update applying their sum, to a
+    transaction or batch the caller commits.
+
+    Args:
+        membership_data: The membership as read by the caller, used for the opening entry.
+        fields: Other membership fields to write in the same update.
+        option: A write option (precondition) for the membership update.
+    """
+    now_utc = datetime.now(timezone.utc)
+    entries = [change for change in changes if change[0] != 0]
+    update = dict(fields or {})
+    if not membership_data.get("ledger_opened"):
+        entries.insert(0, (membership_data.get("token_balance", 0), "opening", None))
+        update["ledger_opened"] = True
+
+    for delta, reason, reference in entries:
+        writer.create(db.collection(LEDGER_COLLECTION).document(), {
+            "membership_id": membership_ref.id,
+            "group_id": membership_data.get("group_id"),
+            "delta": delta,
+            "reason": reason,
+            "reference": reference,
+            "created_at": now_utc,
+            "compacted": False,
+        })
+
+    total = sum(delta for delta, _, _ in changes)
+    if total:
+        update["token_balance"] = firestore.Increment(total)
+    if update:
+        writer.update(membership_ref, update, option=option)
+
+
+def opening_ledger_fields(
+    writer: Union[firestore.Transaction, firestore.WriteBatch],
+    db: firestore.Client,
+    membership_id: str,
+    group_id: str,
+    token_balance: int,
+) -> dict:
+    """
+    For new memberships: adds the "initial" entry to `writer` and returns the fields to store
+    on the membership, which must be written with the same writer.
+    """
+    writer.create(db.collection(LEDGER_COLLECTION).document(), {
+        "membership_id": membership_id,
+        "group_id": group_id,
+        "delta": token_balance,
+        "reason": "initial",
+        "reference": None,
+        "created_at": datetime.now(timezone.utc),
+        "compacted": False,
+    })
+    return {"token_balance": token_balance, "ledger_opened": True}
+
+
+def set_token_balance(db: firestore.Client, membership_ref: firestore.DocumentReference, token_balance: int, reason: str, reference: Optional[str] = None, fields: Optional[dict] = None) -> Optional[dict]:
+    """
+    Sets a balance to an absolute value by recording the difference, e.g. for admin overrides.
+
+    Returns:
+        The membership data as it was before the change, or None if it does not exist.
+    """
+    @transactional
+    def apply(transaction):
+        snapshot = membership_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        delta = token_balance - data.get("token_balance", 0)
+        record_token_changes(transaction, db, membership_ref, data, [(delta, reason, reference)], fields)
+        return data
+
+    return apply(db.transaction())
+
+
+def replay_balance(db: firestore.Client, membership_id: str) -> Dict[str, object]:
+    """
+    Recomputes a balance from the ledger: the compaction checkpoint plus every entry since.
+
+    Returns:
+        The checkpoint, the entries replayed on top of it, and the replayed balance.
+    """
+    snapshot_doc = db.collection(SNAPSHOT_COLLECTION).document(membership_id).get()
+    checkpoint = snapshot_doc.to_dict() if snapshot_doc.exists else None
+    entry_docs = (
+        db.collection(LEDGER_COLLECTION)
+        .where("membership_id", "==", membership_id)
+        .where("compacted", "==", False)
+        .stream()
+    )
+    entries = sorted((doc.to_dict() for doc in entry_docs), key=lambda entry: entry["created_at"])
+    balance = (checkpoint or {}).get("balance", 0) + sum(entry["delta"] for entry in entries)
+    return {"checkpoint": checkpoint, "entries": entries, "balance": balance}
+
+
+def _compact_membership(db: firestore.Client, membership_id: str, entry_refs: List[firestore.DocumentReference]) -> int:
+    """
+    Folds entries into the membership's checkpoint in one transaction. Entries are re-read
+    inside it, so one already folded by another compactor is not counted twice.
+    """
+    snapshot_ref = db.collection(SNAPSHOT_COLLECTION).document(membership_id)
+
+    @transactional
+    def fold(transaction):
+        checkpoint_doc = snapshot_ref.get(transaction=transaction)
+        checkpoint = checkpoint_doc.to_dict() if checkpoint_doc.exists else {"balance": 0, "entries_folded": 0, "through": None}
+        entries = [
+            entry for entry in transaction.get_all(entry_refs)
+            if entry.exists and not entry.to_dict().get("compacted")
+        ]
+        if not entries:
+            return 0
+        for entry in entries:
+            transaction.update(entry.reference, {"compacted": True})
+        latest = max(entry.to_dict()["created_at"] for entry in entries)
+        transaction.set(snapshot_ref, {
+            "membership_id": membership_id,
+            "balance": checkpoint["balance"] + sum(entry.to_dict()["delta"] for entry in entries),
+            "entries_folded": checkpoint["entries_folded"] + len(entries),
+            "through": max(latest, checkpoint["through"]) if checkpoint["through"] else latest,
+            "updated_at": datetime.now(timezone.utc),
+        })
+        return len(entries)
+
+    return fold(db.transaction())
+
+
+def compact_ledger(db: firestore.Client, older_than: timedelta, limit: int = 5000) -> int:
+    """
+    Folds up to `limit` uncompacted entries older than `older_than` into checkpoints.
+
+    Returns:
+        The number of entries folded.
+    """
+    cutoff = datetime.now(timezone.utc) - older_than
+    entry_docs = (
+        db.collection(LEDGER_COLLECTION)
+        .where("compacted", "==", False)
+        .where("created_at", "<", cutoff)
+        .limit(limit)
+        .stream()
+    )
+    refs_by_membership: Dict[str, List[firestore.DocumentReference]] = {}
+    for doc in entry_docs:
+        refs_by_membership.setdefault(doc.to_dict()["membership_id"], []).append(doc.reference)
+
+    folded = 0
+    for membership_id, entry_refs in refs_by_membership.items():
+        for start in range(0, len(entry_refs), COMPACTION_CHUNK_SIZE):
+            folded += _compact_membership(db, membership_id, entry_refs[start:start + COMPACTION_CHUNK_SIZE])
+    return folded
+
+
+class TokenLedgerCompactor:
+    """
+    Runs `compact_ledger` in the background every `interval` seconds.
+    """
+
+    def __init__(self, interval: float, older_than: timedelta):
+        self.interval = interval
+        self.older_than = older_than
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, db: firestore.Client):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db), name="token-ledger-compactor")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, db: firestore.Client):
+        while True:
+            try:
+                folded = await asyncio.to_thread(compact_ledger, db, self.older_than)
+                if folded:
+                    logger.info("Compacted %d token ledger entries", folded)
+            except Exception:
+                logger.exception("Token ledger compaction failed")
+            await asyncio.sleep(self.interval)
+
+
+token_ledger_compactor = TokenLedgerCompactor(
+    interval=settings.TOKEN_LEDGER_COMPACTION_INTERVAL_SECONDS,
+    older_than=timedelta(seconds=settings.TOKEN_LEDGER_COMPACT_AFTER_SECONDS),
+)
@@ -1,53 +1,243 @@
 # backend/core/token_manager.py
+"""
+Time-based token regeneration, computed on read.
+
+A membership stores its balance as of `last_token_regeneration`. The balance a member
+actually has is that plus the group's regeneration rate for every full regeneration period
+that started since then, capped at `max_tokens`. Reads compute it without writing; it is
+only stored (materialized) when tokens are spent or an admin overrides the balance.
+
+"election" regeneration is not time-based. When an election closes, `regenerate_group_tokens`
+applies it to every member of the group in batched writes.
+"""
 from datetime import datetime, timedelta, timezone
-from models import Membership, Group
-from db import db
-import pdb
+from typing import List, Optional, Tuple
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud import firestore
+from models import Membership, TokenSettings
+from records import GroupRecord
+from core.group_cache import get_group_data
+from core.token_ledger import record_token_changes
 import logging
 
 logger = logging.getLogger(__name__)
 
+REGENERATION_PERIODS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+# Firestore allows 500 writes per commit. Each membership takes up to three: its opening
+# ledger entry (if the ledger is not open yet), the regeneration entry and the update.
+MAX_WRITES_PER_COMMIT = 500
+WRITES_PER_REGENERATED_MEMBERSHIP = 3
+REGENERATION_BATCH_SIZE = 160
+assert REGENERATION_BATCH_SIZE * WRITES_PER_REGENERATED_MEMBERSHIP <= MAX_WRITES_PER_COMMIT
+REGENERATION_CHUNK_RETRIES = 5
+
+# A Monday at midnight UTC, so periods start on the hour, at midnight UTC and on Mondays
+_PERIOD_EPOCH = datetime(1970, 1, 5, tzinfo=timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
 
-async def regenerate_tokens_for_membership(membership: Membership, group: Group):
+
+def period_start(moment: datetime, regeneration_interval: str) -> Optional[datetime]:
+    """
+    Returns the start of the regeneration period containing `moment`, or None if the
+    interval is not time-based.
     """
-    Regenerates tokens for a given membership based on the group's token settings.
+    period = REGENERATION_PERIODS.get(regeneration_interval)
+    if period is None:
+        return None
+    return _PERIOD_EPOCH + ((_as_utc(moment) - _PERIOD_EPOCH) // period) * period
+
 
-    Args:
-        membership: The Membership object to regenerate tokens for.
-        group: The Group object to get token settings from.
+def load_token_settings(db: firestore.Client, group_id: str) -> Optional[TokenSettings]:
     """
-    token_settings = group.token_settings
-    if not token_settings:
-        logger.warning(f"No token settings found for group {group.group_id}, skipping regeneration for membership {membership.membership_id}")
+    Reads the group's current token settings from Firestore. Payments and vote validation
+    use this: a cached copy could be stale on other workers right after the settings change.
+    """
+    # Project away the group's membership/election ID arrays, they are not needed here
+    group_doc = db.collection("groups").document(group_id).get(field_paths=GroupRecord.FIELDS)
+    if not group_doc.exists:
+        return None
+    return GroupRecord.from_doc(group_doc.to_dict()).token_settings
+
+
+def load_cached_token_settings(db: firestore.Client, group_id: str) -> Optional[TokenSettings]:
+    """Token settings from the cached group, for read-only views such as displayed balances."""
+    group_data = get_group_data(db, group_id)
+    if group_data is None:
+        return None
+    return GroupRecord.from_doc(group_data).token_settings
+
+
+def effective_balance(
+    token_balance: int,
+    last_token_regeneration: Optional[datetime],
+    token_settings: Optional[TokenSettings],
+    now_utc: Optional[datetime] = None,
+) -> Tuple[int, Optional[datetime]]:
+    """
+    Computes a member's balance including the regeneration they are owed.
+
+    Returns:
+        The effective balance and the period start it is regenerated through, which is the
+        value to store as `last_token_regeneration` when materializing it.
+    """
+    if not token_settings or last_token_regeneration is None:
+        return token_balance, last_token_regeneration
+    now_utc = now_utc or datetime.now(timezone.utc)
+    current_period = period_start(now_utc, token_settings.regeneration_interval)
+    if current_period is None:
+        return token_balance, last_token_regeneration
+
+    period = REGENERATION_PERIODS[token_settings.regeneration_interval]
+    periods_elapsed = (current_period - period_start(last_token_regeneration, token_settings.regeneration_interval)) // period
+    if periods_elapsed <= 0:
+        return token_balance, last_token_regeneration
+
+    if token_balance >= token_settings.max_tokens:
+        # Never lower a balance an admin set above the cap
+        return token_balance, current_period
+    tokens_to_add = int(periods_elapsed * token_settings.regeneration_rate)
+    return min(token_balance + tokens_to_add, token_settings.max_tokens), current_period
+
+
+def with_effective_balance(membership: Membership, token_settings: Optional[TokenSettings], now_utc: Optional[datetime] = None) -> Membership:
+    """
+    Returns a copy of the membership showing its effective balance. Nothing is written.
+    """
+    token_balance, regenerated_through = effective_balance(
+        membership.token_balance, membership.last_token_regeneration, token_settings, now_utc
+    )
+    if token_balance == membership.token_balance and regenerated_through == membership.last_token_regeneration:
         return membership
+    return membership.model_copy(update={
+        "token_balance": token_balance,
+        "last_token_regeneration": regenerated_through,
+    })
 
-    now_utc = datetime.now(timezone.utc)
-    tokens_to_add = 0
-
-    if token_settings.regeneration_interval == "daily":
-        # Daily Regeneration
-        if membership.last_token_regeneration.date() < now_utc.date():
-            tokens_to_add = token_settings.regeneration_rate
-
-
-    elif token_settings.regeneration_interval == "election":
-        # Election Regeneration - handled after election closure, not here
-        tokens_to_add = token_settings.regeneration_rate
-
-    else:
-        logger.warning(f"Invalid regeneration interval: {token_settings.regeneration_interval} for group {group.group_id}")
-        return membership # Invalid interval
-
-    if tokens_to_add > 0:
-        new_balance = min(membership.token_balance + tokens_to_add, token_settings.max_tokens)
-        membership_ref = db.collection("memberships").document(membership.membership_id)
-        membership_ref.update({
-            "token_balance": new_balance,
-            "last_token_regeneration": now_utc,
-        })
-        membership.token_balance = new_balance # Update in-memory object
-        membership.last_token_regeneration = now_utc # Update in-memory object
-        logger.info(
-            f"Regenerated {tokens_to_add} tokens for membership {membership.membership_id}, new balance: {new_balance}"
+
+def materialized_balance_update(membership_data: dict, token_settings: Optional[TokenSettings], now_utc: Optional[datetime] = None) -> dict:
+    """
+    Fields to write when storing a membership's effective balance, e.g. before tokens are
+    deducted from it in the same write.
+    """
+    token_balance, regenerated_through = effective_balance(
+        membership_data.get("token_balance", 0), membership_data.get("last_token_regeneration"), token_settings, now_utc
+    )
+    update = {"token_balance": token_balance}
+    if regenerated_through is not None:
+        update["last_token_regeneration"] = regenerated_through
+    return update
+
+
+def election_period_key(election_id: str) -> str:
+    return f"election:{election_id}"
+
+
+def _regenerated_updates(membership_data: List[dict], token_settings: TokenSettings, now_utc: datetime) -> List[dict]:
+    """
+    Computes the new balances for a chunk of memberships in one pass.
+    """
+    if token_settings.regeneration_interval == "election":
+        cap = token_settings.max_tokens
+        tokens_to_add = int(token_settings.regeneration_rate)
+        balances = [data.get("token_balance", 0) for data in membership_data]
+        new_balances = [balance if balance >= cap else min(balance + tokens_to_add, cap) for balance in balances]
+        return [
+            {"token_balance": new_balance, "last_token_regeneration": now_utc}
+            for new_balance in new_balances
+        ]
+    # Stamp the run time rather than the period start: the same for the current interval, and
+    # nothing is owed retroactively if the interval changes afterwards
+    return [
+        {**materialized_balance_update(data, token_settings, now_utc), "last_token_regeneration": now_utc}
+        for data in membership_data
+    ]
+
+
+def _commit_regeneration_chunk(db: firestore.Client, snapshots: list, token_settings: TokenSettings, period_key: str, now_utc: datetime) -> int:
+    """
+    Writes one chunk in a single batch. Every write is conditional on the membership not having
+    changed since it was read, so the cap is applied to the balance actually stored: after a
+    concurrent payment the batch fails as a whole and the chunk is re-read and recomputed.
+
+    Returns:
+        The number of tokens added.
+    """
+    for _ in range(REGENERATION_CHUNK_RETRIES):
+        pending = [snapshot for snapshot in snapshots if snapshot.exists and snapshot.to_dict().get("last_regeneration_key") != period_key]
+        if not pending:
+            return 0
+        membership_data = [snapshot.to_dict() for snapshot in pending]
+        updates = _regenerated_updates(membership_data, token_settings, now_utc)
+        deltas = [update.pop("token_balance") - data.get("token_balance", 0) for data, update in zip(membership_data, updates)]
+        writes = sum(
+            1 + (delta != 0) + (not data.get("ledger_opened"))
+            for data, delta in zip(membership_data, deltas)
         )
-    return membership
\ No newline at end of file
+        if writes > MAX_WRITES_PER_COMMIT:
+            raise ValueError(f"Regeneration chunk needs {writes} writes, more than the {MAX_WRITES_PER_COMMIT} a commit allows")
+        batch = db.batch()
+        for snapshot, data, update, delta in zip(pending, membership_data, updates, deltas):
+            record_token_changes(
+                batch, db, snapshot.reference, data, [(delta, "regeneration", period_key)],
+                {**update, "last_regeneration_key": period_key},
+                option=db.write_option(last_update_time=snapshot.update_time),
+            )
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            snapshots = list(db.get_all([snapshot.reference for snapshot in snapshots]))
+            continue
+        return sum(deltas)
+    raise RuntimeError(f"Token regeneration for period {period_key} kept conflicting with concurrent writes")
+
+
+def regenerate_group_tokens(db: firestore.Client, group_id: str, token_settings: Optional[TokenSettings], period_key: str, now_utc: Optional[datetime] = None) -> int:
+    """
+    Applies one period's regeneration to every member of a group.
+
+    For "election" groups this adds the regeneration rate once per closed election (pass
+    `election_period_key(election_id)`). For time-based groups it materializes the effective
+    balances, e.g. before the group's token settings change.
+
+    Idempotent and resumable per period: each membership records the last period key applied
+    to it and is skipped if it already has this one, and a completed run is recorded in
+    `regeneration_jobs`, so re-running after a crash only finishes what is left.
+
+    Returns:
+        The total number of tokens added.
+    """
+    if not token_settings:
+        return 0
+    now_utc = now_utc or datetime.now(timezone.utc)
+    job_ref = db.collection("regeneration_jobs").document(f"{group_id}_{period_key}")
+    job_doc = job_ref.get()
+    if job_doc.exists and job_doc.to_dict().get("completed"):
+        return job_doc.to_dict().get("tokens_regenerated", 0)
+
+    membership_docs = list(db.collection("memberships").where("group_id", "==", group_id).stream())
+    tokens_regenerated = job_doc.to_dict().get("tokens_regenerated", 0) if job_doc.exists else 0
+    for start in range(0, len(membership_docs), REGENERATION_BATCH_SIZE):
+        chunk = membership_docs[start:start + REGENERATION_BATCH_SIZE]
+        tokens_regenerated += _commit_regeneration_chunk(db, chunk, token_settings, period_key, now_utc)
+        # Progress, so a resumed run reports the full total
+        job_ref.set({"group_id": group_id, "period_key": period_key, "completed": False, "tokens_regenerated": tokens_regenerated})
+
+    job_ref.set({
+        "group_id": group_id,
+        "period_key": period_key,
+        "completed": True,
+        "tokens_regenerated": tokens_regenerated,
+        "completed_at": now_utc,
+    })
+    logger.info("Regenerated %s tokens for %s members of group %s (%s)", tokens_regenerated, len(membership_docs), group_id, period_key)
+    return tokens_regenerated
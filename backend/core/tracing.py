@@ -0,0 +1,209 @@
+# backend/core/tracing.py
+"""
+Lightweight tracing using the OpenTelemetry data model.
+
+Spans have 128-bit trace IDs and 64-bit span IDs. Incoming W3C `traceparent` headers are
+honoured, and finished spans are exported as JSON lines whose field names follow OTLP/JSON
+(`traceId`, `spanId`, `parentSpanId`, `startTimeUnixNano`, ...), so a collector's filelog
+receiver or any OTLP tool can ingest them. Export runs on a background thread.
+
+The current span lives in a context variable. asyncio.to_thread copies the context, so
+Firestore calls made from worker threads become children of the span that started them.
+
+With TRACING_EXPORTER empty, `span()` yields a shared no-op span without touching the context.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "attributes", "start_ns", "end_ns", "status", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes) if attributes else {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "UNSET"
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def record_exception(self, exc: BaseException):
+        self.status = "ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                tracer.export(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+
+class _NoopSpan:
+    sampled = False
+    trace_id = ""
+    span_id = ""
+    traceparent = ""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def update_name(self, name: str):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """Returns (trace_id, parent_span_id, sampled) from a W3C traceparent header, if valid."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._output: Optional[TextIO] = None
+
+    def configure(self, exporter: str, sample_rate: float = 1.0, path: str = ""):
+        """
+        Args:
+            exporter: "console" (stdout), "file" (JSON lines appended to `path`) or "" to disable.
+        """
+        if self.enabled or not exporter:
+            return
+        if exporter == "console":
+            self._output = sys.stdout
+        elif exporter == "file":
+            self._output = open(path or "spans.jsonl", "a", buffering=1)
+        else:
+            raise ValueError(f"Unknown tracing exporter: {exporter}")
+        self.sample_rate = sample_rate
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    def shutdown(self):
+        """Flushes pending spans; call on shutdown."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put(None)
+        self._thread.join()
+        if self._output is not sys.stdout:
+            self._output.close()
+
+    def export(self, span: Span):
+        if self._queue is not None:
+            self._queue.put(span)
+
+    def _export_loop(self):
+        while True:
+            span = self._queue.get()
+            if span is None:
+                return
+            try:
+                self._output.write(json.dumps(span.to_otlp(), default=str) + "\n")
+            except Exception:
+                logger.exception("Failed to export span %s", span.name)
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None):
+        """
+        Starts a span as a child of the current one without making it current; the caller
+        must `end()` it. Use for work that does not nest, like streaming RPC results.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = _current_span.get()
+        if parent is not None:
+            return Span(name, parent.trace_id, parent.span_id, parent.sampled, attributes)
+        remote = parse_traceparent(traceparent)
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            return Span(name, trace_id, parent_id, sampled, attributes)
+        return Span(name, os.urandom(16).hex(), None, random.random() < self.sample_rate, attributes)
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None) -> Iterator[Any]:
+        """
+        Runs the block in a new span that is current for its duration, recording exceptions.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        current = self.start_span(name, attributes, traceparent)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as exc:
+            current.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            current.end()
+
+
+tracer = Tracer()
+span = tracer.span
+start_span = tracer.start_span
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
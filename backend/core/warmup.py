@@ -0,0 +1,134 @@
+# backend/core/warmup.py
+"""
+Startup warm-up and readiness.
+
+Right after a deploy, the first requests on a worker would otherwise pay for the gRPC channel
+setup, fetching Firebase's token signing keys, pydantic's lazily built validators and empty
+caches. `warm_up` does that work before the worker reports ready on /readyz:
+
+1. Firestore: a one-document query opens the channel and fetches credentials. This step is
+   retried until it succeeds; a worker that cannot reach Firestore is not ready.
+2. Auth keys: the Firebase ID token verifier's public keys are fetched into its HTTP cache.
+3. Recent data: elections that ended within WARMUP_LOOKBACK_SECONDS (or are still open) and
+   their groups are loaded and decoded, the groups are put in the group cache and the results
+   snapshots of the closed ones in the results cache.
+
+Steps 2 and 3 are best effort: a failure is logged and the worker still becomes ready.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from core.config import settings
+from core.decoding import decode_many
+from core.election_results import get_results_snapshot
+from core.group_cache import group_cache
+from models import Election, ElectionStatus, Group
+
+logger = logging.getLogger(__name__)
+
+# Firebase's public keys for ID tokens, as used by firebase_admin's verifier
+ID_TOKEN_CERT_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class Readiness:
+    """Whether this worker has finished warming up, and how long each step took."""
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "steps_seconds": {name: round(seconds, 3) for name, seconds in self.steps.items()},
+            "failed": self.failed,
+        }
+
+
+readiness = Readiness()
+
+
+def open_firestore_channel(db):
+    list(db.collection("groups").limit(1).stream())
+
+
+def prefetch_auth_keys(firebase_app):
+    """
+    Fetches the ID token signing keys through the verifier's own cached HTTP session, so the
+    first token verification does not. firebase_admin has no public hook for this, hence the
+    attribute lookups; if they ever disappear the step is skipped.
+    """
+    from firebase_admin import auth
+    from google.oauth2 import id_token
+
+    verifier = getattr(auth._get_client(firebase_app), "_token_verifier", None)
+    request = getattr(verifier, "request", None)
+    if request is None:
+        logger.info("Firebase token verifier has no cached request; skipping key prefetch")
+        return
+    cert_url = getattr(getattr(verifier, "id_token_verifier", None), "cert_url", ID_TOKEN_CERT_URL)
+    id_token._fetch_certs(request, cert_url)
+
+
+def preload_recent_data(db, now_utc: Optional[datetime] = None) -> int:
+    """
+    Loads recently active elections and their groups, decoding them (which builds the
+    validators and converters they need) and caching the groups and closed elections' results.
+
+    Returns:
+        The number of elections loaded.
+    """
+    now_utc = now_utc or datetime.now(timezone.utc)
+    cutoff = now_utc - timedelta(seconds=settings.WARMUP_LOOKBACK_SECONDS)
+    election_docs = list(
+        db.collection("elections")
+        .where("end_date", ">=", cutoff)
+        .limit(settings.WARMUP_MAX_ELECTIONS)
+        .stream()
+    )
+    elections = decode_many(Election, (doc.to_dict() for doc in election_docs))
+
+    group_ids = list({election.group_id for election in elections})
+    group_refs = [db.collection("groups").document(group_id) for group_id in group_ids]
+    group_docs = [doc for doc in db.get_all(group_refs) if doc.exists] if group_refs else []
+    decode_many(Group, (doc.to_dict() for doc in group_docs))
+    for doc in group_docs:
+        group_cache.set(doc.id, doc.to_dict())
+
+    for election in elections:
+        if election.status == ElectionStatus.CLOSED:
+            get_results_snapshot(db, election.election_id)
+    return len(elections)
+
+
+async def _step(name: str, function, *args, required: bool = False):
+    while True:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(function, *args)
+        except Exception as error:
+            if required:
+                logger.warning("Warm-up step %s failed, retrying: %s", name, error)
+                await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+                continue
+            logger.warning("Warm-up step %s failed: %s", name, error)
+            readiness.failed[name] = str(error)
+            return None
+        readiness.steps[name] = time.perf_counter() - started
+        return result
+
+
+async def warm_up(db, firebase_app):
+    """Runs the warm-up steps; /readyz reports ready once they are done."""
+    started = time.perf_counter()
+    await _step("firestore_channel", open_firestore_channel, db, required=True)
+    await asyncio.gather(
+        _step("auth_keys", prefetch_auth_keys, firebase_app),
+        _step("recent_data", preload_recent_data, db),
+    )
+    readiness.ready = True
+    logger.info("Warm-up finished in %.3f seconds", time.perf_counter() - started, extra={"warmup": readiness.to_dict()})
@@ -1,16 +1,55 @@
 import os 
-from google.cloud import firestore
+import threading
 from google.auth.exceptions import DefaultCredentialsError
+from core.firestore_accounting import InstrumentedClient
 
-# Check if the environment variable is set
-if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS"):
-    raise RuntimeError(
-        "Environment variable `GOOGLE_APPLICATION_CREDENTIALS` is not set. "
-        "Please set it to the path of your Google Cloud service account key file.\n\n"
-        "Example:\n"
-        'export GOOGLE_APPLICATION_CREDENTIALS="path/to/service-account-key.json"\n\n'
-        "See https://cloud.google.com/docs/authentication/external/set-up-adc for details."
-    )
-
-# Initialize Firestore client
-db = firestore.Client()
\ No newline at end of file
+from core.config import settings
+
+
+class LazyClient:
+    """
+    Stands in for the datastore client and creates it on first use, once, from any thread.
+    Importing the app stays cheap; the lifespan calls `init_db` in the background so the
+    first request does not pay for it either.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+if settings.DATASTORE == "memory":
+    # Offline: local development, load tests and benchmarks (see core/memory_firestore.py)
+    from core.memory_firestore import MemoryClient
+    db = LazyClient(MemoryClient)
+else:
+    # Check if the environment variable is set (the Firestore emulator needs no credentials)
+    if not os.getenv("GOOGLE_APPLICATION_CREDENTIALS") and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise RuntimeError(
+            "Environment variable `GOOGLE_APPLICATION_CREDENTIALS` is not set. "
+            "Please set it to the path of your Google Cloud service account key file.\n\n"
+            "Example:\n"
+            'export GOOGLE_APPLICATION_CREDENTIALS="path/to/service-account-key.json"\n\n'
+            "See https://cloud.google.com/docs/authentication/external/set-up-adc for details."
+        )
+
+    # Firestore client, created on first use. Its RPCs are counted per request (see core/firestore_accounting.py).
+    db = LazyClient(InstrumentedClient)
+
+
+def init_db():
+    """Creates the client now if it does not exist yet; blocking, run it in a thread."""
+    return db._resolve()
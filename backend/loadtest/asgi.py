@@ -0,0 +1,108 @@
+# backend/loadtest/asgi.py
+"""
+Minimal in-process HTTP client for an ASGI app, so the load test needs no server and no extra
+dependencies. Measured latency is the app's own: routing, middleware, handlers and datastore
+calls, but no socket or HTTP parsing.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+@dataclass
+class Result:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    seconds: float
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ASGIClient:
+    def __init__(self, app, default_headers: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.default_headers = default_headers or {}
+
+    async def request(self, method: str, url: str, json_body: Any = None, headers: Optional[Dict[str, str]] = None) -> Result:
+        parts = urlsplit(url)
+        body = json.dumps(json_body, default=str).encode() if json_body is not None else b""
+        request_headers = {**self.default_headers, **(headers or {})}
+        if json_body is not None:
+            request_headers["content-type"] = "application/json"
+        request_headers["content-length"] = str(len(body))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": [(key.lower().encode(), value.encode()) for key, value in request_headers.items()],
+            "client": ("127.0.0.1", 50000),
+            "server": ("loadtest", 80),
+        }
+
+        body_sent = False
+        response_complete = asyncio.Event()
+        status = 500
+        response_headers: Dict[str, str] = {}
+        chunks = []
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Like a real connection, only report a disconnect once the response is done
+            await response_complete.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", []):
+                    name = key.decode().lower()
+                    response_headers[name] = f"{response_headers[name]}, {value.decode()}" if name in response_headers else value.decode()
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_complete.set()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_complete.set()
+        return Result(status, response_headers, b"".join(chunks), time.perf_counter() - started)
+
+    async def get(self, url: str, **kwargs) -> Result:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, json_body: Any = None, **kwargs) -> Result:
+        return await self.request("POST", url, json_body, **kwargs)
+
+    async def put(self, url: str, json_body: Any = None, **kwargs) -> Result:
+        return await self.request("PUT", url, json_body, **kwargs)
+
+
+def bearer(uid: str) -> Dict[str, str]:
+    """Headers for a load-test user; the stub verifier takes the token as the uid."""
+    return {"authorization": f"Bearer {uid}"}
+
+
+def firestore_counts(result: Result) -> Tuple[int, int, int]:
+    """(reads, writes, queries) from the X-Firestore-* debug headers."""
+    return (
+        int(result.headers.get("x-firestore-reads", 0)),
+        int(result.headers.get("x-firestore-writes", 0)),
+        int(result.headers.get("x-firestore-queries", 0)),
+    )
@@ -0,0 +1,295 @@
+# backend/loadtest/run.py
+"""
+End-to-end load test: boots the FastAPI app in-process against the Firestore emulator or the
+in-memory datastore, with a stub auth verifier, and drives realistic traffic through the full
+middleware stack.
+
+Scenarios (run in order on freshly seeded groups):
+  seed       users sign up, admins create groups, add members and open an election
+  dashboard  every user loads /groups/my-groups-enhanced, several rounds
+  vote_burst every member votes shortly before the deadline, half of them change their vote
+  mass_close every admin closes their election early at the same moment
+
+Each endpoint reports throughput, latency percentiles and Firestore reads/writes/queries per
+request (from the X-Firestore-* debug headers). Results can be stored as a baseline and later
+runs compared against it.
+
+Run from backend/, in memory or with the emulator running (`gcloud emulators firestore start`):
+    DATASTORE=memory python -m loadtest.run --groups 20 --members 25
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m loadtest.run --groups 20 --members 25
+    ... --save-baseline            store this run as loadtest/baseline.json
+    ... --fail-on-regression 0.2   exit 1 if p95, throughput or reads/request are >20% worse
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Dict, Iterable, List, Optional
+
+from loadtest.asgi import ASGIClient, Result, bearer, firestore_counts
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Compared against the baseline: metric -> True if higher is worse
+COMPARED_METRICS = {"p95_ms": True, "throughput_rps": False, "reads_per_request": True}
+
+
+def load_app():
+    """
+    Imports the app configured for load testing. Settings are read at import time, so the
+    environment is prepared first.
+    """
+    if os.getenv("DATASTORE") != "memory" and not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("Set DATASTORE=memory or FIRESTORE_EMULATOR_HOST; refusing to load test a live Firestore project.")
+    os.environ.setdefault("FIRESTORE_DEBUG_HEADERS", "true")
+    os.environ.setdefault("TOKEN_LEDGER_COMPACTION_ENABLED", "false")
+    os.environ.setdefault("WARMUP_ENABLED", "false")
+    os.environ.setdefault("CACHE_REDIS_URL", "memory://")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from fastapi import Depends
+    from fastapi.security import HTTPAuthorizationCredentials
+
+    from core.security import get_current_user, token_bearer
+    from main import app
+    from models import User
+
+    async def stub_current_user(token: HTTPAuthorizationCredentials = Depends(token_bearer)) -> User:
+        # The bearer token is the uid; nothing is verified
+        return User(uid=token.credentials, email=f"{token.credentials}@example.com")
+
+    app.dependency_overrides[get_current_user] = stub_current_user
+    return app
+
+
+class Recorder:
+    """Collects per-endpoint samples for one scenario."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[Result]] = defaultdict(list)
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def record(self, endpoint: str, result: Result) -> Result:
+        self.samples[endpoint].append(result)
+        return result
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(recorder: Recorder) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for endpoint, results in recorder.samples.items():
+        latencies = sorted(result.seconds * 1000 for result in results)
+        counts = [firestore_counts(result) for result in results]
+        summary[endpoint] = {
+            "requests": len(results),
+            "errors": sum(1 for result in results if result.status >= 400),
+            "throughput_rps": round(len(results) / recorder.seconds, 2) if recorder.seconds else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "reads_per_request": round(sum(count[0] for count in counts) / len(results), 2),
+            "writes_per_request": round(sum(count[1] for count in counts) / len(results), 2),
+            "queries_per_request": round(sum(count[2] for count in counts) / len(results), 2),
+        }
+    return summary
+
+
+async def gather_limited(concurrency: int, coroutines: Iterable[Awaitable]) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(coroutine) for coroutine in coroutines))
+
+
+class World:
+    """The seeded groups: admin uid, member uids, election and proposal IDs per group."""
+
+    def __init__(self):
+        self.groups: List[dict] = []
+
+    @property
+    def users(self) -> List[str]:
+        return [uid for group in self.groups for uid in [group["admin"], *group["members"]]]
+
+
+async def seed(client: ASGIClient, recorder: Recorder, groups: int, members: int, concurrency: int) -> World:
+    run_id = uuid.uuid4().hex[:6]
+    world = World()
+
+    async def seed_group(index: int):
+        admin = f"lt{run_id}-admin-{index}"
+        member_uids = [f"lt{run_id}-user-{index}-{member}" for member in range(members)]
+        for uid in [admin, *member_uids]:
+            recorder.record("POST /users/create_if_new", await client.post("/users/create_if_new", headers=bearer(uid)))
+
+        created = recorder.record("POST /groups/", await client.post("/groups/", {"name": f"Load test {index}"}, headers=bearer(admin)))
+        group_id = created.json()["group_id"]
+        for uid in member_uids:
+            recorder.record("POST /memberships/groups/{group_id}/members", await client.post(
+                f"/memberships/groups/{group_id}/members", {"email_to_add": f"{uid}@example.com"}, headers=bearer(admin),
+            ))
+
+        now = datetime.now(timezone.utc)
+        election = recorder.record("POST /groups/{group_id}/elections/", await client.post(f"/groups/{group_id}/elections/", {
+            "name": f"Load test election {index}",
+            "start_date": now + timedelta(hours=1),
+            "end_date": now + timedelta(hours=2),
+            "payment_options": "allpay",
+            "price_options": "1,1",
+            "resolution_strategy": "most_votes",
+            "proposals": [{"title": f"Proposal {number}"} for number in range(3)],
+        }, headers=bearer(admin))).json()
+        recorder.record("PUT /groups/{group_id}/elections/{election_id}/start-now", await client.put(
+            f"/groups/{group_id}/elections/{election['election_id']}/start-now", headers=bearer(admin),
+        ))
+        world.groups.append({
+            "group_id": group_id,
+            "admin": admin,
+            "members": member_uids,
+            "election_id": election["election_id"],
+            "proposals": election["proposals"],
+        })
+
+    await gather_limited(concurrency, (seed_group(index) for index in range(groups)))
+    return world
+
+
+async def dashboard(client: ASGIClient, recorder: Recorder, world: World, rounds: int, concurrency: int):
+    async def load(uid: str):
+        recorder.record("GET /groups/my-groups-enhanced", await client.get("/groups/my-groups-enhanced", headers=bearer(uid)))
+
+    await gather_limited(concurrency, (load(uid) for _ in range(rounds) for uid in world.users))
+
+
+async def vote_burst(client: ASGIClient, recorder: Recorder, world: World, concurrency: int):
+    async def vote(group: dict, uid: str, change: bool):
+        url = f"/groups/{group['group_id']}/elections/{group['election_id']}/votes"
+        for _ in range(2 if change else 1):
+            recorder.record("POST /groups/{group_id}/elections/{election_id}/votes", await client.post(
+                url, {"proposal_id": random.choice(group["proposals"]), "tokens_used": random.randint(1, 3)}, headers=bearer(uid),
+            ))
+
+    await gather_limited(concurrency, (
+        vote(group, uid, random.random() < 0.5) for group in world.groups for uid in group["members"]
+    ))
+
+
+async def mass_close(client: ASGIClient, recorder: Recorder, world: World, concurrency: int):
+    async def close(group: dict):
+        recorder.record("PUT /groups/{group_id}/elections/{election_id}/close-early", await client.put(
+            f"/groups/{group['group_id']}/elections/{group['election_id']}/close-early", headers=bearer(group["admin"]),
+        ))
+
+    await gather_limited(concurrency, (close(group) for group in world.groups))
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Returns a description of every compared metric that is worse than the baseline by more than `threshold`."""
+    regressions = []
+    for scenario, endpoints in results.items():
+        for endpoint, metrics in endpoints.items():
+            base = baseline.get(scenario, {}).get(endpoint)
+            if not base:
+                continue
+            for metric, higher_is_worse in COMPARED_METRICS.items():
+                old, new = base.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (change if higher_is_worse else -change) > threshold:
+                    regressions.append(f"{scenario} {endpoint} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def print_report(results: dict, baseline: Optional[dict]):
+    for scenario, endpoints in results.items():
+        print(f"\n== {scenario}")
+        for endpoint, metrics in endpoints.items():
+            print(f"  {endpoint}")
+            base = (baseline or {}).get(scenario, {}).get(endpoint, {})
+            for metric, value in metrics.items():
+                delta = ""
+                if base.get(metric):
+                    delta = f"  ({(value - base[metric]) / base[metric]:+.0%} vs baseline)"
+                print(f"    {metric:<20} {value:>10}{delta}")
+
+
+async def run(args) -> dict:
+    app = load_app()
+    client = ASGIClient(app)
+    results = {}
+    async with app.router.lifespan_context(app):
+        recorder = Recorder()
+        world = await seed(client, recorder, args.groups, args.members, args.concurrency)
+        recorder.finish()
+        results["seed"] = summarize(recorder)
+
+        for name, scenario in (
+            ("dashboard", lambda recorder: dashboard(client, recorder, world, args.rounds, args.concurrency)),
+            ("vote_burst", lambda recorder: vote_burst(client, recorder, world, args.concurrency)),
+            ("mass_close", lambda recorder: mass_close(client, recorder, world, args.concurrency)),
+        ):
+            recorder = Recorder()
+            await scenario(recorder)
+            recorder.finish()
+            results[name] = summarize(recorder)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--members", type=int, default=20, help="members per group, besides the admin")
+    parser.add_argument("--rounds", type=int, default=3, help="dashboard loads per user")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    parser.add_argument("--fail-on-regression", type=float, metavar="FRACTION",
+                        help="exit 1 if a compared metric is worse than the baseline by more than FRACTION")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    if baseline and args.fail_on_regression is not None:
+        regressions = compare(results, baseline, args.fail_on_regression)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,90 @@
-from fastapi import FastAPI, Depends, Request
 import time
+
+# Import time is measured from here and reported with the startup timings
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, status
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from core.config import settings
-from core.security import get_current_user
+from core.logging_setup import configure_logging, new_request_id, request_id_var, shutdown_logging
+from core.tracing import tracer
+
+# Before the imports below, so records logged while they initialize go through the queue too
+configure_logging(settings.LOG_LEVEL, settings.LOG_JSON)
+tracer.configure(settings.TRACING_EXPORTER, settings.TRACING_SAMPLE_RATE, settings.TRACING_FILE)
+
+from core.security import get_current_user, init_firebase
 from models import User
 from api.routes import users, groups, memberships, elections, enhanced_groups, enhanced_group_details  # Import your routers
+from core.election_scheduler import election_scheduler
+from core.token_ledger import token_ledger_compactor
+from db import db, init_db
+from core.responses import CompressionMiddleware
+from core.decoding import start_decode_stats
+from core.firestore_accounting import start_firestore_stats
+from core.profiling import ProfilingMiddleware, get_profile, is_profiling_authorized
+from core.warmup import readiness, warm_up
+from core.cache import close_shared_tier
+from core.metrics import DECODE_LATENCY, REQUEST_LATENCY, REQUESTS, REQUESTS_IN_FLIGHT, STARTUP_SECONDS, record_firestore_metrics, registry
 import logging
 
-app = FastAPI(title=settings.PROJECT_NAME)
-logger = logging.getLogger("uvicorn")  # or configure your own logger
+logger = logging.getLogger(__name__)
+
+
+def init_sdk_clients():
+    """Creates the Firestore client and initializes Firebase Admin; blocking."""
+    init_db()
+    init_firebase()
+
+
+async def start_services():
+    """
+    Runs in the background after startup: SDK initialization, warm-up (see /readyz) and the
+    services that query Firestore as they start. Requests served before it finishes create
+    the clients on demand.
+    """
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(init_sdk_clients)
+        STARTUP_SECONDS.set(time.perf_counter() - started, "sdk_init")
+        if settings.WARMUP_ENABLED:
+            await warm_up(db, init_firebase())
+            STARTUP_SECONDS.set(time.perf_counter() - started, "warmup")
+        else:
+            readiness.ready = True
+        # Election transitions run in the background instead of on the GET that happens to see them
+        if settings.ELECTION_SCHEDULER_ENABLED:
+            await election_scheduler.start()
+        if settings.TOKEN_LEDGER_COMPACTION_ENABLED:
+            await token_ledger_compactor.start(db)
+    except Exception:
+        logger.exception("Background startup failed")
+        raise
+    STARTUP_SECONDS.set(time.perf_counter() - started, "services")
+    logger.info("SDK clients and background services ready after %.3f seconds", time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here blocks, so the server accepts requests (/healthz) immediately
+    started = time.perf_counter()
+    startup_task = asyncio.create_task(start_services(), name="startup")
+    STARTUP_SECONDS.set(time.perf_counter() - started, "lifespan")
+    yield
+    if not startup_task.done():
+        startup_task.cancel()
+    await asyncio.gather(startup_task, return_exceptions=True)
+    await token_ledger_compactor.stop()
+    await election_scheduler.stop()
+    await asyncio.to_thread(close_shared_tier)
+    tracer.shutdown()
+    shutdown_logging()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -19,6 +95,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON payloads (brotli if installed, otherwise gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES)
+
+# Admin-only request profiling; not installed at all unless a token is configured
+if settings.PROFILING_TOKEN:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=settings.PROFILING_TOKEN,
+        interval=settings.PROFILING_INTERVAL_SECONDS,
+        directory=settings.PROFILING_DIR,
+    )
+
 # Include routers
 enhanced_groups.include_enhanced_groups_routes(app) # ADD this line - call the function to include routes
 enhanced_group_details.include_enhanced_group_details_routes(app)
@@ -28,14 +116,72 @@ app.include_router(memberships.router, prefix="/memberships", tags=["memberships
 app.include_router(elections.router, prefix="/groups/{group_id}/elections", tags=["elections"])
 # ... other protected routes
 
+STARTUP_SECONDS.set(time.perf_counter() - _import_started, "import")
+logger.info("Application imported in %.3f seconds", time.perf_counter() - _import_started)
+
 # --- Placeholder Endpoint (Not Protected) ---
 
+def route_template(request: Request) -> str:
+    """The matched route's path template, so metrics are not labelled per group/election ID."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
 @app.middleware("http")
 async def log_request_latency(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    duration = time.time() - start_time
-    logger.info(f"{request.method} {request.url} completed in {duration:.2f} seconds")
+    start_time = time.perf_counter()
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    request_id_var.set(request_id)
+    decode_stats = start_decode_stats()
+    firestore_stats = start_firestore_stats()
+    REQUESTS_IN_FLIGHT.inc()
+    with tracer.span(f"HTTP {request.method}", {"http.method": request.method}, request.headers.get("traceparent")) as request_span:
+        try:
+            response = await call_next(request)
+        except Exception:
+            REQUESTS.inc(request.method, route_template(request), "500")
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            request_span.update_name(f"HTTP {request.method} {route_template(request)}")
+        request_span.set_attribute("http.route", route_template(request))
+        request_span.set_attribute("http.status_code", response.status_code)
+    duration = time.perf_counter() - start_time
+    route = route_template(request)
+    REQUEST_LATENCY.observe(duration, request.method, route)
+    REQUESTS.inc(request.method, route, str(response.status_code))
+    DECODE_LATENCY.observe(decode_stats.seconds, route)
+    record_firestore_metrics(firestore_stats, route)
+    response.headers.append("Server-Timing", f"decode;dur={decode_stats.seconds * 1000:.1f};desc=\"{decode_stats.documents} docs\"")
+    response.headers.append("Server-Timing", f"firestore;dur={firestore_stats.seconds * 1000:.1f};desc=\"{firestore_stats.reads} reads\"")
+    if settings.FIRESTORE_DEBUG_HEADERS:
+        response.headers["X-Firestore-Reads"] = str(firestore_stats.reads)
+        response.headers["X-Firestore-Writes"] = str(firestore_stats.writes)
+        response.headers["X-Firestore-Queries"] = str(firestore_stats.queries)
+        response.headers["X-Firestore-Documents"] = str(firestore_stats.documents)
+    response.headers["X-Request-ID"] = request_id
+    logger.info(
+        "%s %s completed in %.3f seconds", request.method, request.url.path, duration,
+        extra={
+            "sample_rate": settings.LOG_REQUEST_SAMPLE_RATE,
+            "trace_id": request_span.trace_id or None,
+            "route": route,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "decode_ms": round(decode_stats.seconds * 1000, 1),
+            "decoded_documents": decode_stats.documents,
+            "firestore_ms": round(firestore_stats.seconds * 1000, 1),
+            "firestore_reads": firestore_stats.reads,
+            "firestore_writes": firestore_stats.writes,
+            "firestore_queries": firestore_stats.queries,
+            "firestore_documents": firestore_stats.documents,
+        },
+    )
+    if firestore_stats.reads > settings.FIRESTORE_READ_BUDGET:
+        logger.warning(
+            "%s %s used %d Firestore reads, over the budget of %d",
+            request.method, route, firestore_stats.reads, settings.FIRESTORE_READ_BUDGET,
+        )
     return response
 
 
@@ -48,6 +194,41 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/readyz")
+async def readiness_check():
+    """
+    Readiness for the load balancer: 503 until this worker has warmed up its Firestore
+    channel, auth keys and caches (see core/warmup.py), 200 after.
+    """
+    return JSONResponse(readiness.to_dict(), status_code=status.HTTP_200_OK if readiness.ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """
+    Prometheus scrape endpoint. Requires `Authorization: Bearer <METRICS_TOKEN>` when a token is configured.
+    """
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+async def profile(profile_id: str, request: Request, format: str = "collapsed"):
+    """
+    A stored request profile: `format=collapsed` for flamegraph.pl/speedscope, `format=json`
+    for the summary with time per category. Requires the profiling token in X-Profile.
+    """
+    if not is_profiling_authorized(request.headers.get("x-profile"), settings.PROFILING_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid profiling token")
+    stored = get_profile(profile_id)
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "json":
+        return {key: value for key, value in stored.items() if key != "collapsed"}
+    return Response(stored["collapsed"], media_type="text/plain; charset=utf-8")
+
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -36,7 +36,7 @@ class PriceOptionConfig(BaseModel):
 # Represents settings for group
 class TokenSettings(BaseModel):
     regeneration_rate: float
-    regeneration_interval: str
+    regeneration_interval: str  # "hourly" | "daily" | "weekly" (computed on read) or "election" (applied on close)
     max_tokens: int
     initial_tokens: int
 
@@ -50,6 +50,7 @@ class Group(BaseModel):
     memberships: List[str] = []  # Relationship: Group has many Memberships -- stored as ID
     elections: List[str] = []  # Relationship: Group has many Elections -- stored as ID
     token_settings: Optional[TokenSettings] = None
+    version: int = 0  # Bumped on any change to the group, its members or its elections (used for ETags)
 
 # --- Membership Model ---
 class Membership(BaseModel):
@@ -64,10 +65,13 @@ class Membership(BaseModel):
     group: Optional[Group] = None  # Relationship: Membership belongs to Group
     votes: List["Vote"] = []  # Relationship: Membership has many Votes
     last_token_regeneration: datetime = Field(default_factory=datetime.now)
+    last_regeneration_key: Optional[str] = Field(default=None, exclude=True)  # Last group regeneration period applied (see token_manager); not serialized
+    ledger_opened: bool = Field(default=False, exclude=True)  # Whether token_ledger holds this membership's full balance history; not serialized
 
 # --- Election Model ---
 class ElectionStatus(str, Enum):
     OPEN = "open"
+    CLOSING = "closing"  # a worker holds the close lease and is resolving the election
     CLOSED = "closed"
     UPCOMING = "upcoming"
 
@@ -86,6 +90,12 @@ class Election(BaseModel):
     winning_proposal_id: Optional[str] = None # Relationship: Election has one winning Proposal (replace with reference if needed)
     group: Optional[Group] = None  # Relationship: Election belongs to Group
     proposals: List[str] = []  # Relationship: Election has many Proposals
+    # Close bookkeeping: stored, never serialized in API responses
+    close_lease_owner: Optional[str] = Field(default=None, exclude=True)  # Worker currently closing the election
+    close_lease_expires_at: Optional[datetime] = Field(default=None, exclude=True)
+    resolution_fingerprint: Optional[str] = Field(default=None, exclude=True)  # Hash of the inputs the winner was resolved from
+    version: int = 0  # Bumped on any change to the election or its proposals (used for ETags)
+    updated_at: Optional[datetime] = None
 
 # --- Proposal Model ---
 class Proposal(BaseModel):
@@ -111,6 +121,46 @@ class Vote(BaseModel):
     proposal: Optional[Proposal] = None  # Relationship: Vote belongs to Proposal
     amount_paid: int = 0
     tokens_regenerated: int = 0
+    payment_applied: bool = Field(default=False, exclude=True)  # Set atomically with the balance change so closing is idempotent; not serialized
+
+
+# --- Election Results Snapshot ---
+# Written once when an election closes and never updated afterwards.
+RESULTS_SCHEMA_VERSION = 1
+
+class VoteResult(BaseModel):
+    vote_id: str
+    membership_id: str
+    tokens_used: int
+    amount_paid: int = 0
+    tokens_regenerated: int = 0
+
+class ProposalResult(BaseModel):
+    proposal_id: str
+    title: str
+    proposer_id: str
+    created_at: datetime
+    total_tokens: int
+    votes: List[VoteResult] = []
+
+class ElectionResults(BaseModel):
+    schema_version: int = RESULTS_SCHEMA_VERSION
+    election_id: str
+    election_name: str
+    group_id: str
+    start_date: datetime
+    end_date: datetime
+    payment_options: str
+    price_options: str
+    resolution_strategy: ResolutionStrategyType
+    winning_proposal_id: Optional[str] = None
+    price_multiplier: Optional[float] = None  # None when nobody won and no payments were applied
+    resolution_fingerprint: Optional[str] = None
+    closed_at: datetime
+    tokens_cast: int
+    tokens_paid: int
+    tokens_regenerated: int
+    proposals: List[ProposalResult]
 
 
 class MemberWithDetails(BaseModel):
@@ -0,0 +1,179 @@
+# backend/records.py
+"""
+Slim storage records for hot paths (bulk vote/membership loads, auction resolution).
+
+The API models in models.py carry optional relationship fields (`user`, `group`, `votes`,
+`membership`, `proposal`, ...) that are never populated but are still walked by every
+validation and `model_dump()`. These records hold only what is stored, use `__slots__`,
+and expose the same attribute names, so strategies and helpers work with either.
+Convert explicitly with `from_doc` / `to_doc` / `to_api` at the edges.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from models import Group, Membership, Proposal, TokenSettings, Vote
+
+# Stored bookkeeping marked `exclude=True` on the API model
+_VOTE_RESPONSE_EXCLUDED = frozenset(name for name, field in Vote.model_fields.items() if field.exclude)
+
+
+@dataclass(slots=True)
+class VoteRecord:
+    vote_id: str
+    election_id: str
+    membership_id: str
+    proposal_id: str
+    tokens_used: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    amount_paid: int = 0
+    tokens_regenerated: int = 0
+    payment_applied: bool = False
+
+    @classmethod
+    def from_doc(cls, data: Dict[str, Any]) -> "VoteRecord":
+        return cls(
+            vote_id=data["vote_id"],
+            election_id=data["election_id"],
+            membership_id=data["membership_id"],
+            proposal_id=data["proposal_id"],
+            tokens_used=data["tokens_used"],
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at"),
+            amount_paid=data.get("amount_paid", 0),
+            tokens_regenerated=data.get("tokens_regenerated", 0),
+            payment_applied=data.get("payment_applied", False),
+        )
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "vote_id": self.vote_id,
+            "election_id": self.election_id,
+            "membership_id": self.membership_id,
+            "proposal_id": self.proposal_id,
+            "tokens_used": self.tokens_used,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "amount_paid": self.amount_paid,
+            "tokens_regenerated": self.tokens_regenerated,
+            "payment_applied": self.payment_applied,
+        }
+
+    def to_api(self) -> Vote:
+        return Vote.model_validate({key: value for key, value in self.to_doc().items() if value is not None})
+
+    def to_response(self) -> Dict[str, Any]:
+        """`to_doc` without the fields the API model keeps out of responses."""
+        return {key: value for key, value in self.to_doc().items() if key not in _VOTE_RESPONSE_EXCLUDED}
+
+
+@dataclass(slots=True)
+class MembershipRecord:
+    membership_id: str
+    user_id: str
+    group_id: str
+    token_balance: int
+    role: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    last_token_regeneration: Optional[datetime] = None
+
+    @classmethod
+    def from_doc(cls, data: Dict[str, Any]) -> "MembershipRecord":
+        return cls(
+            membership_id=data["membership_id"],
+            user_id=data["user_id"],
+            group_id=data["group_id"],
+            token_balance=data["token_balance"],
+            role=data["role"],
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at"),
+            last_token_regeneration=data.get("last_token_regeneration"),
+        )
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "membership_id": self.membership_id,
+            "user_id": self.user_id,
+            "group_id": self.group_id,
+            "token_balance": self.token_balance,
+            "role": self.role,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "last_token_regeneration": self.last_token_regeneration,
+        }
+
+    def to_api(self) -> Membership:
+        return Membership.model_validate({key: value for key, value in self.to_doc().items() if value is not None})
+
+
+@dataclass(slots=True)
+class ProposalRecord:
+    proposal_id: str
+    election_id: str
+    proposer_id: str
+    title: str
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_doc(cls, data: Dict[str, Any]) -> "ProposalRecord":
+        return cls(
+            proposal_id=data["proposal_id"],
+            election_id=data["election_id"],
+            proposer_id=data["proposer_id"],
+            title=data["title"],
+            created_at=data.get("created_at"),
+        )
+
+    def to_doc(self) -> Dict[str, Any]:
+        return {
+            "proposal_id": self.proposal_id,
+            "election_id": self.election_id,
+            "proposer_id": self.proposer_id,
+            "title": self.title,
+            "created_at": self.created_at,
+        }
+
+    def to_api(self) -> Proposal:
+        return Proposal.model_validate({key: value for key, value in self.to_doc().items() if value is not None})
+
+
+@dataclass(slots=True)
+class GroupRecord:
+    """A group without its ever-growing `memberships` / `elections` ID arrays."""
+    group_id: str
+    name: str
+    description: str
+    token_settings: Optional[TokenSettings] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    version: int = 0
+
+    # Fields to project when reading a group document for a GroupRecord
+    FIELDS = ("group_id", "name", "description", "token_settings", "created_at", "updated_at", "version")
+
+    @classmethod
+    def from_doc(cls, data: Dict[str, Any]) -> "GroupRecord":
+        token_settings = data.get("token_settings")
+        return cls(
+            group_id=data["group_id"],
+            name=data.get("name", ""),
+            description=data.get("description", ""),
+            token_settings=TokenSettings.model_validate(token_settings) if token_settings else None,
+            created_at=data.get("created_at"),
+            updated_at=data.get("updated_at"),
+            version=data.get("version", 0),
+        )
+
+    def to_api(self) -> Group:
+        """Note: the ID arrays are not part of the record and come back empty."""
+        return Group.model_validate({
+            "group_id": self.group_id,
+            "name": self.name,
+            "description": self.description,
+            "token_settings": self.token_settings,
+            "version": self.version,
+            **({"created_at": self.created_at} if self.created_at else {}),
+            **({"updated_at": self.updated_at} if self.updated_at else {}),
+        })
@@ -1,8 +1,13 @@
 from abc import ABC, abstractmethod
-from models import Election, Proposal, Vote, Membership, Group
-from typing import List, Dict, Optional, Tuple
+from models import Election, Proposal, Vote, Membership, TokenSettings
+from core.token_manager import load_token_settings, materialized_balance_update
+from core.token_ledger import record_token_changes
+from core.firestore_compat import transactional
+from core.tracing import span
+from typing import Callable, List, Dict, Optional, Tuple
 from google.cloud import firestore
 from db import db
+import asyncio
 import math
 import random
 
@@ -45,6 +50,28 @@ class AuctionResolutionStrategy(ABC):
         self.payment_strategy = payment_strategy
 
     @abstractmethod
+    async def select_winner(self, election: Election, proposals: List[Proposal], votes: List[Vote]) -> Optional[str]:
+        """
+        Picks the winning proposal ID without touching any balances.
+
+        Returns:
+            The winning proposal ID, or None if no proposal won.
+        """
+        pass
+
+    async def settle(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership], winning_proposal_id: str) -> float:
+        """
+        Prices the auction and applies payments for an already selected winner.
+
+        Returns:
+            The price multiplier the payments were applied with.
+        """
+        with span("strategy.price", {"strategy": type(self.price_strategy).__name__, "votes": len(votes)}):
+            price = await self.price_strategy.calculate_price(election, proposals, votes)
+        with span("strategy.payment", {"strategy": type(self.payment_strategy).__name__, "votes": len(votes)}):
+            await self.payment_strategy.apply_payment(election, proposals, votes, memberships, price, winning_proposal_id)
+        return price
+
     async def resolve_auction(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership]) -> Optional[str]:
         """
         Resolves an election and returns a winning proposal ID.
@@ -58,7 +85,10 @@ class AuctionResolutionStrategy(ABC):
         Returns:
             The winning proposal ID, or None if no proposal won.
         """
-        pass
+        winning_proposal_id = await self.select_winner(election, proposals, votes)
+        if winning_proposal_id is not None:
+            await self.settle(election, proposals, votes, memberships, winning_proposal_id)
+        return winning_proposal_id
 
 class MostVotesWinsStrategy(AuctionResolutionStrategy):
     """
@@ -66,7 +96,8 @@ class MostVotesWinsStrategy(AuctionResolutionStrategy):
     """
     def __init__(self, price_strategy: PriceCalculationStrategy, payment_strategy: PaymentApplicationStrategy):
         super().__init__(price_strategy, payment_strategy)
-    async def resolve_auction(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership]) -> Optional[str]:
+
+    async def select_winner(self, election: Election, proposals: List[Proposal], votes: List[Vote]) -> Optional[str]:
         votes_by_proposal = {}
         for proposal in proposals:
             total_votes = sum([vote.tokens_used for vote in votes if vote.proposal_id == proposal.proposal_id])
@@ -74,21 +105,18 @@ class MostVotesWinsStrategy(AuctionResolutionStrategy):
 
         if not votes_by_proposal:
             return None  # No votes, no winner
-        winning_proposal_id = max(votes_by_proposal, key=votes_by_proposal.get)
-        price = await self.price_strategy.calculate_price(election, proposals, votes)
-        await self.payment_strategy.apply_payment(election,proposals, votes, memberships, price, winning_proposal_id)
-        return winning_proposal_id
+        return max(votes_by_proposal, key=votes_by_proposal.get)
 
 class LotteryWinsStrategy(AuctionResolutionStrategy):
     """
     Strategy where each token is a lottery ticket. Proposal win chance is proportional to tokens spent on it.
     """
     def __init__(self, payment_strategy: PaymentApplicationStrategy):
-        super().__init__(price_strategy=FirstPriceCalculationStrategy(), payment_strategy=payment_strategy) # Price strategy not really used in lottery
+        super().__init__(price_strategy=FirstPriceCalculationStrategy(), payment_strategy=payment_strategy) # price must be 1, second price doesn't make any sense
 
-    async def resolve_auction(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership]) -> Optional[str]:
+    async def select_winner(self, election: Election, proposals: List[Proposal], votes: List[Vote]) -> Optional[str]:
         """
-        Resolves the election by lottery, weighting chances by tokens used for each proposal.
+        Draws the winner by lottery, weighting chances by tokens used for each proposal.
         """
         lottery_tickets = []
         total_tokens_casted = 0
@@ -104,11 +132,7 @@ class LotteryWinsStrategy(AuctionResolutionStrategy):
             return None  # No votes cast in the election, no winner
 
         # Randomly select a winning proposal ID from the lottery tickets
-        winning_proposal_id = random.choice(lottery_tickets)
-
-        price = 1 # must be 1, second price doesn't make any sense
-        await self.payment_strategy.apply_payment(election, proposals, votes, memberships, price, winning_proposal_id) # Apply payments
-        return winning_proposal_id
+        return random.choice(lottery_tickets)
 
 
 class FirstPriceCalculationStrategy(PriceCalculationStrategy):
@@ -142,87 +166,95 @@ class SecondPriceCalculationStrategy(PriceCalculationStrategy):
         else:
             return float(sorted_votes[1] / sorted_votes[0]) if sorted_votes[0] else 1# multiplier
 
+def _commit_vote_payment(vote: Vote, membership_id: str, token_settings: Optional[TokenSettings], compute: Callable[[int], Tuple[int, int, int]]) -> bool:
+    """
+    Applies one vote's payment exactly once.
+
+    Runs in a transaction that re-reads the vote and the membership: a vote whose payment was
+    already applied (by this or an earlier, abandoned close) is skipped, and the new balance is
+    computed from the stored balance rather than a possibly stale in-memory copy. Time-based
+    regeneration the member is owed is materialized first, so it is not lost.
+
+    Args:
+        token_settings: The group's token settings, used for time-based regeneration.
+        compute: Maps the current balance to (new_balance, amount_paid, tokens_regenerated).
+
+    Returns:
+        True if the payment was applied by this call.
+    """
+    vote_ref = db.collection("votes").document(vote.vote_id)
+    membership_ref = db.collection("memberships").document(membership_id)
+
+    @transactional
+    def apply(transaction):
+        vote_snapshot = vote_ref.get(transaction=transaction)
+        if not vote_snapshot.exists or vote_snapshot.to_dict().get("payment_applied"):
+            return False
+        membership_snapshot = membership_ref.get(transaction=transaction)
+        if not membership_snapshot.exists:
+            return False
+        membership_data = membership_snapshot.to_dict()
+        balance_update = materialized_balance_update(membership_data, token_settings)
+        materialized_balance = balance_update.pop("token_balance")
+        new_balance, amount_paid, tokens_regenerated = compute(materialized_balance)
+        record_token_changes(transaction, db, membership_ref, membership_data, [
+            (materialized_balance - membership_data.get("token_balance", 0), "regeneration", None),
+            (new_balance - materialized_balance, "payment", vote.vote_id),
+        ], balance_update)
+        transaction.update(vote_ref, {
+            "amount_paid": amount_paid,
+            "tokens_regenerated": tokens_regenerated,
+            "payment_applied": True,
+        })
+        return True
+
+    with span("strategy.payment.vote", {"vote_id": vote.vote_id}):
+        return apply(db.transaction())
+
+
 class AllPayPaymentStrategy(PaymentApplicationStrategy):
     """
     A strategy where all users pay based on their own bids.
     """
     async def apply_payment(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership], price_for_tokens: float, winning_proposal_id: Optional[str]):
+        # Election regeneration is applied to the whole group once the election closes
+        token_settings = await asyncio.to_thread(load_token_settings, db, election.group_id)
+
         # Process payment for all votes
         for vote in votes:
             membership = memberships.get(vote.membership_id)
-            if membership:
-                membership_ref = db.collection("memberships").document(membership.membership_id)
-                new_balance = membership.token_balance - vote.tokens_used # don't multiply because it doesn't make sense
+            if not membership:
+                continue
 
+            def compute(balance: int, vote: Vote = vote) -> Tuple[int, int, int]:
+                new_balance = balance - vote.tokens_used # don't multiply because it doesn't make sense
                 if new_balance < 0:
                     # should log this somewhere so that admins know that something has gone wrong
                     new_balance = 0
+                return new_balance, vote.tokens_used, 0
 
-                group_id = membership.group_id
-                group_ref = db.collection("groups").document(group_id)
-                group_doc = group_ref.get()
-
-                if group_doc.exists:
-                    group = Group.model_validate(group_doc.to_dict())
-
-                token_settings = group.token_settings
-
-                if token_settings.regeneration_interval == "election":
-        # Election Regeneration - handled after election closure, not here
-                    tokens_to_add = token_settings.regeneration_rate
-                pre_regeneration = new_balance
-                new_balance = min(new_balance + tokens_to_add, token_settings.max_tokens)
-                tokens_regenerated = new_balance - pre_regeneration
-                amount_paid = vote.tokens_used
-
-                membership_ref.update({"token_balance": new_balance})
-
-                # Update vote document with extra details
-                vote_ref = db.collection("votes").document(vote.vote_id)
-                vote_ref.update({
-                    "amount_paid": amount_paid,
-                    "tokens_regenerated": tokens_regenerated,
-                })
+            await asyncio.to_thread(_commit_vote_payment, vote, membership.membership_id, token_settings, compute)
 
 class WinnersPayPaymentStrategy(PaymentApplicationStrategy):
     """
     A strategy where only winning users pay based on their own bids.
     """
     async def apply_payment(self, election: Election, proposals: List[Proposal], votes: List[Vote], memberships: Dict[str, Membership], price_for_tokens: float, winning_proposal_id: Optional[str]):
+        # Election regeneration is applied to the whole group once the election closes
+        token_settings = await asyncio.to_thread(load_token_settings, db, election.group_id)
 
         # Process payment for all votes
         for vote in votes:
             membership = memberships.get(vote.membership_id)
-            if membership and vote.proposal_id == winning_proposal_id:
-                membership_ref = db.collection("memberships").document(membership.membership_id)
-                amount_paid =  math.floor(vote.tokens_used * price_for_tokens) # use price to discount if only winners pay
-                new_balance = membership.token_balance - amount_paid
-
-                group_id = membership.group_id
-                group_ref = db.collection("groups").document(group_id)
-                group_doc = group_ref.get()
-
-                if group_doc.exists:
-                    group = Group.model_validate(group_doc.to_dict())
-
-                token_settings = group.token_settings
-
-                if token_settings.regeneration_interval == "election":
-        # Election Regeneration - handled after election closure, not here
-                    tokens_to_add = token_settings.regeneration_rate
-
-                before_regeneration = new_balance
-                new_balance = min(new_balance + tokens_to_add, token_settings.max_tokens)
-                tokens_regenerated = new_balance - before_regeneration
+            if not membership or vote.proposal_id != winning_proposal_id:
+                continue
+            amount_paid = math.floor(vote.tokens_used * price_for_tokens) # use price to discount if only winners pay
 
+            def compute(balance: int, amount_paid: int = amount_paid) -> Tuple[int, int, int]:
+                new_balance = balance - amount_paid
                 if new_balance < 0:
                     # should log this somewhere so that admins know that something has gone wrong
                     new_balance = 0
-                membership_ref.update({"token_balance": new_balance})
-
-                # Update vote document with extra details
-                vote_ref = db.collection("votes").document(vote.vote_id)
-                vote_ref.update({
-                    "amount_paid": amount_paid,
-                    "tokens_regenerated": tokens_regenerated,
-                })
\ No newline at end of file
+                return new_balance, amount_paid, 0
+
+            await asyncio.to_thread(_commit_vote_payment, vote, membership.membership_id, token_settings, compute)
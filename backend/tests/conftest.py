@@ -0,0 +1,9 @@
+# backend/tests/conftest.py
+"""
+Tests run against the in-memory datastore (core/memory_firestore.py). Settings are read at
+import time, so the environment is set before any test module imports the app's modules.
+"""
+import os
+
+os.environ["DATASTORE"] = "memory"
+os.environ.setdefault("CACHE_REDIS_URL", "")
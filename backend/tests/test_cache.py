@@ -0,0 +1,175 @@
+# backend/tests/test_cache.py
+"""
+TieredCache against the in-process Redis stand-in (core/memory_redis.py).
+
+Run from backend/: python -m pytest tests
+"""
+import itertools
+import time
+
+import pytest
+
+from core import cache
+from core.cache import SharedTier, TieredCache
+from core.memory_redis import MemoryRedis
+
+_names = itertools.count()
+
+
+def unique_name() -> str:
+    return f"test{next(_names)}"
+
+
+def wait_until(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """A fresh stand-in server as this process's shared tier."""
+    server = MemoryRedis()
+    tier = SharedTier(server)
+    monkeypatch.setattr(cache, "_shared", tier)
+    monkeypatch.setattr(cache, "_shared_resolved", True)
+    # The subscriber clears the L1s when it connects; let it do so before the test fills them
+    assert wait_until(lambda: server._subscribers)
+    time.sleep(0.05)
+    yield server
+    tier.close()
+
+
+@pytest.fixture
+def no_shared_tier(monkeypatch):
+    """No CACHE_REDIS_URL: every worker caches in process only."""
+    monkeypatch.setattr(cache.settings, "CACHE_REDIS_URL", "")
+    monkeypatch.setattr(cache, "_shared", None)
+    monkeypatch.setattr(cache, "_shared_resolved", False)
+    yield
+    cache.close_shared_tier()
+
+
+def test_reads_fill_l1_and_l2(server):
+    name = unique_name()
+    worker_a = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    worker_b = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {"group_id": "g1", "version": 3}
+
+    assert worker_a.get_or_load("g1", loader) == {"group_id": "g1", "version": 3}
+    assert worker_a.peek("g1") == {"group_id": "g1", "version": 3}
+    assert server.get(f"cache:{name}:g1") is not None
+
+    # Another worker misses its L1 and is answered by the L2, without loading
+    assert worker_b.peek("g1") is None
+    assert worker_b.get_or_load("g1", loader) == {"group_id": "g1", "version": 3}
+    assert worker_b.peek("g1") == {"group_id": "g1", "version": 3}
+    assert len(loads) == 1
+
+
+def test_dump_and_load_round_trip_through_l2(server):
+    name = unique_name()
+    writer = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60, dump=lambda value: list(value), load=tuple)
+    reader = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60, dump=lambda value: list(value), load=tuple)
+    writer.set("k", (1, 2, 3))
+    assert reader.get("k") == (1, 2, 3)
+
+
+def test_none_is_never_cached(server):
+    name = unique_name()
+    worker = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return None
+
+    assert worker.get_or_load("missing", loader) is None
+    assert worker.get_or_load("missing", loader) is None
+    assert len(loads) == 2
+    assert worker.peek("missing") is None
+    assert server.get(f"cache:{name}:missing") is None
+
+
+def test_l1_entries_expire(server):
+    worker = TieredCache(unique_name(), maxsize=10, l1_ttl=0.05, l2_ttl=60)
+    worker.set("k", "v")
+    assert worker.peek("k") == "v"
+    time.sleep(0.1)
+    assert worker.peek("k") is None
+    # Still in the L2
+    assert worker.get("k") == "v"
+
+
+def test_l2_entries_expire(server):
+    worker = TieredCache(unique_name(), maxsize=10, l1_ttl=0.05, l2_ttl=1)
+    worker.set("k", "v")
+    time.sleep(1.1)
+    assert worker.get("k") is None
+
+
+def test_invalidation_reaches_other_workers(server):
+    name = unique_name()
+    worker_a = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    worker_b = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    worker_a.set("g1", {"version": 1})
+    assert worker_b.get("g1") == {"version": 1}
+
+    worker_a.invalidate("g1")
+    assert worker_a.peek("g1") is None
+    assert server.get(f"cache:{name}:g1") is None
+    assert wait_until(lambda: worker_b.peek("g1") is None)
+    assert worker_b.get_or_load("g1", lambda: {"version": 2}) == {"version": 2}
+
+
+def test_invalidation_only_drops_the_key(server):
+    name = unique_name()
+    worker_a = TieredCache(name, maxsize=10, l1_ttl=60, l2_ttl=60)
+    other = TieredCache(unique_name(), maxsize=10, l1_ttl=60, l2_ttl=60)
+
+    worker_a.set("g1", "a")
+    worker_a.set("g2", "b")
+    other.set("g1", "c")
+    worker_a.invalidate("g1")
+    assert wait_until(lambda: worker_a.peek("g1") is None)
+    time.sleep(0.05)
+    assert worker_a.peek("g2") == "b"
+    assert other.peek("g1") == "c"
+
+
+def test_l1_only_without_shared_tier(no_shared_tier):
+    assert cache.shared_tier() is None
+    worker = TieredCache(unique_name(), maxsize=10, l1_ttl=60, l2_ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return "v"
+
+    assert worker.get_or_load("k", loader) == "v"
+    assert worker.get_or_load("k", loader) == "v"
+    assert len(loads) == 1
+
+    worker.invalidate("k")
+    assert worker.peek("k") is None
+    assert worker.get_or_load("k", loader) == "v"
+    assert len(loads) == 2
+
+
+def test_shared_tier_errors_are_misses(server, monkeypatch):
+    worker = TieredCache(unique_name(), maxsize=10, l1_ttl=60, l2_ttl=60)
+
+    def broken(*args, **kwargs):
+        raise ConnectionError("server went away")
+
+    monkeypatch.setattr(server, "get", broken)
+    monkeypatch.setattr(server, "set", broken)
+    assert worker.get_or_load("k", lambda: "v") == "v"
+    assert worker.get("k") == "v"
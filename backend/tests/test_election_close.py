@@ -0,0 +1,161 @@
+# backend/tests/test_election_close.py
+"""
+Closing under the close lease (core/election_state_manager.py) against the in-memory datastore:
+concurrent closes, taking over an abandoned close, and per-vote payment idempotency.
+
+Run from backend/: python -m pytest tests
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+import pytest
+
+from core import election_state_manager
+from core.decoding import decode
+from core.election_state_manager import close_and_resolve
+from core.token_ledger import LEDGER_COLLECTION
+from db import db
+from models import Election, ElectionStatus
+from records import MembershipRecord, ProposalRecord, VoteRecord
+from strategies import auction_resolution
+from strategies.auction_resolution import LotteryWinsStrategy
+
+STARTING_BALANCE = 10
+
+
+def seed_election(resolution_strategy: str = "most_votes", members: int = 4) -> Tuple[str, List[ProposalRecord]]:
+    """An OPEN election past its end date, with two proposals and one vote per member."""
+    suffix = uuid.uuid4().hex[:8]
+    group_id, election_id = f"group-{suffix}", f"election-{suffix}"
+    now = datetime.now(timezone.utc)
+
+    db.collection("groups").document(group_id).set({"group_id": group_id, "name": "Test group", "description": "", "version": 0})
+    election = Election(
+        election_id=election_id,
+        election_name="Test election",
+        group_id=group_id,
+        start_date=now - timedelta(hours=2),
+        end_date=now - timedelta(minutes=1),
+        status=ElectionStatus.OPEN,
+        payment_options="allpay",
+        price_options="1,1",
+        resolution_strategy=resolution_strategy,
+    )
+    db.collection("elections").document(election_id).set(election.model_dump())
+
+    proposals = [
+        ProposalRecord(f"{suffix}-proposal-{number}", election_id, f"user0_{group_id}", f"Proposal {number}", now)
+        for number in range(2)
+    ]
+    for proposal in proposals:
+        db.collection("proposals").document(proposal.proposal_id).set(proposal.to_doc())
+
+    for index in range(members):
+        membership = MembershipRecord(f"user{index}_{group_id}", f"user{index}", group_id, STARTING_BALANCE, "member", now, now, now)
+        db.collection("memberships").document(membership.membership_id).set(membership.to_doc())
+        vote = VoteRecord(
+            f"{suffix}-vote-{index}", election_id, membership.membership_id, proposals[index % 2].proposal_id,
+            tokens_used=index + 1, created_at=now, updated_at=now,
+        )
+        db.collection("votes").document(vote.vote_id).set(vote.to_doc())
+    return election_id, proposals
+
+
+def load_election(election_id: str) -> Election:
+    return decode(Election, db.collection("elections").document(election_id).get().to_dict())
+
+
+def load_votes(election_id: str) -> List[VoteRecord]:
+    return [VoteRecord.from_doc(doc.to_dict()) for doc in db.collection("votes").where("election_id", "==", election_id).stream()]
+
+
+def assert_each_vote_paid_once(election_id: str):
+    for vote in load_votes(election_id):
+        assert vote.payment_applied
+        assert vote.amount_paid == vote.tokens_used
+        membership = db.collection("memberships").document(vote.membership_id).get().to_dict()
+        assert membership["token_balance"] == STARTING_BALANCE - vote.tokens_used
+        payments = list(
+            db.collection(LEDGER_COLLECTION)
+            .where("reference", "==", vote.vote_id)
+            .where("reason", "==", "payment")
+            .stream()
+        )
+        assert len(payments) == 1
+
+
+def test_concurrent_closes_charge_each_vote_once():
+    election_id, proposals = seed_election()
+
+    async def close_twice():
+        return await asyncio.gather(
+            close_and_resolve(load_election(election_id), db, None, proposals),
+            close_and_resolve(load_election(election_id), db, None, proposals),
+        )
+
+    results = asyncio.run(close_twice())
+
+    # Only one of them held the lease; the other saw the election mid-close or closed
+    assert sum(1 for election in results if election.status == ElectionStatus.CLOSED) >= 1
+    stored = load_election(election_id)
+    assert stored.status == ElectionStatus.CLOSED
+    assert stored.close_lease_owner is None
+    assert_each_vote_paid_once(election_id)
+    assert db.collection("election_results").document(election_id).get().exists
+
+
+def test_takeover_after_lease_expiry_keeps_winner_and_pays_once(monkeypatch):
+    election_id, proposals = seed_election(resolution_strategy="lottery")
+
+    # Worker A draws the winner, pays two votes and dies
+    monkeypatch.setattr(election_state_manager, "WORKER_ID", "worker-a")
+    commit_vote_payment = auction_resolution._commit_vote_payment
+    payments = []
+
+    def dies_after_two_payments(*args, **kwargs):
+        if len(payments) == 2:
+            raise RuntimeError("worker died")
+        payments.append(args[0].vote_id)
+        return commit_vote_payment(*args, **kwargs)
+
+    monkeypatch.setattr(auction_resolution, "_commit_vote_payment", dies_after_two_payments)
+    with pytest.raises(RuntimeError):
+        asyncio.run(close_and_resolve(load_election(election_id), db, None, proposals))
+
+    abandoned = load_election(election_id)
+    assert abandoned.status == ElectionStatus.CLOSING
+    assert abandoned.close_lease_owner == "worker-a"
+    winner = abandoned.winning_proposal_id
+    assert winner is not None
+    assert sum(1 for vote in load_votes(election_id) if vote.payment_applied) == 2
+
+    # Worker B would draw the other proposal
+    monkeypatch.setattr(election_state_manager, "WORKER_ID", "worker-b")
+    monkeypatch.setattr(auction_resolution, "_commit_vote_payment", commit_vote_payment)
+    other = next(proposal.proposal_id for proposal in proposals if proposal.proposal_id != winner)
+
+    async def draws_other(self, election, proposals, votes):
+        return other
+
+    monkeypatch.setattr(LotteryWinsStrategy, "select_winner", draws_other)
+
+    # While A's lease is valid, B leaves the election alone
+    waiting = asyncio.run(close_and_resolve(load_election(election_id), db, None, proposals))
+    assert waiting.status == ElectionStatus.CLOSING
+    assert sum(1 for vote in load_votes(election_id) if vote.payment_applied) == 2
+
+    db.collection("elections").document(election_id).update({
+        "close_lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+    })
+    closed = asyncio.run(close_and_resolve(load_election(election_id), db, None, proposals))
+
+    assert closed.status == ElectionStatus.CLOSED
+    assert closed.winning_proposal_id == winner
+    stored = load_election(election_id)
+    assert stored.status == ElectionStatus.CLOSED
+    assert stored.winning_proposal_id == winner
+    assert_each_vote_paid_once(election_id)
+    results = db.collection("election_results").document(election_id).get().to_dict()
+    assert results["winning_proposal_id"] == winner
@@ -126,7 +126,9 @@ const EditTokenSettingsModal: React.FC<EditTokenSettingsModalProps> = ({
                         value={regenerationInterval}
                         onChange={(e) => setRegenerationInterval(e.target.value)}
                     >
+                        <option value="hourly">Hourly</option>
                         <option value="daily">Daily</option>
+                        <option value="weekly">Weekly</option>
                         <option value="election">Per Election</option>
                     </select>
                 </div>